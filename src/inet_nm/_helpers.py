@@ -1,5 +1,6 @@
 """Interactive user prompts and general basic helpers."""
 
+import codecs
 import json
 import os
 import re
@@ -228,14 +229,91 @@ def nm_input(*args, **kwargs):
     return input(*args, **kwargs)
 
 
+class JsonStreamExtractor:
+    """
+    Incrementally extract JSON objects from a stream of text.
+
+    Chunks of text or bytes are fed as they arrive and the JSON objects
+    completed by a chunk are returned. The text is scanned for the start of
+    an object and decoded with `json.JSONDecoder.raw_decode`, so braces
+    inside strings are handled. Text before an object is dropped, only an
+    object that is not complete yet is kept, up to `max_pending` characters.
+
+    Args:
+        max_pending: Maximum length of an incomplete object to keep.
+
+    Example:
+    >>> extractor = JsonStreamExtractor()
+    >>> extractor.feed('log {"a": "}", ')
+    []
+    >>> extractor.feed(b'"b": 2} more {"c": 3}')
+    [{'a': '}', 'b': 2}, {'c': 3}]
+    """
+
+    _LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+    # An object starts with a key or is empty, this skips most log braces
+    _START = re.compile(r'\{\s*(?:["}]|\Z)')
+
+    def __init__(self, max_pending: int = 1 << 20):
+        self.max_pending = max_pending
+        self._decoder = json.JSONDecoder()
+        self._bytes_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def _incomplete(self, text: str, exc: json.JSONDecodeError) -> bool:
+        # Only data missing at the end is worth waiting for.
+        if exc.pos >= len(text) or exc.msg.startswith("Unterminated string"):
+            return True
+        rest = text[exc.pos :]
+        return any(literal.startswith(rest) for literal in self._LITERALS)
+
+    def feed(self, chunk) -> List[dict]:
+        """
+        Feed the next chunk of the stream.
+
+        Args:
+            chunk: The next text, bytes are decoded as UTF-8.
+
+        Returns:
+            The JSON objects completed by the chunk.
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._bytes_decoder.decode(chunk)
+        if (
+            self._pending
+            and "}" not in chunk
+            and len(self._pending) + len(chunk) <= self.max_pending
+        ):
+            # An object can only be completed by a closing brace
+            self._pending += chunk
+            return []
+        text = self._pending + chunk
+        self._pending = ""
+        objects = []
+        pos = 0
+        while True:
+            match = self._START.search(text, pos)
+            if match is None:
+                return objects
+            start = match.start()
+            try:
+                obj, pos = self._decoder.raw_decode(text, start)
+            except json.JSONDecodeError as exc:
+                if self._incomplete(text, exc) and (
+                    len(text) - start <= self.max_pending
+                ):
+                    self._pending = text[start:]
+                    return objects
+                pos = start + 1
+                continue
+            objects.append(obj)
+
+
 def nm_extract_valid_jsons(text):
     """
     Extract valid JSON strings from a given text.
 
-    This function iterates through the provided text character by character,
-    keeping track of the opening and closing braces to extract potential JSON strings.
-    It then validates each potential JSON string and returns a list of valid
-    JSON objects.
+    The text is fed to a `JsonStreamExtractor` at once.
 
     Args:
     - text (str): The input text containing potential JSON strings.
@@ -249,35 +327,7 @@ def nm_extract_valid_jsons(text):
     >>> nm_extract_valid_jsons(x)
     [{'a': 1}, {'b': 2, 'c': 3, 'd': [{'e': 5}]}]
     """
-
-    def extract_potential_jsons(text):
-        potential_jsons = []
-        brace_count = 0
-        start_index = -1
-
-        for i, char in enumerate(text):
-            if char == "{":
-                if brace_count == 0:
-                    start_index = i
-                brace_count += 1
-            elif char == "}":
-                brace_count -= 1
-                if brace_count == 0 and start_index != -1:
-                    potential_jsons.append(text[start_index : i + 1])
-
-        return potential_jsons
-
-    potential_jsons = extract_potential_jsons(text)
-
-    valid_jsons = []
-    for potential in potential_jsons:
-        try:
-            valid_json = json.loads(potential)
-            valid_jsons.append(valid_json)
-        except json.JSONDecodeError:
-            pass
-
-    return valid_jsons
+    return JsonStreamExtractor().feed(text)
 
 
 def get_commit(dir: str = "."):
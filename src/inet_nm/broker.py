@@ -0,0 +1,468 @@
+"""
+Local reservation broker for nodes.
+
+The broker is an optional daemon that owns all node reservations in memory
+and serves them over a Unix socket. Requests are newline delimited JSON
+objects with an `op` key, the supported operations are `acquire`, `release`,
+`query`, `wait` and `free`.
+
+Reservations are still persisted as lock files in the locks dir, so tools
+that are not aware of the broker keep working. Lock files that were not
+created by the broker are respected as foreign reservations.
+
+A client connection owns the nodes it acquired, if the connection drops all
+of its reservations are released and its waiting requests are cancelled.
+"""
+import errno
+import itertools
+import json
+import os
+import select
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from inet_nm.filelock import FileLockTimeout, default_holder
+
+FOREIGN_POLL_INTERVAL = 0.5
+
+
+def _poll_timeout(remaining: Optional[float]) -> float:
+    if remaining is None:
+        return FOREIGN_POLL_INTERVAL
+    return min(remaining, FOREIGN_POLL_INTERVAL)
+
+
+class _Ticket:
+    def __init__(self, number: int, conn_id: int, holder: str, uids: List[str]):
+        self.number = number
+        self.conn_id = conn_id
+        self.holder = holder
+        self.uids = set(uids)
+        self.since = time.time()
+        self.cancelled = False
+
+    def to_dict(self):
+        return {"holder": self.holder, "uids": sorted(self.uids), "since": self.since}
+
+
+class BrokerState:
+    """
+    In-memory reservation state of the broker.
+
+    Acquisitions are all-or-nothing and served in the order they arrive,
+    a request is only granted if no older waiting request wants any of the
+    same nodes. This prevents both starvation and lock-order deadlocks.
+
+    Args:
+        locks_dir: Directory where the lock files are persisted.
+    """
+
+    def __init__(self, locks_dir: Union[Path, str]):
+        self.locks_dir = Path(locks_dir)
+        self.held: Dict[str, Dict] = {}
+        self.waiting: List[_Ticket] = []
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+
+    def _lock_path(self, uid: str) -> Path:
+        return self.locks_dir / f"{uid}.lock"
+
+    def _foreign(self, uid: str) -> bool:
+        return uid not in self.held and self._lock_path(uid).exists()
+
+    def _grantable(self, ticket: _Ticket) -> bool:
+        for other in self.waiting:
+            if other.number >= ticket.number:
+                break
+            if other.uids & ticket.uids:
+                return False
+        return not any(uid in self.held for uid in ticket.uids)
+
+    def _persist(self, ticket: _Ticket) -> bool:
+        created = []
+        now = time.time()
+        content = json.dumps(
+            {"holder": ticket.holder, "since": now, "wait": now - ticket.since}
+        )
+        for uid in sorted(ticket.uids):
+            try:
+                os.umask(0)
+                fd = os.open(
+                    self._lock_path(uid),
+                    flags=os.O_CREAT | os.O_EXCL | os.O_RDWR,
+                    mode=0o777,
+                )
+            except FileExistsError:
+                for path in created:
+                    path.unlink()
+                return False
+            os.write(fd, content.encode())
+            os.close(fd)
+            created.append(self._lock_path(uid))
+        return True
+
+    def acquire(
+        self, conn_id: int, holder: str, uids: List[str], timeout: float = None
+    ) -> bool:
+        """
+        Acquire all nodes at once.
+
+        Args:
+            conn_id: Identifier of the connection that will own the nodes.
+            holder: Human readable name of the holder.
+            uids: UIDs of the nodes to acquire.
+            timeout: Maximum time to wait, None waits forever.
+
+        Returns:
+            True if the nodes were acquired, False on timeout or if the
+                request was cancelled.
+        """
+        ticket = _Ticket(next(self._tickets), conn_id, holder, uids)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    if ticket.cancelled:
+                        return False
+                    if self._grantable(ticket) and self._persist(ticket):
+                        break
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    # Foreign lock files do not notify us, so poll for them.
+                    if any(self._foreign(uid) for uid in ticket.uids):
+                        remaining = _poll_timeout(remaining)
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting.remove(ticket)
+                self._cond.notify_all()
+            for uid in ticket.uids:
+                self.held[uid] = {
+                    "holder": holder,
+                    "since": time.time(),
+                    "conn_id": conn_id,
+                }
+        return True
+
+    def cancel(self, conn_id: int):
+        """
+        Cancel the waiting requests of a connection.
+
+        Args:
+            conn_id: Identifier of the connection that went away.
+        """
+        with self._cond:
+            for ticket in self.waiting:
+                if ticket.conn_id == conn_id:
+                    ticket.cancelled = True
+            self._cond.notify_all()
+
+    def release(self, conn_id: int, uids: List[str] = None):
+        """
+        Release nodes held by a connection.
+
+        Args:
+            conn_id: Identifier of the connection owning the nodes.
+            uids: UIDs to release, None releases everything of the connection.
+        """
+        with self._cond:
+            for uid, info in list(self.held.items()):
+                if info["conn_id"] != conn_id:
+                    continue
+                if uids is not None and uid not in uids:
+                    continue
+                self._drop(uid)
+            self._cond.notify_all()
+
+    def free(self):
+        """Release all reservations regardless of the holder."""
+        with self._cond:
+            for uid in list(self.held):
+                self._drop(uid)
+            self._cond.notify_all()
+
+    def _drop(self, uid: str):
+        del self.held[uid]
+        try:
+            self._lock_path(uid).unlink()
+        except FileNotFoundError:
+            pass
+
+    def wait(self, uids: List[str], timeout: float = None) -> bool:
+        """
+        Wait until none of the nodes is reserved, without acquiring them.
+
+        Args:
+            uids: UIDs of the nodes to wait for.
+            timeout: Maximum time to wait, None waits forever.
+
+        Returns:
+            True if the nodes are free, False on timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                busy = [uid for uid in uids if uid in self.held]
+                foreign = [uid for uid in uids if self._foreign(uid)]
+                if not busy and not foreign:
+                    return True
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if foreign:
+                    remaining = _poll_timeout(remaining)
+                self._cond.wait(remaining)
+
+    def query(self) -> Dict:
+        """
+        Get a snapshot of all reservations and the wait queue.
+
+        Returns:
+            A dictionary with the held nodes, foreign lock files and the
+                waiting requests in queue order.
+        """
+        with self._cond:
+            held = {
+                uid: {"holder": info["holder"], "since": info["since"]}
+                for uid, info in self.held.items()
+            }
+            foreign = sorted(
+                path.stem
+                for path in self.locks_dir.glob("*.lock")
+                if path.stem not in self.held
+            )
+            waiting = [ticket.to_dict() for ticket in self.waiting]
+        return {"held": held, "foreign": foreign, "waiting": waiting}
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        state: BrokerState = self.server.state
+        conn_id = id(self)
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                    response = self._dispatch(state, conn_id, request)
+                except (ValueError, KeyError, TypeError) as exc:
+                    response = {"ok": False, "error": f"bad request: {exc}"}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            state.release(conn_id)
+
+    def _watch_disconnect(
+        self, state: BrokerState, conn_id: int, done: threading.Event
+    ):
+        # A waiting ticket of a client that is gone would block all newer
+        # requests for the same nodes, so cancel it once the peer closes.
+        while not done.is_set():
+            try:
+                readable, _, _ = select.select(
+                    [self.connection], [], [], FOREIGN_POLL_INTERVAL
+                )
+                if not readable:
+                    continue
+                closed = not self.connection.recv(1, socket.MSG_PEEK)
+            except (OSError, ValueError):
+                closed = True
+            if closed:
+                state.cancel(conn_id)
+            return
+
+    def _dispatch(self, state: BrokerState, conn_id: int, request: Dict) -> Dict:
+        op = request["op"]
+        if op == "acquire":
+            done = threading.Event()
+            watcher = threading.Thread(
+                target=self._watch_disconnect, args=(state, conn_id, done), daemon=True
+            )
+            watcher.start()
+            try:
+                ok = state.acquire(
+                    conn_id, request["holder"], request["uids"], request.get("timeout")
+                )
+            finally:
+                done.set()
+            return {"ok": True} if ok else {"ok": False, "error": "timeout"}
+        if op == "release":
+            state.release(conn_id, request.get("uids"))
+            return {"ok": True}
+        if op == "wait":
+            ok = state.wait(request["uids"], request.get("timeout"))
+            return {"ok": True} if ok else {"ok": False, "error": "timeout"}
+        if op == "query":
+            return {"ok": True, **state.query()}
+        if op == "free":
+            state.free()
+            return {"ok": True}
+        raise ValueError(f"unknown op {op}")
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server for the reservation broker.
+
+    Args:
+        socket_path: Path of the Unix socket to listen on.
+        locks_dir: Directory where the lock files are persisted.
+
+    Raises:
+        OSError: If another broker is listening on the socket.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Union[Path, str], locks_dir: Union[Path, str]):
+        self.socket_path = Path(socket_path)
+        self._remove_stale_socket()
+        self.state = BrokerState(locks_dir)
+        super().__init__(str(self.socket_path), _BrokerHandler)
+        os.chmod(self.socket_path, 0o777)
+
+    def _remove_stale_socket(self):
+        # Only a socket nobody listens on may be taken over, otherwise the
+        # clients would be split between two brokers.
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(self.socket_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            try:
+                self.socket_path.unlink()
+            except FileNotFoundError:
+                pass
+            return
+        finally:
+            probe.close()
+        raise OSError(
+            errno.EADDRINUSE, f"A broker is already listening on {self.socket_path}"
+        )
+
+    def server_close(self):
+        """Release all reservations and remove the socket."""
+        super().server_close()
+        self.state.free()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class BrokerClient:
+    """
+    Client connection to the reservation broker.
+
+    Use `BrokerClient.connect` to get a client, it returns None if no
+    broker is running.
+
+    Args:
+        sock: A connected Unix socket.
+        holder: Human readable name of the holder.
+    """
+
+    def __init__(self, sock: socket.socket, holder: str = None):
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+        self.holder = holder or default_holder()
+
+    @classmethod
+    def connect(
+        cls, socket_path: Union[Path, str], holder: str = None
+    ) -> Optional["BrokerClient"]:
+        """
+        Connect to a running broker.
+
+        Args:
+            socket_path: Path of the broker Unix socket.
+            holder: Human readable name of the holder.
+
+        Returns:
+            A connected client or None if no broker is listening.
+        """
+        if not Path(socket_path).exists():
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            sock.close()
+            return None
+        return cls(sock, holder)
+
+    def _call(self, **request) -> Dict:
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Broker closed the connection")
+        return json.loads(line)
+
+    def acquire(self, uids: List[str], timeout: float = None):
+        """
+        Acquire all nodes at once.
+
+        Args:
+            uids: UIDs of the nodes to acquire.
+            timeout: Maximum time to wait, None waits forever.
+
+        Raises:
+            FileLockTimeout: If the nodes could not be acquired in time.
+        """
+        res = self._call(op="acquire", uids=uids, holder=self.holder, timeout=timeout)
+        if not res["ok"]:
+            raise FileLockTimeout(f"Timeout trying to lock {uids} via broker")
+
+    def release(self, uids: List[str] = None):
+        """
+        Release nodes held by this client.
+
+        Args:
+            uids: UIDs to release, None releases all nodes of this client.
+        """
+        self._call(op="release", uids=uids)
+
+    def wait(self, uids: List[str], timeout: float = None) -> bool:
+        """
+        Wait until none of the nodes is reserved.
+
+        Args:
+            uids: UIDs of the nodes to wait for.
+            timeout: Maximum time to wait, None waits forever.
+
+        Returns:
+            True if the nodes are free, False on timeout.
+        """
+        return self._call(op="wait", uids=uids, timeout=timeout)["ok"]
+
+    def query(self) -> Dict:
+        """
+        Get all reservations and the wait queue of the broker.
+
+        Returns:
+            A dictionary with `held`, `foreign` and `waiting` entries.
+        """
+        res = self._call(op="query")
+        res.pop("ok")
+        return res
+
+    def free(self):
+        """Release all reservations of all holders."""
+        self._call(op="free")
+
+    def close(self):
+        """Close the connection, releasing everything held by it."""
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "BrokerClient":
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
@@ -4,11 +4,13 @@ This module contains functions for checking the state of the boards.
 This is meant for evaluating inventory.
 """
 import argparse
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Set, Tuple, Union
 
 import inet_nm.config as cfg
 from inet_nm.data_types import NmNode
+from inet_nm.feature_expr import compile_feature_expr
 from inet_nm.locking import get_locked_uids
+from inet_nm.node_index import NodeIndex
 from inet_nm.usb_ctrl import get_connected_uids
 
 
@@ -121,27 +123,19 @@ def eval_features(nodes: List[NmNode], features: set, eval_func):
     Args:
         nodes: A list of nodes to evaluate.
         features: A set of features to evaluate.
-        eval_func: The function to use to evaluate the features.
+        eval_func: The boolean feature expression to evaluate.
 
     Returns:
         A list of nodes that meet the criteria of the evaluation function.
 
     Raises:
-        ValueError: If the evaluation function cannot be evaluated.
+        ValueError: If the evaluation function is not a valid feature
+            expression or uses unknown features.
     """
-    selected_nodes = []
-    try:
-        for node in nodes:
-            selected_features = {
-                feature: feature in node.features_provided for feature in features
-            }
-            if eval(eval_func, selected_features):
-                selected_nodes.append(node)
-    except Exception as e:
-        raise ValueError(
-            f"Could not evaluate {eval_func} with {sorted(features)}"
-        ) from e
-    return selected_nodes
+    expr = compile_feature_expr(eval_func)
+    expr.check_names(features)
+    index = NodeIndex(nodes)
+    return index.select(expr.mask(index))
 
 
 def skip_duplicate_boards(nodes: List[NmNode]) -> List[NmNode]:
@@ -174,11 +168,17 @@ def check_nodes(
     only_used: bool = False,
     boards: List[str] = None,
     uids: List[str] = None,
-    locked_nodes: List[str] = None,
+    locked_nodes: Union[List[str], Callable[[], List[str]]] = None,
+    index: NodeIndex = None,
 ) -> List[NmNode]:
     """
     Get a filtered list of nodes based on the provided parameters.
 
+    The filters are intersections of node bitsets from the index and are
+    applied cheapest first: ignore, UIDs, boards and features, then the
+    feature expression, then the lock state and last the USB state.
+    Lock and USB lookups are skipped once no candidates are left.
+
     Args:
         nodes: A list of nodes to check.
         all_nodes: If True, all nodes will be returned.
@@ -187,35 +187,44 @@ def check_nodes(
             these features will be returned.
         feat_eval: The function to use to evaluate the features.
         used: If True, used nodes will also be returned.
-        skip_dups: If True, duplicate nodes will be removed.
+        skip_dups: If True, only the first matching node of each board is
+            returned.
         only_used: If True, only the used nodes will be returned.
         boards: A list of boards to use.
         uids: A list of UIDs of nodes to use.
-        locked_nodes: A list of UIDs of nodes that are locked.
+        locked_nodes: A list of UIDs of nodes that are locked or a function
+            returning them, only called if the lock state is needed.
+        index: A prebuilt index of the nodes, built from the nodes if None.
 
     Returns:
         A list of filtered nodes.
     """
-    features = get_all_features(nodes)
-    if not all_nodes:
-        nodes = get_nodes_with_state(nodes, connected=not missing)
-    if only_used:
-        nodes = filter_used_nodes(nodes, locked_nodes, remove=False)
-    elif not used:
-        nodes = filter_used_nodes(nodes, locked_nodes, remove=True)
+    if index is None:
+        index = NodeIndex(nodes)
+    mask = index.all & ~index.ignored
+    if uids:
+        mask &= index.with_uids(uids)
+    if boards:
+        mask &= index.with_boards(boards)
     if feat_filter:
-        nodes = filter_nodes(nodes, feat_filter)
+        mask &= index.with_features(feat_filter)
     if feat_eval:
-        nodes = eval_features(nodes, features, feat_eval)
+        # Check the expression even without candidates so typos still raise.
+        expr = compile_feature_expr(feat_eval)
+        expr.check_names(index.features)
+        if mask:
+            mask &= expr.mask(index)
+    if (only_used or not used) and mask:
+        if callable(locked_nodes):
+            locked_nodes = locked_nodes()
+        locked = index.with_uids(locked_nodes or [])
+        mask &= locked if only_used else ~locked
+    if not all_nodes and mask:
+        connected = index.with_uids(get_connected_uids())
+        mask &= ~connected if missing else connected
     if skip_dups:
-        nodes = skip_duplicate_boards(nodes)
-    if boards:
-        nodes = [node for node in nodes if node.board in boards]
-    if uids:
-        nodes = [node for node in nodes if node.uid in uids]
-    # filter out ignored nodes
-    nodes = [node for node in nodes if not node.ignore]
-    return nodes
+        mask = index.first_per_board(mask)
+    return index.select(mask)
 
 
 def check_filter_args(parser: argparse.ArgumentParser):
@@ -277,6 +286,8 @@ def get_inventory_nodes(
     feat_eval: str = None,
     boards: List[str] = None,
     uids: List[str] = None,
+    connected_uids: Set[str] = None,
+    locked_uids: Set[str] = None,
 ) -> Tuple[List[NmNode], List[NmNode], List[NmNode], List[NmNode]]:
     """
     Get a list of nodes based on the provided parameters.
@@ -288,21 +299,57 @@ def get_inventory_nodes(
         feat_eval: The function to use to evaluate the features.
         boards: A list of boards to use.
         uids: A list of UIDs of nodes to use.
+        connected_uids: A snapshot of the connected UIDs, scanned if None.
+        locked_uids: A snapshot of the locked UIDs, looked up if None.
 
     Returns:
         A tuple of lists of nodes. The first list is the available nodes, the
             second list is the used nodes, the third list is the missing
             nodes, the forth is the total node count.
     """
-
-    kwargs = locals()
-    available = get_filtered_nodes(**kwargs)
-    used = get_filtered_nodes(only_used=True, **kwargs)
-    missing = get_filtered_nodes(missing=True, **kwargs)
-    total = get_filtered_nodes(all_nodes=True, used=True, **kwargs)
+    # Load and classify in one pass instead of one get_filtered_nodes per class
+    nodes, index = _load_nodes(config, feat_filter, feat_eval, boards, uids)
+    total = check_nodes(
+        nodes,
+        all_nodes=True,
+        feat_filter=feat_filter,
+        feat_eval=feat_eval,
+        used=True,
+        boards=boards,
+        uids=uids,
+        index=index,
+    )
+    # One snapshot of the USB and lock state for all classes
+    if connected_uids is None:
+        connected_uids = set(get_connected_uids())
+    if locked_uids is None:
+        locked_uids = set(get_locked_uids())
+    available, used, missing = [], [], []
+    for node in total:
+        if node.uid in connected_uids:
+            (used if node.uid in locked_uids else available).append(node)
+        elif node.uid not in locked_uids:
+            missing.append(node)
     return available, used, missing, total
 
 
+def _load_nodes(
+    config: str,
+    feat_filter: List[str],
+    feat_eval: str,
+    boards: List[str],
+    uids: List[str],
+) -> Tuple[List[NmNode], NodeIndex]:
+    nodes_cfg = cfg.NodesConfig(config)
+    if nodes_cfg.backend is None:
+        index = nodes_cfg.load_index()
+        return index.nodes, index
+    if feat_eval:
+        # Unknown feature names are checked against all nodes
+        return nodes_cfg.load(), None
+    return nodes_cfg.query(boards=boards, uids=uids, feat_filter=feat_filter), None
+
+
 def get_filtered_nodes(
     config: str,
     all_nodes: bool = False,
@@ -334,8 +381,7 @@ def get_filtered_nodes(
     Returns:
         A list of filtered nodes.
     """
-    nodes = cfg.NodesConfig(config).load()
-    locked_nodes = get_locked_uids()
+    nodes, index = _load_nodes(config, feat_filter, feat_eval, boards, uids)
     nodes = check_nodes(
         nodes,
         all_nodes,
@@ -347,7 +393,8 @@ def get_filtered_nodes(
         only_used,
         boards,
         uids,
-        locked_nodes,
+        get_locked_uids,
+        index,
     )
     return nodes
 
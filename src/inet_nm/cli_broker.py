@@ -0,0 +1,45 @@
+import argparse
+import signal
+import sys
+
+import inet_nm.locking as lk
+from inet_nm._helpers import nm_print
+from inet_nm.broker import BrokerServer
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    """CLI entrypoint for the node reservation broker daemon."""
+    parser = argparse.ArgumentParser(
+        description="Serve node reservations over a Unix socket."
+    )
+    parser.add_argument(
+        "-s",
+        "--socket",
+        default=lk.broker_socket_path(),
+        help="Path to the broker socket, defaults to NM_BROKER_SOCKET or "
+        "the inet_nm temp dir if NM_BROKER_SOCKET is not set",
+    )
+    args = parser.parse_args()
+
+    try:
+        server = BrokerServer(args.socket, lk.locks_dir())
+    except OSError as exc:
+        nm_print(f"Cannot start the broker: {exc}")
+        sys.exit(1)
+    signal.signal(signal.SIGTERM, _terminate)
+    nm_print(f"Broker listening on {server.socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        nm_print("Broker stopping, releasing all reservations")
+    finally:
+        server.server_close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,15 +13,37 @@ def main():
     parser.add_argument(
         "--show-features", action="store_true", help="Shows all features for all boards"
     )
+    parser.add_argument(
+        "--feature-stats",
+        action="store_true",
+        help="Shows the node count, board count and coverage of each feature",
+    )
     args = parser.parse_args()
     cfg.check_commit_hash(args.config)
     kwargs = vars(args)
     show_features = kwargs.pop("show_features")
+    feature_stats = kwargs.pop("feature_stats")
 
     nodes = chk.get_filtered_nodes(**kwargs)
 
-    if show_features:
-        info = chk.all_features_from_nodes(nodes)
+    if show_features or feature_stats:
+        # Only loads NumPy when needed, it slows down the startup
+        from inet_nm.feature_matrix import FeatureMatrix
+
+        matrix = FeatureMatrix(nodes)
+    if feature_stats:
+        boards = matrix.boards_per_feature()
+        coverage = matrix.coverage()
+        info = {
+            feature: {
+                "nodes": count,
+                "boards": boards[feature],
+                "coverage": round(coverage[feature], 3),
+            }
+            for feature, count in matrix.feature_counts().items()
+        }
+    elif show_features:
+        info = matrix.all_features()
     else:
         info = chk.nodes_to_boards(nodes)
     out = json.dumps(info, indent=2, sort_keys=True)
@@ -96,9 +96,8 @@ def _main():
             pc.power_on_uid(uid)
             cmr.set_uninitialized_sn(selected_node)
             pc.power_off_uid(uid)
-    nodes = cmr.add_node_to_nodes(saved_nodes, selected_node)
-    nodes_cfg.save(nodes)
-    print(f"Updated {nodes_cfg.file_path}")
+    nodes_cfg.update_node(selected_node)
+    print(f"Updated {nodes_cfg.journal_path}")
 
 
 def main():
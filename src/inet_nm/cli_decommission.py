@@ -28,14 +28,13 @@ def main():
     else:
         nodes_to_remove = chk.check_nodes(saved_nodes, all_nodes=True, used=True)
 
-    nodes = saved_nodes
     if args.all:
         for node in nodes_to_remove:
-            nodes = cmr.remove_node_to_nodes(nodes, node)
+            nodes_cfg.remove_node(node)
     else:
         try:
             selected_node = cmr.select_available_node(nodes_to_remove)
-            nodes = cmr.remove_node_to_nodes(nodes, selected_node)
+            nodes_cfg.remove_node(selected_node)
             print("Removed node:")
             print(f"    UID: {selected_node.uid}")
             print(f"    PID: {selected_node.product_id}")
@@ -45,9 +44,7 @@ def main():
             print("No available nodes found")
             sys.exit(1)
 
-    nodes_cfg.save(nodes)
-
-    print(f"Updated {nodes_cfg.file_path}")
+    print(f"Updated {nodes_cfg.journal_path}")
 
 
 if __name__ == "__main__":
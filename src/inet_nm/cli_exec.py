@@ -1,11 +1,22 @@
 import argparse
 import signal
 import sys
+from typing import List
 
 import inet_nm.check as chk
 import inet_nm.config as cfg
 import inet_nm.runner_apps as apps
 import inet_nm.runner_helper as rh
+from inet_nm.data_types import NmJob
+from inet_nm.job_queue import load_jobs
+from inet_nm.usage import UsageLog
+
+
+def _load_job_file(path: str) -> List[NmJob]:
+    if path == "-":
+        return load_jobs(sys.stdin)
+    with open(path, "r") as f:
+        return load_jobs(f)
 
 
 def main():
@@ -16,9 +27,38 @@ def main():
     parser.add_argument(
         "cmd",
         type=str,
+        nargs="?",
         help="bash command to execute, ' must be escaped and generally pay"
         " attention to escape characters.",
     )
+    parser.add_argument(
+        "--job-file",
+        type=str,
+        default=None,
+        help="Run each job of this file, or - for stdin, once on the next free"
+        " matching node instead of cmd on every node. A job is a command line"
+        " or a json object with cmd and optionally name, boards, features and"
+        " feat_eval.",
+    )
+    parser.add_argument(
+        "--build-cmd",
+        type=str,
+        default=None,
+        help="bash command to run once for each board of the nodes before the"
+        " command of the nodes, nodes of a board whose build failed are skipped.",
+    )
+    parser.add_argument(
+        "--build-jobs",
+        type=int,
+        default=None,
+        help="Maximum number of boards to build at the same time",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Start the command of a node as soon as the build of its board"
+        " finished instead of waiting for all builds.",
+    )
     parser.add_argument(
         "-F", "--force", action="store_true", help="Force execution of command."
     )
@@ -34,6 +74,12 @@ def main():
         action="store_true",
         help="Run commands sequentially instead of concurrently",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Maximum number of nodes to run the command on at the same time",
+    )
     parser.add_argument(
         "-r",
         "--output-filter",
@@ -47,7 +93,46 @@ def main():
         action="store_true",
         help="Capture only json output.",
     )
+    parser.add_argument(
+        "--json-stream",
+        action="store_true",
+        help="Print the json result of each node as one line as soon as the "
+        "node finishes, implies --json-filter.",
+    )
+    parser.add_argument(
+        "--json-objects",
+        action="store_true",
+        help="With --json-stream also print each json object as one line "
+        "as soon as it is output.",
+    )
+    parser.add_argument(
+        "--node-timeout",
+        type=float,
+        default=None,
+        help="Kill the command of a node after this many seconds.",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Kill the command of a node after this many seconds without output.",
+    )
+    parser.add_argument(
+        "--log-dir",
+        type=str,
+        default=None,
+        help="Write the output of each node to its own log file in this "
+        "directory instead of printing it.",
+    )
+    parser.add_argument(
+        "--tail-lines",
+        type=int,
+        default=20,
+        help="Number of last output lines of a node shown on failure and "
+        "in json results when using --log-dir.",
+    )
 
+    rh.launch_args(parser)
     cfg.config_arg(parser)
     chk.check_args(parser)
     args = parser.parse_args()
@@ -55,10 +140,38 @@ def main():
     kwargs = vars(args)
     timeout = kwargs.pop("timeout")
     cmd = kwargs.pop("cmd")
+    job_file = kwargs.pop("job_file")
+    if (cmd is None) == (job_file is None):
+        parser.error("either cmd or --job-file is required")
+    job_list = None
+    if job_file is not None:
+        try:
+            job_list = _load_job_file(job_file)
+        except (OSError, ValueError) as exc:
+            parser.error(f"{job_file}: {exc}")
     seq = kwargs.pop("seq")
+    jobs = kwargs.pop("jobs")
+    if jobs is not None and jobs < 1:
+        parser.error("--jobs must be at least 1")
+    build_cmd = kwargs.pop("build_cmd")
+    build_jobs = kwargs.pop("build_jobs")
+    pipeline = kwargs.pop("pipeline")
+    if pipeline and build_cmd is None:
+        parser.error("--pipeline requires --build-cmd")
+    if build_jobs is not None and build_jobs < 1:
+        parser.error("--build-jobs must be at least 1")
     force = kwargs.pop("force")
+    launch = rh.pop_launch_args(kwargs)
     output_filter = kwargs.pop("output_filter")
-    json_filter = kwargs.pop("json_filter")
+    json_stream = kwargs.pop("json_stream")
+    json_objects = kwargs.pop("json_objects")
+    json_filter = kwargs.pop("json_filter") or json_stream
+    if json_objects and not json_stream:
+        parser.error("--json-objects requires --json-stream")
+    node_timeout = kwargs.pop("node_timeout")
+    idle_timeout = kwargs.pop("idle_timeout")
+    log_dir = kwargs.pop("log_dir")
+    tail_lines = kwargs.pop("tail_lines")
     if not json_filter:
         cfg.check_commit_hash(args.config)
     nodes = rh.sanity_check("/bin/bash", **kwargs)
@@ -67,12 +180,33 @@ def main():
     # Somehow allows cleanup to happen...
     signal.signal(signal.SIGHUP, rh.do_nothing)
     try:
-        with apps.NmShellRunner(
-            nodes, default_timeout=timeout, seq=seq, extra_env=extra_env, force=force
+        runner_cls = apps.NmShellRunner if job_list is None else apps.NmJobRunner
+        with runner_cls(
+            nodes,
+            default_timeout=timeout,
+            seq=seq,
+            jobs=jobs,
+            extra_env=extra_env,
+            force=force,
+            usage_log=UsageLog(args.config),
+            **launch,
         ) as runner:
-            runner.cmd = cmd
+            if job_list is None:
+                runner.cmd = cmd
+            else:
+                runner.job_list = job_list
+                runner.durations = cfg.JobDurationsConfig(args.config)
             runner.output_filter = output_filter
             runner.json_filter = json_filter
+            runner.json_stream = json_stream
+            runner.json_objects = json_objects
+            runner.timeout = node_timeout
+            runner.idle_timeout = idle_timeout
+            runner.log_dir = log_dir
+            runner.tail_lines = tail_lines
+            runner.build_cmd = build_cmd
+            runner.build_jobs = build_jobs
+            runner.pipeline = pipeline
             runner.run()
     except KeyboardInterrupt:
         print()
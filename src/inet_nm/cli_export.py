@@ -36,31 +36,32 @@ def main():
     env_cfg = cfg.EnvConfig(args.config)
     env_cfg.check_file(writable=True)
 
-    env_info = env_cfg.load()
-    if apply_to_shared:
-        env_info.shared[env_key] = env_val
-        print(f"Added {env_key}={env_val} to shared env vars")
-    else:
-        if apply_pattern:
-            pattern = {}
-            pattern["key"] = env_key
-            pattern["val"] = env_val
-            pattern["boards"] = args.boards
-            pattern["feat_filter"] = args.feat_filter
-            pattern["feat_eval"] = args.feat_eval
-            # NOTE: All useful patterns must be added here
-            env_info.patterns.append(pattern)
-            print(f"Added patterns: {pattern}")
+    with env_cfg.lock():
+        env_info = env_cfg.load()
+        if apply_to_shared:
+            env_info.shared[env_key] = env_val
+            print(f"Added {env_key}={env_val} to shared env vars")
         else:
-            nodes = chk.get_filtered_nodes(**kwargs)
-            uids = {node.uid for node in nodes}
-            for uid in uids:
-                if uid not in env_info.nodes:
-                    env_info.nodes[uid] = {}
-                env_info.nodes[uid][env_key] = env_val
-            print(f"Added {env_key}={env_val} to env vars for nodes {uids}")
+            if apply_pattern:
+                pattern = {}
+                pattern["key"] = env_key
+                pattern["val"] = env_val
+                pattern["boards"] = args.boards
+                pattern["feat_filter"] = args.feat_filter
+                pattern["feat_eval"] = args.feat_eval
+                # NOTE: All useful patterns must be added here
+                env_info.patterns.append(pattern)
+                print(f"Added patterns: {pattern}")
+            else:
+                nodes = chk.get_filtered_nodes(**kwargs)
+                uids = {node.uid for node in nodes}
+                for uid in uids:
+                    if uid not in env_info.nodes:
+                        env_info.nodes[uid] = {}
+                    env_info.nodes[uid][env_key] = env_val
+                print(f"Added {env_key}={env_val} to env vars for nodes {uids}")
 
-    env_cfg.save(env_info)
+        env_cfg.save(env_info)
     print(f"Written to {env_cfg.file_path}")
 
 
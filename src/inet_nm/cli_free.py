@@ -11,6 +11,12 @@ def main():
 
     nm_print("Releasing all locks")
 
+    client = lk.connect_broker()
+    if client is not None:
+        with client:
+            client.free()
+        nm_print("Released all broker reservations")
+
     for lock_file in lk.locks_dir().glob("*"):
         nm_print(f"Removing lock file {lock_file}")
         lock_file.unlink()
@@ -1,10 +1,188 @@
 import argparse
 import hashlib
 import json
+import sys
 import tempfile
+import time
+from typing import Dict, List, Tuple
 
 import inet_nm.check as chk
 import inet_nm.config as cfg
+import inet_nm.locking as lk
+from inet_nm.history import InventoryHistory, parse_since
+from inet_nm.usb_ctrl import TtyMonitor, get_connected_uids
+
+_STATES = ("available", "used", "missing")
+
+
+def _inventory(kwargs, **snapshots) -> Tuple[Dict, Dict[str, str], Dict[str, str]]:
+    (available, used, missing, total) = chk.get_inventory_nodes(**kwargs, **snapshots)
+    counts = {
+        "available": chk.nodes_to_boards(available),
+        "used": chk.nodes_to_boards(used),
+        "missing": chk.nodes_to_boards(missing),
+        "total": chk.nodes_to_boards(total),
+    }
+
+    # Possibly assert uids are unique for each available, used, missing
+    uid_states = {}
+    uid_states.update({node.uid: "available" for node in available})
+    uid_states.update({node.uid: "used" for node in used})
+    uid_states.update({node.uid: "missing" for node in missing})
+    uid_boards = {node.uid: node.board for node in total}
+    return counts, uid_states, uid_boards
+
+
+def _board_changes(
+    old_states: Dict[str, str], uid_states: Dict[str, str], uid_boards: Dict[str, str]
+) -> Dict[str, int]:
+    board_changes = {}
+    for uid, state in uid_states.items():
+        old_state = old_states.get(uid)
+        if old_state == state:
+            continue
+        b_key = f"{uid_boards[uid]}_{state}"
+        board_changes[b_key] = board_changes.get(b_key, 0) + 1
+        if old_state is not None:
+            b_key = f"{uid_boards[uid]}_{old_state}"
+            board_changes[b_key] = board_changes.get(b_key, 0) - 1
+    return board_changes
+
+
+def _record_history(
+    history: InventoryHistory, uid_states: Dict[str, str], uid_boards: Dict[str, str]
+):
+    try:
+        history.record(uid_states, uid_boards)
+    except OSError:
+        # A read-only config dir only loses the history
+        pass
+
+
+def _board_info(counts: Dict, board_changes: Dict[str, int]) -> List[Dict]:
+    boards = sorted(list(set(counts["total"].keys())))
+    return [
+        {
+            "board": key,
+            "available": counts["available"].get(key, 0),
+            "used": counts["used"].get(key, 0),
+            "missing": counts["missing"].get(key, 0),
+            "total": counts["total"].get(key, 0),
+            "available_changes": board_changes.get(f"{key}_available", 0),
+            "used_changes": board_changes.get(f"{key}_used", 0),
+            "missing_changes": board_changes.get(f"{key}_missing", 0),
+        }
+        for key in boards
+    ]
+
+
+def _change_mark(changes: int) -> str:
+    if changes > 0:
+        return "+"
+    if changes < 0:
+        return "-"
+    return " "
+
+
+def _print_table(info: List[Dict]):
+    if len(info) == 0:
+        return
+    # Get the longest str len of boards
+    max_board_len = max([len(i["board"]) for i in info])
+    brd_str = f"| {'Board':<{max_board_len + 1}}"
+    avl_str = f"| {'Available':<10}"
+    use_str = f"| {'Used':<10}"
+    mis_str = f"| {'Missing':<10}"
+    tot_str = f"| {'Total':<10}|"
+    full_str = brd_str + avl_str + use_str + mis_str + tot_str
+    print("-" * len(full_str))
+    print(full_str)
+    print("-" * len(full_str))
+    avail_count = 0
+    used_count = 0
+    missing_count = 0
+    total_count = 0
+    for i in info:
+        brd_str = f"| {i['board']:<{max_board_len + 1}}"
+        state = _change_mark(i["available_changes"])
+        avl_str = f"|{state}{i['available']:>9} "
+        state = _change_mark(i["used_changes"])
+        use_str = f"|{state}{i['used']:>9} "
+        state = _change_mark(i["missing_changes"])
+        mis_str = f"|{state}{i['missing']:>9} "
+        tot_str = f"| {i['total']:>9} |"
+        full_str = brd_str + avl_str + use_str + mis_str + tot_str
+        print(full_str)
+
+        avail_count += i["available"]
+        used_count += i["used"]
+        missing_count += i["missing"]
+        total_count += i["total"]
+    print("-" * len(full_str))
+    brd_str = "| " + " " * (max_board_len + 1)
+    avl_str = f"| {avail_count:>9} "
+    use_str = f"| {used_count:>9} "
+    mis_str = f"| {missing_count:>9} "
+    tot_str = f"| {total_count:>9} |"
+    full_str = brd_str + avl_str + use_str + mis_str + tot_str
+    print(full_str)
+    print("-" * len(full_str))
+
+
+def _watch(kwargs, history: InventoryHistory, print_json: bool, interval: float):
+    """Redraw the inventory or emit NDJSON deltas when anything changes.
+
+    The USB state is only enumerated again on TTY events, the lock and
+    config state is checked by the stat signature of the files.
+    """
+    monitor = TtyMonitor()
+    nodes_cfg = cfg.NodesConfig(kwargs["config"])
+    locks_dir = lk.locks_dir()
+    connected_uids = set(get_connected_uids())
+    usb_changed = True
+    signature = None
+    uid_states = {}
+    last_rows = {}
+    while True:
+        new_signature = cfg.ConfigStore.signature(
+            [locks_dir, *nodes_cfg.source_paths()]
+        )
+        if usb_changed or new_signature != signature:
+            signature = new_signature
+            counts, new_states, uid_boards = _inventory(
+                kwargs,
+                connected_uids=connected_uids,
+                locked_uids=set(lk.get_locked_uids()),
+            )
+            board_changes = _board_changes(uid_states, new_states, uid_boards)
+            uid_states = new_states
+            _record_history(history, uid_states, uid_boards)
+            info = _board_info(counts, board_changes)
+            if print_json:
+                _print_deltas(info, last_rows)
+            else:
+                # Clear the screen and move the cursor home
+                print("\033[H\033[2J", end="")
+                print(time.strftime("%Y-%m-%d %H:%M:%S"))
+                _print_table(info)
+            sys.stdout.flush()
+        usb_changed = monitor.wait(interval)
+        if usb_changed:
+            connected_uids = set(get_connected_uids())
+
+
+def _print_deltas(info: List[Dict], last_rows: Dict[str, Dict]):
+    now = time.time()
+    rows = {
+        row["board"]: {key: row[key] for key in (*_STATES, "total")} for row in info
+    }
+    for board in sorted(set(rows) | set(last_rows)):
+        row = rows.get(board, {key: 0 for key in (*_STATES, "total")})
+        if last_rows.get(board) == row:
+            continue
+        print(json.dumps({"ts": now, "board": board, **row}, sort_keys=True))
+    last_rows.clear()
+    last_rows.update(rows)
 
 
 def main():
@@ -13,23 +191,47 @@ def main():
     cfg.config_arg(parser)
     chk.check_filter_args(parser)
     parser.add_argument("--json", action="store_true", help="Output in JSON format")
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="Show changes since a point in time, either a duration ago "
+        "such as 30m, 12h or 7d, an ISO date or seconds since the epoch",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and update on USB, lock or config changes, "
+        "with --json changed boards are printed as JSON lines",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between lock and config checks in watch mode",
+    )
 
     args = parser.parse_args()
     kwargs = vars(args)
     print_json = kwargs.pop("json")
+    since = kwargs.pop("since")
+    watch = kwargs.pop("watch")
+    interval = kwargs.pop("interval")
+    if since is not None:
+        try:
+            since = parse_since(since)
+        except ValueError as exc:
+            parser.error(str(exc))
 
-    (available, used, missing, total) = chk.get_inventory_nodes(**kwargs)
+    history = InventoryHistory(args.config, since=since)
+    if watch:
+        try:
+            _watch(kwargs, history, print_json, interval)
+        except KeyboardInterrupt:
+            pass
+        return
 
-    a_boards = chk.nodes_to_boards(available)
-    u_boards = chk.nodes_to_boards(used)
-    m_boards = chk.nodes_to_boards(missing)
-    t_boards = chk.nodes_to_boards(total)
-
-    # Possibly assert uids are unique for each available, used, missing
-    uid_states = {}
-    uid_states.update({node.uid: "available" for node in available})
-    uid_states.update({node.uid: "used" for node in used})
-    uid_states.update({node.uid: "missing" for node in missing})
+    counts, uid_states, uid_boards = _inventory(kwargs)
+    _record_history(history, uid_states, uid_boards)
 
     # get hash of tempfile name based on config path
     cfg_path = args.config
@@ -53,35 +255,10 @@ def main():
         old_uid_states = {}
 
     # If any old states differ from new states add to a changes state dict
-    changes = {}
-    board_changes = {}
-    new_uids = set(uid_states.keys()) - set(old_uid_states.keys())
-    for uid in new_uids:
-        changes[uid] = uid_states[uid]
-        # get board from uid
-        board = [node.board for node in total if node.uid == uid][0]
-        b_key = f"{board}_{uid_states[uid]}"
-        if b_key not in board_changes:
-            board_changes[b_key] = 0
-        board_changes[b_key] += 1
-
-    x_uids = set(uid_states.keys()).intersection(set(old_uid_states.keys()))
-    for uid in x_uids:
-        if uid_states[uid] != old_uid_states[uid]:
-            changes[uid] = uid_states[uid]
-            # get board from uid
-            board = [node.board for node in total if node.uid == uid][0]
-            b_key = f"{board}_{uid_states[uid]}"
-            if b_key not in board_changes:
-                board_changes[b_key] = 0
-            board_changes[f"{board}_{uid_states[uid]}"] += 1
-            b_key = f"{board}_{old_uid_states[uid]}"
-            if b_key not in board_changes:
-                board_changes[b_key] = 0
-            board_changes[f"{board}_{old_uid_states[uid]}"] -= 1
+    board_changes = _board_changes(old_uid_states, uid_states, uid_boards)
 
     # Write new uid_states to tempfile
-    if changes:
+    if board_changes:
         with open(tmp_state_path, "w") as f:
             json.dump(uid_states, f, sort_keys=True, indent=2)
             if not print_json:
@@ -97,77 +274,15 @@ def main():
         except FileNotFoundError:
             board_changes = {}
 
-    boards = sorted(list(set(t_boards.keys())))
+    if since is not None:
+        board_changes = history.board_changes(since, uids=uid_boards)
 
-    info = [
-        {
-            "board": key,
-            "available": a_boards.get(key, 0),
-            "used": u_boards.get(key, 0),
-            "missing": m_boards.get(key, 0),
-            "total": t_boards.get(key, 0),
-            "available_changes": board_changes.get(f"{key}_available", 0),
-            "used_changes": board_changes.get(f"{key}_used", 0),
-            "missing_changes": board_changes.get(f"{key}_missing", 0),
-        }
-        for key in boards
-    ]
+    info = _board_info(counts, board_changes)
     if print_json:
         out = json.dumps(info, indent=2, sort_keys=True)
         print(out)
-    elif len(info) > 0:
-        # Get the longest str len of boards
-        max_board_len = max([len(i["board"]) for i in info])
-        brd_str = f"| {'Board':<{max_board_len + 1}}"
-        avl_str = f"| {'Available':<10}"
-        use_str = f"| {'Used':<10}"
-        mis_str = f"| {'Missing':<10}"
-        tot_str = f"| {'Total':<10}|"
-        full_str = brd_str + avl_str + use_str + mis_str + tot_str
-        print("-" * len(full_str))
-        print(full_str)
-        print("-" * len(full_str))
-        avail_count = 0
-        used_count = 0
-        missing_count = 0
-        total_count = 0
-        for i in info:
-            brd_str = f"| {i['board']:<{max_board_len + 1}}"
-            state = " "
-            if i["available_changes"] > 0:
-                state = "+"
-            elif i["available_changes"] < 0:
-                state = "-"
-            avl_str = f"|{state}{i['available']:>9} "
-            state = " "
-            if i["used_changes"] > 0:
-                state = "+"
-            elif i["used_changes"] < 0:
-                state = "-"
-            use_str = f"|{state}{i['used']:>9} "
-            state = " "
-            if i["missing_changes"] > 0:
-                state = "+"
-            elif i["missing_changes"] < 0:
-                state = "-"
-            mis_str = f"|{state}{i['missing']:>9} "
-            tot_str = f"| {i['total']:>9} |"
-            full_str = brd_str + avl_str + use_str + mis_str + tot_str
-            print(full_str)
-
-            avail_count += i["available"]
-            used_count += i["used"]
-            missing_count += i["missing"]
-            total_count += i["total"]
-        print("-" * len(full_str))
-        brd_str = "| " + " " * (max_board_len + 1)
-        avl_str = f"| {avail_count:>9} "
-        use_str = f"| {used_count:>9} "
-        mis_str = f"| {missing_count:>9} "
-        tot_str = f"| {total_count:>9} |"
-        full_str = brd_str + avl_str + use_str + mis_str + tot_str
-        print(full_str)
-        print("-" * len(full_str))
+    else:
+        _print_table(info)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import inet_nm.config as cfg
+from inet_nm._helpers import nm_print
+from inet_nm.metrics import LabMetrics
+from inet_nm.usb_ctrl import TtyMonitor
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _serve(metrics: LabMetrics, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render(metrics.broker_waiters()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """CLI entrypoint for exporting lab utilization metrics."""
+    parser = argparse.ArgumentParser(
+        description="Export lab utilization metrics in the Prometheus text format."
+    )
+    cfg.config_arg(parser)
+    parser.add_argument("-o", "--output", help="Keep writing the metrics to this file")
+    parser.add_argument(
+        "-p", "--port", type=int, help="Serve the metrics on this local port"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=5.0,
+        help="Seconds between updates of the lock and config state",
+    )
+    args = parser.parse_args()
+
+    metrics = LabMetrics(args.config)
+    metrics.update()
+    metrics.scan_usb()
+    if args.output is None and args.port is None:
+        print(metrics.render(metrics.broker_waiters()), end="")
+        sys.exit(0)
+
+    monitor = TtyMonitor()
+    if args.port is not None:
+        server = _serve(metrics, args.port)
+        nm_print(f"Serving metrics on http://127.0.0.1:{server.server_port}/")
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        while True:
+            if args.output is not None:
+                _write_atomic(args.output, metrics.render(metrics.broker_waiters()))
+            if monitor.wait(args.interval):
+                metrics.scan_usb(event=True)
+            metrics.update()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+from pathlib import Path
+
+import inet_nm.config as cfg
+from inet_nm._helpers import nm_print
+from inet_nm.config_sqlite import DB_FILENAME, SqliteBackend
+
+
+def main():
+    """CLI entrypoint for migrating the JSON config files to SQLite."""
+    parser = argparse.ArgumentParser(
+        description="Migrate the JSON config files to the SQLite backend. "
+        "Once migrated the JSON files are no longer used."
+    )
+    cfg.config_arg(parser)
+    parser.add_argument(
+        "-F", "--force", action="store_true", help="Overwrite an existing database."
+    )
+    args = parser.parse_args()
+
+    db_path = Path(args.config, DB_FILENAME).expanduser()
+    if db_path.exists():
+        if not args.force:
+            nm_print(f"{db_path} already exists, use --force to overwrite it")
+            return
+        db_path.unlink()
+
+    for path in SqliteBackend(db_path).migrate_from_json(args.config):
+        nm_print(f"Imported {path}")
+    cfg.CONFIG_STORE.invalidate()
+    nm_print(f"Created {db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -72,25 +72,22 @@ def _main():
     names = [usb_info["name"] for usb_info in loc_mapping.values()]
     def_name = try_to_inc_map_name(names)
     name = nm_prompt_default_input("Enter a name for the location", default=def_name)
+    update = True
     if location in loc_mapping:
-        res = nm_prompt_confirm(
+        update = nm_prompt_confirm(
             f"Overwrite {location} currently " f"{loc_mapping[location]}?", default=True
         )
-        if res:
+    # Reload under the lock so concurrent changes to other locations are kept
+    with loc_cfg.lock():
+        loc_mapping = loc_cfg.load()
+        if update:
             loc_mapping[location] = {
                 "name": name,
                 "power_control": args.power_control,
                 "hub": hub,
                 "port": port,
             }
-    else:
-        loc_mapping[location] = {
-            "name": name,
-            "power_control": args.power_control,
-            "hub": hub,
-            "port": port,
-        }
-    loc_cfg.save(loc_mapping)
+        loc_cfg.save(loc_mapping)
     nm_print(f"{name} mapped to {location}")
     nm_print(f"Updated {loc_cfg.file_path}")
 
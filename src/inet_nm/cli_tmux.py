@@ -7,6 +7,7 @@ import inet_nm.check as chk
 import inet_nm.config as cfg
 import inet_nm.runner_apps as apps
 import inet_nm.runner_helper as rh
+from inet_nm.usage import UsageLog
 
 
 def _kill_tmux(session_name):
@@ -48,6 +49,7 @@ def main():
         default=None,
         help="Command to send after starting tmux session.",
     )
+    rh.launch_args(parser)
     cfg.config_arg(parser)
     chk.check_args(parser)
     args = parser.parse_args()
@@ -57,6 +59,7 @@ def main():
     timeout = kwargs.pop("timeout")
     cmd = kwargs.pop("cmd")
     force = kwargs.pop("force")
+    launch = rh.pop_launch_args(kwargs)
     sname = kwargs.pop("session_name")
     nodes = rh.sanity_check("tmux", **kwargs)
 
@@ -70,14 +73,24 @@ def main():
     signal.signal(signal.SIGHUP, rh.do_nothing)
     if window:
         with apps.NmTmuxWindowedRunner(
-            nodes, default_timeout=timeout, extra_env=extra_env, force=force
+            nodes,
+            default_timeout=timeout,
+            extra_env=extra_env,
+            force=force,
+            usage_log=UsageLog(args.config),
+            **launch,
         ) as runner:
             runner.cmd = cmd
             runner.session_name = sname
             runner.run()
     else:
         with apps.NmTmuxPanedRunner(
-            nodes, default_timeout=timeout, extra_env=extra_env, force=force
+            nodes,
+            default_timeout=timeout,
+            extra_env=extra_env,
+            force=force,
+            usage_log=UsageLog(args.config),
+            **launch,
         ) as runner:
             runner.cmd = cmd
             runner.session_name = sname
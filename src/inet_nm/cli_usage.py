@@ -0,0 +1,87 @@
+import argparse
+import json
+import time
+from typing import Dict
+
+import inet_nm.config as cfg
+from inet_nm.history import parse_since
+from inet_nm.usage import UsageLog, aggregate_usage
+
+
+def _print_table(groups: Dict[str, Dict], title: str):
+    if len(groups) == 0:
+        return
+    max_name_len = max(len(title), *[len(name) for name in groups])
+    header = (
+        f"| {title:<{max_name_len + 1}}"
+        f"| {'Holds':<8}"
+        f"| {'Hold [s]':<11}"
+        f"| {'Util [%]':<9}"
+        f"| {'Mean wait':<10}"
+        f"| {'Max wait':<10}"
+        f"| {'Failures':<9}|"
+    )
+    print("-" * len(header))
+    print(header)
+    print("-" * len(header))
+    for name in sorted(groups):
+        group = groups[name]
+        print(
+            f"| {name:<{max_name_len + 1}}"
+            f"| {group['holds']:>7} "
+            f"| {group['hold_seconds']:>10.1f} "
+            f"| {group['utilization'] * 100:>8.2f} "
+            f"| {group['mean_wait']:>9.1f} "
+            f"| {group['max_wait']:>9.1f} "
+            f"| {group['failures']:>8} |"
+        )
+    print("-" * len(header))
+
+
+def main():
+    """CLI entrypoint for showing the node usage."""
+    parser = argparse.ArgumentParser(
+        description="Show how much the nodes were used and waited for"
+    )
+    cfg.config_arg(parser)
+    parser.add_argument(
+        "--since",
+        type=str,
+        default="7d",
+        help="Start of the time window, either a duration ago such as 30m, "
+        "12h or 7d, an ISO date or seconds since the epoch",
+    )
+    parser.add_argument(
+        "--until",
+        type=str,
+        help="End of the time window in the same format as --since, defaults to now",
+    )
+    parser.add_argument(
+        "--by",
+        choices=["board", "node"],
+        default="board",
+        help="Aggregate per board or per node",
+    )
+    parser.add_argument("--json", action="store_true", help="Output in JSON format")
+    args = parser.parse_args()
+
+    now = time.time()
+    try:
+        since = parse_since(args.since, now)
+        until = now if args.until is None else parse_since(args.until, now)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if until <= since:
+        parser.error("--until must be later than --since")
+
+    nodes = [node for node in cfg.NodesConfig(args.config).load() if not node.ignore]
+    entries = UsageLog(args.config).read(since, until)
+    groups = aggregate_usage(entries, nodes, until - since, by=args.by)
+    if args.json:
+        print(json.dumps(groups, indent=2, sort_keys=True))
+    else:
+        _print_table(groups, "Board" if args.by == "board" else "UID")
+
+
+if __name__ == "__main__":
+    main()
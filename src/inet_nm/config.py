@@ -5,13 +5,152 @@ the boards and nodes, as well as for handling the path configuration.
 """
 
 import argparse
+import copy
+import fcntl
 import json
+import marshal
 import os
+import stat
+import sys
+import threading
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
 
 from inet_nm._helpers import get_commit, nm_print
+from inet_nm.config_sqlite import SqliteBackend
 from inet_nm.data_types import EnvConfigFormat, NmNode
+from inet_nm.node_index import NodeIndex
+
+
+class ConfigStore:
+    """Process-wide cache of loaded configuration data.
+
+    Each entry is tied to the stat signature of the files it was built from.
+    On later access the files are only stat'ed, the loader only runs again
+    if any of the files changed, appeared or disappeared.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[Tuple, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(paths: List[Path]) -> Tuple:
+        """
+        Get the stat signature of files.
+
+        Args:
+            paths: Paths of the files.
+
+        Returns:
+            A tuple of (mtime, size, inode) per file, None for missing files.
+        """
+        sig = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                sig.append(None)
+                continue
+            sig.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return tuple(sig)
+
+    def get(self, key: Hashable, paths: List[Path], loader: Callable[[], Any]) -> Any:
+        """
+        Get cached data or load it if any of the source files changed.
+
+        The returned data is shared, callers must copy before modifying it.
+
+        Args:
+            key: Key of the entry.
+            paths: Source files the data is built from.
+            loader: Function to build the data.
+
+        Returns:
+            The cached or freshly loaded data.
+        """
+        sig = self.signature(paths)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == sig:
+            return entry[1]
+        data = loader()
+        with self._lock:
+            self._entries[key] = (sig, data)
+        return data
+
+    def invalidate(self):
+        """Drop all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+CONFIG_STORE = ConfigStore()
+
+
+class ConfigDirLock:
+    """Re-entrant inter-process lock of a config directory.
+
+    Writers hold the lock while changing config files. It is an advisory
+    flock on a lock file in the config dir, so the kernel releases it if the
+    holding process dies. Within a process it is re-entrant per thread.
+
+    Use `ConfigDirLock.get` to get the shared instance of a directory.
+
+    Args:
+        config_dir: Directory for the configuration files.
+    """
+
+    _FILENAME = ".config.lock"
+    _instances: Dict[Path, "ConfigDirLock"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, config_dir: Union[Path, str]):
+        self.path = Path(config_dir, self._FILENAME).expanduser()
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    @classmethod
+    def get(cls, config_dir: Union[Path, str]) -> "ConfigDirLock":
+        """
+        Get the lock shared by all users of a config directory.
+
+        Args:
+            config_dir: Directory for the configuration files.
+
+        Returns:
+            The lock of the config directory.
+        """
+        key = Path(config_dir).expanduser().resolve()
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(key)
+            return cls._instances[key]
+
+    def __enter__(self) -> "ConfigDirLock":
+        self._rlock.acquire()
+        try:
+            if self._depth == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            if self._fd is not None and self._depth == 0:
+                os.close(self._fd)
+                self._fd = None
+            self._rlock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
 
 
 class _ConfigFile:
@@ -21,17 +160,22 @@ class _ConfigFile:
     def __init__(self, config_dir: Union[Path, str]):
         self.config_dir = Path(config_dir)
         self.file_path = Path(self.config_dir / self._FILENAME).expanduser()
+        self.backend = SqliteBackend.for_config_dir(self.config_dir)
 
     def check_file(self, writable: bool = False) -> bool:
         """
         Check if a file exists and can be accessed.
 
+        With the SQLite backend it checks if the file data has been stored.
+
         Args:
             writable: If True, check if the file is writable.
 
         Returns:
             True if the file exists and can be accessed, False otherwise.
         """
+        if self.backend is not None:
+            return writable or self.backend.has_document(self._FILENAME)
         file_path = self.file_path
         file_path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -46,17 +190,72 @@ class _ConfigFile:
                 pass
         return True
 
-    def save(self, data):
-        self.check_file(writable=True)
-        with self.file_path.open("w") as file:
-            json.dump(data, file, indent=2, sort_keys=True)
+    def lock(self) -> ConfigDirLock:
+        """
+        Get the lock of the config dir.
 
-    def load(self):
+        Hold it around a load and save to prevent lost updates from
+        concurrent writers.
+
+        Returns:
+            The re-entrant config dir lock.
+        """
+        return ConfigDirLock.get(self.config_dir)
+
+    def save(self, data):
+        if self.backend is not None:
+            self.backend.save_document(self._FILENAME, data)
+        else:
+            with self.lock():
+                self.check_file(writable=True)
+                self._write_atomic(data)
+        CONFIG_STORE.invalidate()
+
+    def _write_atomic(self, data):
+        # Readers must never see a partially written file, so write a temp
+        # file and replace the target in one step.
+        tmp_path = self.file_path.with_name(f".{self._FILENAME}.{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("w") as file:
+                json.dump(data, file, indent=2, sort_keys=True)
+                file.flush()
+                os.fsync(file.fileno())
+            if self.file_path.exists():
+                os.chmod(tmp_path, stat.S_IMODE(self.file_path.stat().st_mode))
+            os.replace(tmp_path, self.file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _source_paths(self, *paths: Path) -> List[Path]:
+        if self.backend is not None:
+            return [self.backend.db_path]
+        return [self.file_path, *paths]
+
+    def _load_file(self):
+        if self.backend is not None:
+            data = self.backend.load_document(self._FILENAME)
+            return self._LOAD_TYPE() if data is None else data
         if not self.check_file(writable=False):
             return self._LOAD_TYPE()
         with self.file_path.open() as file:
             return json.load(file)
 
+    def _load_user_file(self, path: Path) -> Dict[str, List[str]]:
+        if self.backend is not None:
+            return self.backend.load_document(path.name) or {}
+        try:
+            with path.open() as file:
+                return json.load(file)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def load(self):
+        data = CONFIG_STORE.get(
+            ("file", self.file_path), self._source_paths(), self._load_file
+        )
+        return copy.deepcopy(data)
+
 
 class BoardInfoConfig(_ConfigFile):
     """Class for handling the board info configuration.
@@ -86,26 +285,37 @@ class BoardInfoConfig(_ConfigFile):
         """
         return super().save(data)
 
+    @property
+    def user_file_path(self) -> Path:
+        """Path to the user board info that extends the board info."""
+        return Path(self.file_path.parent / f"user_{self._FILENAME}")
+
+    def _load_merged(self) -> Dict[str, List[str]]:
+        data = self._load_file()
+
+        user_data = self._load_user_file(self.user_file_path)
+        # Extend data with user list of features
+        for board, features in user_data.items():
+            if board not in data:
+                data[board] = []
+            data[board].extend(features)
+        return data
+
     def load(self) -> Dict[str, Union[str, int]]:
         """Load the board info configuration.
 
         Returns:
             The loaded board info data.
         """
-        data = super().load()
-
-        user_path = Path(self.file_path.parent / f"user_{self._FILENAME}")
-        try:
-            with user_path.open() as file:
-                user_data = json.load(file)
-            # Extend data with user list of features
-            for board, features in user_data.items():
-                if board not in data:
-                    data[board] = []
-                data[board].extend(features)
-        except (FileNotFoundError, json.decoder.JSONDecodeError):
-            pass
-        return data
+        data = CONFIG_STORE.get(
+            ("board_info", self.file_path),
+            self._source_paths(self.user_file_path),
+            self._load_merged,
+        )
+        return {
+            board: list(info) if isinstance(info, list) else info
+            for board, info in data.items()
+        }
 
 
 class BoardInfoCommitHash(_ConfigFile):
@@ -153,50 +363,319 @@ class NodesConfig(_ConfigFile):
 
     _FILENAME = "nodes.json"
     _LOAD_TYPE = list
+    _SNAPSHOT_FILENAME = "nodes_snapshot.bin"
+    _SNAPSHOT_VERSION = 1
+    _JOURNAL_FILENAME = "nodes.journal"
+    JOURNAL_COMPACT_SIZE = 64 * 1024
+    JOURNAL_READ_RETRIES = 5
 
     def save(self, data: List[NmNode]):
         """Save the nodes configuration.
 
+        This replaces all nodes, including pending journal entries.
+
         Args:
             data: The nodes data to save.
         """
-        data = [node.to_dict() for node in data]
-        node: dict
-        for node in data:
-            if "features_provided" in node:
-                node["features_provided"] = []
-        return super().save(data)
+        with self.lock():
+            super().save([self._node_to_data(node) for node in data])
+            if self.backend is None:
+                self._remove_journal()
+
+    @property
+    def journal_path(self) -> Path:
+        """Path to the journal of single node updates."""
+        return Path(self.file_path.parent / self._JOURNAL_FILENAME)
+
+    def _remove_journal(self):
+        try:
+            self.journal_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _truncate_torn_tail(self):
+        # An interrupted append leaves a last line without a newline, cut it
+        # off so the next entry is not appended onto it.
+        try:
+            with self.journal_path.open("rb+") as file:
+                end = file.seek(0, os.SEEK_END)
+                if not end:
+                    return
+                file.seek(end - 1)
+                if file.read(1) == b"\n":
+                    return
+                pos = end
+                while pos > 0:
+                    step = min(4096, pos)
+                    pos -= step
+                    file.seek(pos)
+                    newline = file.read(step).rfind(b"\n")
+                    if newline >= 0:
+                        file.truncate(pos + newline + 1)
+                        return
+                file.truncate(0)
+        except FileNotFoundError:
+            pass
+
+    def _append_journal(self, entry: Dict[str, Any]):
+        with self.lock():
+            self._truncate_torn_tail()
+            with self.journal_path.open("a") as file:
+                file.write(json.dumps(entry, sort_keys=True) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            if self.journal_path.stat().st_size >= self.JOURNAL_COMPACT_SIZE:
+                self.compact()
+        CONFIG_STORE.invalidate()
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        entries = []
+        try:
+            with self.journal_path.open() as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.decoder.JSONDecodeError:
+                        # A torn last line of an interrupted append.
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    @staticmethod
+    def _replay_journal(
+        data: List[Dict[str, Any]], entries: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        if not entries:
+            return data
+        nodes = {node["uid"]: node for node in data}
+        for entry in entries:
+            if entry["op"] == "upsert":
+                nodes[entry["node"]["uid"]] = entry["node"]
+            elif entry["op"] == "remove":
+                nodes.pop(entry["uid"], None)
+        return list(nodes.values())
+
+    def compact(self):
+        """Fold the journal of single node updates into nodes.json."""
+        if self.backend is not None:
+            return
+        with self.lock():
+            data = self._load_file()
+            self.check_file(writable=True)
+            self._write_atomic(data)
+            self._remove_journal()
+
+    @staticmethod
+    def _node_to_data(node: NmNode) -> Dict[str, Any]:
+        data = dict(node.to_dict())
+        # Features are always merged from the board info on load
+        data["features_provided"] = []
+        return data
+
+    def update_node(self, node: NmNode):
+        """Add a node or replace the node with the same UID.
+
+        The update is appended to the journal, which is folded into
+        nodes.json once it grows. With the SQLite backend only the row of
+        the node is written.
+
+        Args:
+            node: The node to add or replace.
+        """
+        if self.backend is not None:
+            self.backend.upsert_node(self._node_to_data(node))
+            CONFIG_STORE.invalidate()
+            return
+        self._append_journal({"op": "upsert", "node": self._node_to_data(node)})
+
+    def remove_node(self, node: NmNode):
+        """Remove the node with the same UID.
+
+        The removal is appended to the journal, which is folded into
+        nodes.json once it grows. With the SQLite backend only the row of
+        the node is removed.
+
+        Args:
+            node: The node to remove.
+        """
+        if self.backend is not None:
+            self.backend.delete_node(node.uid)
+            CONFIG_STORE.invalidate()
+            return
+        self._append_journal({"op": "remove", "uid": node.uid})
+
+    def query(
+        self,
+        boards: List[str] = None,
+        uids: List[str] = None,
+        feat_filter: List[str] = None,
+    ) -> List[NmNode]:
+        """Load only the nodes matching the filters.
+
+        With the SQLite backend the filters are applied by indexed queries,
+        otherwise the nodes are loaded and filtered.
+
+        Args:
+            boards: Only return nodes of these boards.
+            uids: Only return nodes with these UIDs.
+            feat_filter: Only return nodes providing all of these features.
+
+        Returns:
+            The matching nodes.
+        """
+        if self.backend is not None:
+            res = self.backend.query_nodes(boards, uids, feat_filter)
+            nodes = [NmNode.from_dict(item) for item in res["nodes"]]
+            _merge_features(nodes, res["node_info"], res["board_info"])
+            return nodes
+        index = self.load_index()
+        mask = index.with_features(feat_filter or [])
+        if boards:
+            mask &= index.with_boards(boards)
+        if uids:
+            mask &= index.with_uids(uids)
+        return index.select(mask)
+
+    @property
+    def user_file_path(self) -> Path:
+        """Path to the user node info that extends the node features."""
+        return Path(self.file_path.parent / "user_node_info.json")
+
+    def source_paths(self) -> List[Path]:
+        """
+        Get all files the loaded nodes are built from.
+
+        Returns:
+            The paths of the nodes, user node info and board info files.
+        """
+        bic = BoardInfoConfig(self.config_dir)
+        return self._source_paths(
+            self.journal_path, self.user_file_path, bic.file_path, bic.user_file_path
+        )
+
+    @property
+    def snapshot_path(self) -> Path:
+        """Path to the compiled snapshot of the merged nodes."""
+        return Path(self.file_path.parent / self._SNAPSHOT_FILENAME)
 
     def load(self) -> List[NmNode]:
         """Load the nodes configuration.
 
+        The merged nodes are cached for the process and only rebuilt if one
+        of the source files changes. Between processes the merged nodes are
+        kept in a binary snapshot next to the JSON files.
+
         Returns:
             The loaded nodes data.
         """
-        data = super().load()
-        nodes = [NmNode.from_dict(item) for item in data]
+        # The database is already a compact format, no need for a snapshot.
+        loader = self._load_merged if self.backend else self._load_snapshot
+        data = CONFIG_STORE.get(("nodes", self.file_path), self.source_paths(), loader)
+        return [_node_from_cache(item) for item in data]
 
-        user_path = Path(self.file_path.parent / "user_node_info.json")
+    def load_index(self) -> NodeIndex:
+        """Load the nodes with an inverted index of features, boards and UIDs.
+
+        The index is cached along with the nodes, only the nodes are copied.
+
+        Returns:
+            The index over the loaded nodes.
+        """
+        nodes = self.load()
+        index = CONFIG_STORE.get(
+            ("nodes_index", self.file_path),
+            self.source_paths(),
+            lambda: NodeIndex(nodes),
+        )
+        return index.rebind(nodes)
+
+    def _snapshot_header(self) -> Tuple:
+        return (self._SNAPSHOT_VERSION, tuple(sys.version_info[:2]))
+
+    def _load_snapshot(self) -> List[Dict[str, Any]]:
+        sig = ConfigStore.signature(self.source_paths())
         try:
-            with user_path.open() as file:
-                user_data = json.load(file)
-            for uid, features in user_data.items():
-                node: NmNode
-                for node in nodes:
-                    if node.uid == uid:
-                        node.features_provided.extend(features)
-                        break
-        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            with self.snapshot_path.open("rb") as file:
+                header, snap_sig, data = marshal.load(file)
+            if header == self._snapshot_header() and snap_sig == sig:
+                return data
+        except (OSError, EOFError, ValueError, TypeError):
             pass
 
-        # Directly add features provided from the board info
-        bic = BoardInfoConfig(self.config_dir)
-        bi = bic.load()
-        for node in nodes:
-            if node.board in bi:
-                fp = set((bi[node.board] or []) + (node.features_provided or []))
-                node.features_provided = sorted(list(fp))
-        return nodes
+        data = self._load_merged()
+        if sig[0] is None:
+            return data
+        # The snapshot is only an accelerator, a read-only config dir is fine.
+        tmp_path = self.snapshot_path.with_name(
+            f".{self._SNAPSHOT_FILENAME}.{os.getpid()}"
+        )
+        try:
+            with tmp_path.open("wb") as file:
+                marshal.dump((self._snapshot_header(), sig, data), file)
+            os.replace(tmp_path, self.snapshot_path)
+        except (OSError, ValueError):
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+        return data
+
+    def _load_file(self) -> List[Dict[str, Any]]:
+        if self.backend is not None:
+            return super()._load_file()
+        # Readers take no lock, if the journal changed while nodes.json was
+        # read a compaction may have folded newer entries into it, so the
+        # old entries must not be replayed on top of it.
+        for _ in range(self.JOURNAL_READ_RETRIES):
+            before = self._journal_stat()
+            entries = self._read_journal()
+            data = super()._load_file()
+            if self._journal_stat() == before:
+                return self._replay_journal(data, entries)
+        with self.lock():
+            entries = self._read_journal()
+            return self._replay_journal(super()._load_file(), entries)
+
+    def _journal_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            info = self.journal_path.stat()
+        except FileNotFoundError:
+            return None
+        return (info.st_ino, info.st_size, info.st_mtime_ns)
+
+    def _load_merged(self) -> List[Dict[str, Any]]:
+        data = self._load_file()
+        nodes = [NmNode.from_dict(item) for item in data]
+        user_data = self._load_user_file(self.user_file_path)
+        board_info = BoardInfoConfig(self.config_dir).load()
+        _merge_features(nodes, user_data, board_info)
+        return [dict(node.to_dict()) for node in nodes]
+
+
+def _merge_features(
+    nodes: List[NmNode],
+    node_info: Dict[str, List[str]],
+    board_info: Dict[str, List[str]],
+):
+    first_by_uid = {}
+    for node in nodes:
+        first_by_uid.setdefault(node.uid, node)
+    for uid, features in node_info.items():
+        if uid in first_by_uid:
+            first_by_uid[uid].features_provided.extend(features)
+
+    # Directly add features provided from the board info
+    for node in nodes:
+        if node.board in board_info:
+            fp = set((board_info[node.board] or []) + (node.features_provided or []))
+            node.features_provided = sorted(list(fp))
+
+
+def _node_from_cache(item: Dict[str, Any]) -> NmNode:
+    node = NmNode.from_dict(dict(item))
+    node.features_provided = list(node.features_provided)
+    return node
 
 
 class EnvConfig(_ConfigFile):
@@ -270,6 +749,45 @@ class LocationCache(_ConfigFile):
     _LOAD_TYPE = list
 
 
+class JobDurationsConfig(_ConfigFile):
+    """Class for handling the history of job durations.
+
+    The job durations are a JSON file with the mean duration in seconds and
+    the number of runs of each command per board,
+    `{"<board>": {"<cmd>": [mean, count]}}`.
+
+    Args:
+        config_dir: Directory for the configuration files.
+
+    Attributes:
+        file_path (Path): Path to the job durations file.
+    """
+
+    _FILENAME = "job_durations.json"
+    _LOAD_TYPE = dict
+    ALPHA = 0.3
+
+    def record(self, durations: List[Tuple[str, str, float]]):
+        """Merge the durations of new runs into the history.
+
+        The mean is a moving average weighting recent runs by `ALPHA`, so
+        it follows jobs that get slower or faster.
+
+        Args:
+            durations: The board, command and duration in seconds of each run.
+        """
+        if not durations:
+            return
+        with self.lock():
+            data = self.load()
+            for board, cmd, seconds in durations:
+                mean, count = data.setdefault(board, {}).get(cmd, (0.0, 0))
+                count += 1
+                mean += (seconds - mean) * max(1 / count, self.ALPHA)
+                data[board][cmd] = [round(mean, 3), count]
+            self.save(data)
+
+
 def get_default_path() -> Path:
     """
     Return the default path for the configuration files.
@@ -0,0 +1,398 @@
+"""SQLite storage backend for the inet_nm configuration.
+
+The backend is an alternative to the JSON files in the config directory.
+It is used by the config classes as soon as an `inet_nm.sqlite` database
+exists in the config directory, which can be created from the existing
+JSON files with `inet-nm-migrate-sqlite`.
+
+Each JSON file maps to one or more tables, the config classes still load
+and save the same data structures as with the JSON files. Nodes, board
+features, locations and the location cache are stored row-wise and indexed
+so filters can be pushed down into queries and single nodes can be updated
+without rewriting everything.
+"""
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+DB_FILENAME = "inet_nm.sqlite"
+
+_NODE_COLUMNS = [
+    "uid",
+    "serial",
+    "vendor_id",
+    "product_id",
+    "vendor",
+    "driver",
+    "model",
+    "board",
+    "mock",
+    "ignore",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    uid TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    serial TEXT,
+    vendor_id TEXT,
+    product_id TEXT,
+    vendor TEXT,
+    driver TEXT,
+    model TEXT,
+    board TEXT,
+    mock INTEGER NOT NULL DEFAULT 0,
+    ignore INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS nodes_board ON nodes (board);
+CREATE INDEX IF NOT EXISTS nodes_pos ON nodes (pos);
+CREATE TABLE IF NOT EXISTS boards (
+    board TEXT NOT NULL,
+    user INTEGER NOT NULL,
+    PRIMARY KEY (board, user)
+);
+CREATE TABLE IF NOT EXISTS board_features (
+    board TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    user INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS board_features_board ON board_features (board);
+CREATE INDEX IF NOT EXISTS board_features_feature ON board_features (feature);
+CREATE TABLE IF NOT EXISTS node_features (
+    uid TEXT NOT NULL,
+    feature TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS node_features_uid ON node_features (uid);
+CREATE INDEX IF NOT EXISTS node_features_feature ON node_features (feature);
+CREATE TABLE IF NOT EXISTS locations (
+    id_path TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS location_cache (
+    id_path TEXT PRIMARY KEY,
+    node_uid TEXT,
+    state TEXT
+);
+CREATE INDEX IF NOT EXISTS location_cache_node_uid ON location_cache (node_uid);
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# JSON files that are stored as a whole in the documents table
+_DOCUMENTS = ["env.json", "board_info_commit_hash.json"]
+
+MIGRATED_FILES = [
+    "nodes.json",
+    "user_node_info.json",
+    "board_info.json",
+    "user_board_info.json",
+    "location.json",
+    "location_cache.json",
+] + _DOCUMENTS
+
+
+def _placeholders(values: List) -> str:
+    return ", ".join("?" * len(values))
+
+
+def _values_table(conn: sqlite3.Connection, name: str, values: List) -> str:
+    # Older SQLite builds allow only 999 bound variables, so large selections
+    # go through a temporary table of the connection instead of one ? each.
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name} (value TEXT)")
+    conn.execute(f"DELETE FROM temp.{name}")
+    conn.executemany(f"INSERT INTO temp.{name} VALUES (?)", [(v,) for v in values])
+    return f"(SELECT value FROM temp.{name})"
+
+
+class SqliteBackend:
+    """Storage of the configuration files in a SQLite database.
+
+    Args:
+        db_path: Path to the database file.
+    """
+
+    def __init__(self, db_path: Union[Path, str]):
+        self.db_path = Path(db_path)
+
+    @classmethod
+    def for_config_dir(cls, config_dir: Union[Path, str]) -> Optional["SqliteBackend"]:
+        """
+        Get the backend of a config directory if it has been migrated.
+
+        Args:
+            config_dir: Directory for the configuration files.
+
+        Returns:
+            The backend or None if the config dir uses JSON files.
+        """
+        db_path = Path(config_dir, DB_FILENAME).expanduser()
+        if not db_path.exists():
+            return None
+        return cls(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self):
+        """Create the database and all tables and indexes."""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def has_document(self, filename: str) -> bool:
+        """
+        Check if data for a config file has been stored.
+
+        Args:
+            filename: Name of the JSON config file.
+
+        Returns:
+            True if there is data for the file.
+        """
+        return bool(self.load_document(filename))
+
+    def load_document(self, filename: str) -> Any:
+        """
+        Load the data of a config file.
+
+        Args:
+            filename: Name of the JSON config file.
+
+        Returns:
+            The same data that would be in the JSON file, None if empty.
+        """
+        with closing(self._connect()) as conn:
+            if filename == "nodes.json":
+                rows = conn.execute("SELECT * FROM nodes ORDER BY pos").fetchall()
+                return [self._node_from_row(row) for row in rows] or None
+            if filename in ("board_info.json", "user_board_info.json"):
+                user = int(filename.startswith("user_"))
+                return self._board_info(conn, user=user) or None
+            if filename == "user_node_info.json":
+                return self._node_info(conn) or None
+            if filename == "location.json":
+                rows = conn.execute("SELECT * FROM locations ORDER BY id_path")
+                return {row["id_path"]: json.loads(row["data"]) for row in rows} or None
+            if filename == "location_cache.json":
+                rows = conn.execute("SELECT * FROM location_cache ORDER BY id_path")
+                return [dict(row) for row in rows] or None
+            row = conn.execute(
+                "SELECT data FROM documents WHERE name = ?", (filename,)
+            ).fetchone()
+            return json.loads(row["data"]) if row else None
+
+    def save_document(self, filename: str, data: Any):
+        """
+        Replace the data of a config file in a single transaction.
+
+        Args:
+            filename: Name of the JSON config file.
+            data: The same data that would be written to the JSON file.
+        """
+        with closing(self._connect()) as conn, conn:
+            self._save_document(conn, filename, data)
+
+    def _save_document(self, conn: sqlite3.Connection, filename: str, data: Any):
+        if filename == "nodes.json":
+            conn.execute("DELETE FROM nodes")
+            for pos, node in enumerate(data or []):
+                self._insert_node(conn, node, pos)
+        elif filename in ("board_info.json", "user_board_info.json"):
+            user = int(filename.startswith("user_"))
+            conn.execute("DELETE FROM boards WHERE user = ?", (user,))
+            conn.execute("DELETE FROM board_features WHERE user = ?", (user,))
+            for board, features in (data or {}).items():
+                conn.execute("INSERT INTO boards VALUES (?, ?)", (board, user))
+                conn.executemany(
+                    "INSERT INTO board_features VALUES (?, ?, ?)",
+                    [(board, feature, user) for feature in features or []],
+                )
+        elif filename == "user_node_info.json":
+            conn.execute("DELETE FROM node_features")
+            for uid, features in (data or {}).items():
+                conn.executemany(
+                    "INSERT INTO node_features VALUES (?, ?)",
+                    [(uid, feature) for feature in features],
+                )
+        elif filename == "location.json":
+            conn.execute("DELETE FROM locations")
+            conn.executemany(
+                "INSERT INTO locations VALUES (?, ?)",
+                [(key, json.dumps(val)) for key, val in (data or {}).items()],
+            )
+        elif filename == "location_cache.json":
+            conn.execute("DELETE FROM location_cache")
+            conn.executemany(
+                "INSERT INTO location_cache VALUES (?, ?, ?)",
+                [
+                    (entry["id_path"], entry.get("node_uid"), entry.get("state"))
+                    for entry in data or []
+                    if entry
+                ],
+            )
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?)",
+                (filename, json.dumps(data)),
+            )
+
+    @staticmethod
+    def _node_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        node = {key: row[key] for key in _NODE_COLUMNS}
+        node["mock"] = bool(node["mock"])
+        node["ignore"] = bool(node["ignore"])
+        node["features_provided"] = []
+        return node
+
+    @staticmethod
+    def _insert_node(conn: sqlite3.Connection, node: Dict[str, Any], pos: int):
+        values = [node.get(key) for key in _NODE_COLUMNS]
+        conn.execute(
+            f"INSERT OR REPLACE INTO nodes (pos, {', '.join(_NODE_COLUMNS)}) "
+            f"VALUES (?, {_placeholders(values)})",
+            [pos] + values,
+        )
+
+    @staticmethod
+    def _board_info(
+        conn: sqlite3.Connection, user: int, boards: List[str] = None
+    ) -> Dict[str, List[str]]:
+        board_sql = ""
+        params = [user]
+        if boards is not None:
+            board_sql = f" AND board IN {_values_table(conn, 'sel_boards', boards)}"
+        info = {
+            row["board"]: []
+            for row in conn.execute(
+                f"SELECT board FROM boards WHERE user = ?{board_sql}", params
+            )
+        }
+        rows = conn.execute(
+            f"SELECT board, feature FROM board_features WHERE user = ?{board_sql} "
+            "ORDER BY rowid",
+            params,
+        )
+        for row in rows:
+            info.setdefault(row["board"], []).append(row["feature"])
+        return info
+
+    @staticmethod
+    def _node_info(
+        conn: sqlite3.Connection, uids: List[str] = None
+    ) -> Dict[str, List[str]]:
+        sql = "SELECT uid, feature FROM node_features"
+        params = []
+        if uids is not None:
+            sql += f" WHERE uid IN {_values_table(conn, 'sel_uids', uids)}"
+        info = {}
+        for row in conn.execute(sql + " ORDER BY rowid", params):
+            info.setdefault(row["uid"], []).append(row["feature"])
+        return info
+
+    def upsert_node(self, node: Dict[str, Any]):
+        """
+        Add or replace a single node, keeping its position if it exists.
+
+        Args:
+            node: The node data as stored in nodes.json.
+        """
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT pos FROM nodes WHERE uid = ?", (node["uid"],)
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    "SELECT COALESCE(MAX(pos) + 1, 0) AS pos FROM nodes"
+                ).fetchone()
+            self._insert_node(conn, node, row["pos"])
+
+    def delete_node(self, uid: str):
+        """
+        Remove a single node.
+
+        Args:
+            uid: UID of the node to remove.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM nodes WHERE uid = ?", (uid,))
+
+    def query_nodes(
+        self,
+        boards: List[str] = None,
+        uids: List[str] = None,
+        features: List[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Query nodes with the filters applied by the database.
+
+        A node provides a feature if its board or the node itself has it,
+        including user provided board and node features.
+
+        Args:
+            boards: Only return nodes of these boards.
+            uids: Only return nodes with these UIDs.
+            features: Only return nodes providing all of these features.
+
+        Returns:
+            The matching nodes in their stored order, together with the
+            board info and user node info needed to merge their features.
+        """
+        with closing(self._connect()) as conn:
+            where = []
+            params = []
+            if boards:
+                where.append(
+                    f"n.board IN {_values_table(conn, 'query_boards', boards)}"
+                )
+            if uids:
+                where.append(f"n.uid IN {_values_table(conn, 'query_uids', uids)}")
+            for feature in features or []:
+                where.append(
+                    "(EXISTS (SELECT 1 FROM board_features b "
+                    "WHERE b.board = n.board AND b.feature = ?) "
+                    "OR EXISTS (SELECT 1 FROM node_features f "
+                    "WHERE f.uid = n.uid AND f.feature = ?))"
+                )
+                params += [feature, feature]
+            sql = "SELECT * FROM nodes n"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            rows = conn.execute(sql + " ORDER BY n.pos", params).fetchall()
+            nodes = [self._node_from_row(row) for row in rows]
+            found_boards = sorted({node["board"] for node in nodes if node["board"]})
+            board_info = self._board_info(conn, user=0, boards=found_boards)
+            user_board_info = self._board_info(conn, user=1, boards=found_boards)
+            node_info = self._node_info(conn, uids=[node["uid"] for node in nodes])
+        for board, features in user_board_info.items():
+            board_info.setdefault(board, []).extend(features)
+        return {"nodes": nodes, "board_info": board_info, "node_info": node_info}
+
+    def migrate_from_json(self, config_dir: Union[Path, str]) -> List[Path]:
+        """
+        Import all existing JSON config files in a single transaction.
+
+        Args:
+            config_dir: Directory with the JSON configuration files.
+
+        Returns:
+            The JSON files that have been imported.
+        """
+        self.create()
+        imported = []
+        with closing(self._connect()) as conn, conn:
+            for filename in MIGRATED_FILES:
+                path = Path(config_dir, filename).expanduser()
+                try:
+                    with path.open() as file:
+                        data = json.load(file)
+                except (FileNotFoundError, json.decoder.JSONDecodeError):
+                    continue
+                self._save_document(conn, filename, data)
+                imported.append(path)
+        return imported
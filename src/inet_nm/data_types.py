@@ -129,3 +129,28 @@ class NodeEnv(DictSerializable):
 
         """
         return {k: str(v) for k, v in self.__dict__.items()}
+
+
+@dataclass
+class NmJob(DictSerializable):
+    """
+    A command to run once on any node that meets its requirements.
+
+    Attributes:
+        cmd: Shell command of the job.
+        name: Name of the job.
+        boards: Boards the job can run on, any board if empty.
+        features: Features a node must all provide.
+        feat_eval: Feature expression a node must satisfy.
+    """
+
+    cmd: str
+    name: Optional[str] = None
+    boards: Optional[List[str]] = None
+    features: Optional[List[str]] = None
+    feat_eval: Optional[str] = None
+
+    def __post_init__(self):
+        """Initialize additional attributes after instantiation."""
+        self.boards = self.boards or []
+        self.features = self.features or []
@@ -0,0 +1,136 @@
+"""
+Safe evaluation of boolean feature expressions.
+
+Expressions such as `(periph_uart and not arch_esp) or periph_i2c` are parsed
+once, only boolean operators, feature names and `True`/`False` are accepted.
+The result is compiled to bitset operations over a node index, so evaluating
+an expression costs a few integer operations regardless of the node count.
+Anything with `all` and `features` masks supporting `&`, `|` and `~`, such as
+a feature matrix, can be evaluated the same way.
+"""
+import ast
+import sys
+from functools import lru_cache
+from typing import Callable, Iterable, Set
+
+from inet_nm.node_index import NodeIndex
+
+_MaskFunc = Callable[[NodeIndex], int]
+
+# Python 3.7 parses True and False as NameConstant, later versions as Constant
+_CONSTANTS = (ast.Constant,)
+if sys.version_info < (3, 8):
+    _CONSTANTS += (getattr(ast, "NameConstant"),)
+
+
+class FeatureExpr:
+    """
+    A validated and compiled feature expression.
+
+    Args:
+        expr: The boolean expression of feature names.
+
+    Attributes:
+        expr: The expression string.
+        names: The feature names used in the expression.
+
+    Raises:
+        ValueError: If the expression is not valid or uses anything other
+            than `and`, `or`, `not`, feature names, `True` and `False`.
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.names: Set[str] = set()
+        try:
+            tree = ast.parse(expr.strip(), mode="eval")
+        except SyntaxError as exc:
+            raise ValueError(f"Could not parse feature expression {expr!r}") from exc
+        self._mask = self._compile(tree.body)
+
+    def _compile(self, node: ast.AST) -> _MaskFunc:
+        if isinstance(node, ast.BoolOp):
+            operands = [self._compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda index: _and_all(index, operands)
+            return lambda index: _or_all(index, operands)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self._compile(node.operand)
+            return lambda index: index.all & ~operand(index)
+        if isinstance(node, ast.Name):
+            name = node.id
+            self.names.add(name)
+            return lambda index: index.features.get(name, _empty(index))
+        if isinstance(node, _CONSTANTS) and isinstance(node.value, bool):
+            value = node.value
+            return lambda index: index.all if value else _empty(index)
+        raise ValueError(
+            f"Unsupported element {ast.dump(node)!r} in feature expression "
+            f"{self.expr!r}, only and, or, not and feature names are allowed"
+        )
+
+    def check_names(self, features: Iterable[str]):
+        """
+        Ensure all names of the expression are known features.
+
+        Args:
+            features: The known features.
+
+        Raises:
+            ValueError: If the expression uses unknown features.
+        """
+        unknown = self.names.difference(features)
+        if unknown:
+            raise ValueError(
+                f"Unknown features {sorted(unknown)} in feature expression "
+                f"{self.expr!r}"
+            )
+
+    def mask(self, index: NodeIndex) -> int:
+        """
+        Evaluate the expression for all nodes of an index.
+
+        Args:
+            index: The node index.
+
+        Returns:
+            The mask of nodes the expression is true for.
+        """
+        return self._mask(index) & index.all
+
+
+def _empty(index: NodeIndex) -> int:
+    # Keeps the mask type of the index, an int or a boolean array
+    return index.all ^ index.all
+
+
+def _and_all(index: NodeIndex, operands) -> int:
+    mask = index.all
+    for operand in operands:
+        # Masks may be arrays shared with the index, never update in place
+        mask = mask & operand(index)
+    return mask
+
+
+def _or_all(index: NodeIndex, operands) -> int:
+    mask = _empty(index)
+    for operand in operands:
+        mask = mask | operand(index)
+    return mask
+
+
+@lru_cache(maxsize=64)
+def compile_feature_expr(expr: str) -> FeatureExpr:
+    """
+    Parse and compile a feature expression, cached by the expression string.
+
+    Args:
+        expr: The boolean expression of feature names.
+
+    Returns:
+        The compiled expression.
+
+    Raises:
+        ValueError: If the expression is not valid.
+    """
+    return FeatureExpr(expr)
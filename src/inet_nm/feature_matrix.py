@@ -0,0 +1,165 @@
+"""
+Node by feature matrix for bulk feature queries.
+
+With NumPy installed the matrix is a boolean array with a column per feature,
+otherwise the columns are the integer bitsets of the node index. Both expose
+`all` and `features` like the node index, so compiled feature expressions
+evaluate column-wise on either.
+"""
+from typing import Dict, Iterable, List, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from inet_nm.data_types import NmNode
+from inet_nm.feature_expr import FeatureExpr
+from inet_nm.node_index import NodeIndex
+
+
+class FeatureMatrix:
+    """
+    Boolean matrix of which node provides which feature.
+
+    Masks returned by the matrix are boolean arrays with NumPy and integer
+    bitsets without, they should only be passed back to the same matrix.
+
+    Args:
+        nodes: The nodes of the rows.
+        use_numpy: Use NumPy arrays, defaults to True if NumPy is installed.
+
+    Attributes:
+        nodes: The nodes of the rows.
+        feature_names: The sorted features of the columns.
+        all: Mask with all nodes set.
+        features: Mask of nodes providing each feature.
+
+    Raises:
+        ImportError: If use_numpy is set but NumPy is not installed.
+    """
+
+    def __init__(self, nodes: List[NmNode], use_numpy: bool = None):
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy and np is None:
+            raise ImportError("NumPy is required for use_numpy")
+        self._index = NodeIndex(nodes)
+        self.nodes = self._index.nodes
+        self.feature_names = sorted(self._index.features)
+        self.use_numpy = use_numpy
+        if not use_numpy:
+            self.all = self._index.all
+            self.features = self._index.features
+            return
+
+        columns = {name: col for col, name in enumerate(self.feature_names)}
+        self.matrix = np.zeros((len(self.nodes), len(columns)), dtype=bool)
+        for row, node in enumerate(self.nodes):
+            for feature in node.features_provided:
+                self.matrix[row, columns[feature]] = True
+        board_names = sorted(self._index.boards)
+        board_ids = {name: idx for idx, name in enumerate(board_names)}
+        self._board_names = board_names
+        self._board_rows = np.array(
+            [board_ids[node.board] for node in self.nodes], dtype=np.intp
+        )
+        self.all = np.ones(len(self.nodes), dtype=bool)
+        self.features = {name: self.matrix[:, col] for name, col in columns.items()}
+
+    def with_features(self, features: Iterable[str]) -> Union["np.ndarray", int]:
+        """
+        Get the nodes providing all features.
+
+        Args:
+            features: Features that must all be provided.
+
+        Returns:
+            The mask of matching nodes.
+        """
+        features = list(features)
+        if not self.use_numpy:
+            return self._index.with_features(features)
+        if any(feature not in self.features for feature in features):
+            return np.zeros(len(self.nodes), dtype=bool)
+        cols = [self.feature_names.index(feature) for feature in features]
+        return self.matrix[:, cols].all(axis=1)
+
+    def evaluate(self, expr: FeatureExpr) -> Union["np.ndarray", int]:
+        """
+        Evaluate a compiled feature expression for all nodes.
+
+        Args:
+            expr: The compiled feature expression.
+
+        Returns:
+            The mask of nodes the expression is true for.
+        """
+        return expr.mask(self)
+
+    def select(self, mask) -> List[NmNode]:
+        """
+        Get the nodes of a mask.
+
+        Args:
+            mask: The selected nodes.
+
+        Returns:
+            The selected nodes in their original order.
+        """
+        if not self.use_numpy:
+            return self._index.select(mask)
+        return [self.nodes[idx] for idx in np.flatnonzero(mask)]
+
+    def feature_counts(self) -> Dict[str, int]:
+        """
+        Count the nodes providing each feature.
+
+        Returns:
+            The number of nodes per feature.
+        """
+        if not self.use_numpy:
+            return {
+                name: self._index.count(self.features[name])
+                for name in self.feature_names
+            }
+        counts = self.matrix.sum(axis=0)
+        return dict(zip(self.feature_names, counts.tolist()))
+
+    def boards_per_feature(self) -> Dict[str, int]:
+        """
+        Count the distinct boards providing each feature.
+
+        Returns:
+            The number of boards per feature.
+        """
+        if not self.use_numpy:
+            board_masks = self._index.boards.values()
+            return {
+                name: sum(1 for board in board_masks if board & self.features[name])
+                for name in self.feature_names
+            }
+        board_matrix = np.zeros(
+            (len(self._board_names), len(self.feature_names)), dtype=bool
+        )
+        np.logical_or.at(board_matrix, self._board_rows, self.matrix)
+        return dict(zip(self.feature_names, board_matrix.sum(axis=0).tolist()))
+
+    def coverage(self) -> Dict[str, float]:
+        """
+        Get the fraction of nodes providing each feature.
+
+        Returns:
+            The fraction of nodes per feature, 0 to 1.
+        """
+        total = len(self.nodes)
+        return {name: count / total for name, count in self.feature_counts().items()}
+
+    def all_features(self) -> List[str]:
+        """
+        Get all features provided by any node.
+
+        Returns:
+            The sorted features.
+        """
+        return list(self.feature_names)
@@ -5,9 +5,78 @@ The main class `FileLock` uses OS-level file system operations for locking
 and unlocking.
 This kind of lock can be used to prevent the simultaneous execution of a piece
 of code by different processes.
+
+The lock file holds JSON with the holder, the time it was acquired and how
+long the holder waited for it. While waiting, a `<lock file>.<pid>.<id>.wait`
+marker file exists, so monitoring can see queue depths without asking the
+waiting processes. Markers name the pid of the waiter, so markers left behind
+by killed waiters can be told apart.
 """
+import getpass
+import json
 import os
+import socket
 import time
+from typing import Any, Dict
+
+
+def default_holder() -> str:
+    """
+    Get a holder name for the current process.
+
+    Returns:
+        The holder name in the form of user@host:pid.
+    """
+    return f"{getpass.getuser()}@{socket.gethostname()}:{os.getpid()}"
+
+
+def read_lock_info(file_name: str) -> Dict[str, Any]:
+    """
+    Read the metadata of a lock or wait marker file.
+
+    Args:
+        file_name: The name of the lock or wait marker file.
+
+    Returns:
+        The metadata, empty if the file is missing or not written yet.
+    """
+    try:
+        with open(file_name, "r") as file:
+            info = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return info if isinstance(info, dict) else {}
+
+
+def wait_marker_alive(file_name: str) -> bool:
+    """
+    Check if the process that wrote a wait marker still exists.
+
+    Markers of other hosts and markers without a pid count as alive.
+
+    Args:
+        file_name: The name of the wait marker file.
+
+    Returns:
+        False if the waiter is known to be gone.
+    """
+    info = read_lock_info(file_name)
+    if info.get("host", socket.gethostname()) != socket.gethostname():
+        return True
+    pid = info.get("pid")
+    if pid is None:
+        # Not written yet, the name is <lock file>.<pid>.<id>.wait
+        try:
+            pid = int(os.path.basename(file_name).rsplit(".", 3)[-3])
+        except (IndexError, ValueError):
+            return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError, ValueError):
+        pass
+    return True
 
 
 class FileLockTimeout(Exception):
@@ -31,21 +100,32 @@ class FileLock:
     Attributes:
         file_name: The name of the file to be used as the lock.
         timeout (int): The maximum time to wait for the lock to be released.
+        holder: Human readable name of the holder written to the lock file.
+        wait_time: Seconds the last acquire waited for the lock.
     """
 
-    def __init__(self, file_name: str, timeout: int = 10) -> None:
+    def __init__(self, file_name: str, timeout: int = 10, holder: str = None) -> None:
         """
         Construct a new FileLock object.
 
         Args:
             file_name: The name of the file to be used as the lock.
             timeout: The maximum time to wait for the lock to be released.
+            holder: Human readable name of the holder, defaults to
+                user@host:pid.
         """
         self.file_name = file_name
         self.timeout = timeout
+        self.holder = holder or default_holder()
+        self.wait_time = 0.0
         self.fd = None
         self._lock_held = False
 
+    @property
+    def wait_marker(self) -> str:
+        """The name of the marker file that exists while waiting."""
+        return f"{self.file_name}.{os.getpid()}.{id(self):x}.wait"
+
     def acquire(self, timeout: int = None, poll_interval: float = 0.05) -> None:
         """
         Acquire the file lock.
@@ -64,22 +144,52 @@ class FileLock:
         """
         timeout = timeout or self.timeout
         start_time = time.time()
-        while True:
-            try:
-                os.umask(0)
-                self.fd = os.open(
-                    self.file_name, flags=os.O_CREAT | os.O_EXCL | os.O_RDWR, mode=0o777
-                )
-                self._lock_held = True
-                break
-            except FileExistsError:
-                if timeout is None:
-                    time.sleep(poll_interval)
-                elif time.time() - start_time >= timeout:
-                    msg = f"Timeout trying to lock {self.file_name}"
-                    raise FileLockTimeout(msg)
-                else:
-                    time.sleep(poll_interval)
+        waiting = False
+        try:
+            while True:
+                try:
+                    os.umask(0)
+                    self.fd = os.open(
+                        self.file_name,
+                        flags=os.O_CREAT | os.O_EXCL | os.O_RDWR,
+                        mode=0o777,
+                    )
+                    self._lock_held = True
+                    break
+                except FileExistsError:
+                    if not waiting:
+                        waiting = self._write_wait_marker(start_time)
+                    if timeout is None:
+                        time.sleep(poll_interval)
+                    elif time.time() - start_time >= timeout:
+                        msg = f"Timeout trying to lock {self.file_name}"
+                        raise FileLockTimeout(msg)
+                    else:
+                        time.sleep(poll_interval)
+        finally:
+            if waiting:
+                try:
+                    os.unlink(self.wait_marker)
+                except OSError:
+                    pass
+        now = time.time()
+        self.wait_time = now - start_time
+        info = {"holder": self.holder, "since": now, "wait": self.wait_time}
+        os.write(self.fd, json.dumps(info).encode())
+
+    def _write_wait_marker(self, start_time: float) -> bool:
+        info = {
+            "holder": self.holder,
+            "since": start_time,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+        }
+        try:
+            with open(self.wait_marker, "w") as file:
+                json.dump(info, file)
+        except OSError:
+            return False
+        return True
 
     def release(self, force: bool = False) -> None:
         """
@@ -0,0 +1,369 @@
+"""
+Persistent history of node inventory states.
+
+Every time the inventory is taken the state of each node, available, used or
+missing, is compared to its last recorded state and only transitions are
+appended to an NDJSON file in the config dir. The entries are indexed by UID
+and board in memory, so the state of the lab at any point in time and the
+changes between two points are found without replaying the whole file.
+
+Every so often a snapshot line with the state of all nodes is appended. A
+history that is only asked about changes since a point in time seeks back
+from the end of the file to the last snapshot before that point and reads
+from there, by default it starts at the last snapshot, which is all that is
+needed to record new transitions. Once the file grows too large, the older
+half of the entries is folded into a snapshot at the start of the file.
+"""
+import bisect
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from inet_nm.config import ConfigDirLock
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class InventoryHistory:
+    """
+    Append-only store of per node state transitions.
+
+    Args:
+        config_dir: Directory for the configuration files.
+        since: Only read the history needed for points in time after this,
+            states before the snapshot the reading started at are unknown.
+            Defaults to the latest states, use `-inf` for all history.
+
+    Attributes:
+        file_path (Path): Path to the history file.
+    """
+
+    _FILENAME = "inventory_history.ndjson"
+    _SNAPSHOT_PREFIX = b'{"snapshot": '
+    SNAPSHOT_BYTES = 256 * 1024
+    MAX_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, config_dir: Union[Path, str], since: float = None):
+        self.config_dir = Path(config_dir).expanduser()
+        self.file_path = self.config_dir / self._FILENAME
+        self.since = since
+        self._reset()
+        self._refresh()
+
+    def _reset(self):
+        self._times: List[float] = []
+        self._entries: List[Tuple[float, str, str, str]] = []
+        self._by_uid: Dict[str, List[int]] = {}
+        self._by_board: Dict[str, List[int]] = {}
+        self._base: Dict[str, Tuple[str, str]] = {}
+        self._base_ts = None
+        self._offset = None
+        self._snapshot_at = 0
+        self._inode = None
+
+    def _start_offset(self, file) -> int:
+        # Walk back over the snapshots to the last one not after since.
+        since = float("inf") if self.since is None else self.since
+        marker = b"\n" + self._SNAPSHOT_PREFIX
+        end = file.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - (1 << 16))
+            file.seek(start)
+            data = file.read(end - start + len(marker) - 1)
+            found = data.rfind(marker)
+            while found >= 0:
+                offset = start + found + 1
+                file.seek(offset)
+                try:
+                    if json.loads(file.readline())["ts"] <= since:
+                        return offset
+                except (ValueError, KeyError, TypeError):
+                    pass
+                found = data.rfind(marker, 0, found)
+            end = start
+        return 0
+
+    def _refresh(self):
+        # Only read what was appended since the last read.
+        try:
+            with open(self.file_path, "rb") as file:
+                inode = os.fstat(file.fileno()).st_ino
+                if self._inode is not None and inode != self._inode:
+                    # Compacted by another writer, read again
+                    self._reset()
+                self._inode = inode
+                if self._offset is None:
+                    self._offset = self._start_offset(file)
+                file.seek(self._offset)
+                data = file.read()
+        except FileNotFoundError:
+            self._offset = 0
+            return
+        end = data.rfind(b"\n") + 1
+        # A line without newline is still being written.
+        offset = self._offset
+        for line in data[:end].splitlines(keepends=True):
+            try:
+                entry = json.loads(line)
+                if "snapshot" in entry:
+                    self._snapshot_at = offset
+                    if not self._entries and self._base_ts is None:
+                        self._base_ts = entry["ts"]
+                        self._base = {
+                            uid: tuple(value)
+                            for uid, value in entry["snapshot"].items()
+                        }
+                else:
+                    self._add(entry["ts"], entry["uid"], entry["board"], entry["state"])
+            except (ValueError, KeyError, TypeError):
+                pass
+            offset += len(line)
+        self._offset += end
+
+    def _last(self, uid: str, ts: float = None) -> Optional[Tuple[str, str]]:
+        # The board and state of a node at a point in time
+        indices = self._by_uid.get(uid, [])
+        if ts is None:
+            pos = len(indices)
+        else:
+            pos = bisect.bisect_right(indices, bisect.bisect_right(self._times, ts) - 1)
+        if pos:
+            _, _, board, state = self._entries[indices[pos - 1]]
+            return board, state
+        if uid in self._base and (ts is None or ts >= self._base_ts):
+            return self._base[uid]
+        return None
+
+    def _latest(self, ts: float = None) -> Dict[str, Tuple[str, str]]:
+        latest = {uid: self._last(uid, ts) for uid in {*self._base, *self._by_uid}}
+        return {uid: value for uid, value in latest.items() if value is not None}
+
+    @staticmethod
+    def _snapshot_line(ts: float, latest: Dict[str, Tuple[str, str]]) -> str:
+        snapshot = {uid: list(value) for uid, value in sorted(latest.items())}
+        return json.dumps({"snapshot": snapshot, "ts": ts}) + "\n"
+
+    def _compact(self):
+        # Fold the older half of the entries into a snapshot
+        full = InventoryHistory(self.config_dir, since=float("-inf"))
+        if not full._times:
+            return
+        cutoff = full._times[len(full._times) // 2]
+        lines = [self._snapshot_line(cutoff, full._latest(cutoff))]
+        for ts, uid, board, state in full._entries:
+            if ts > cutoff:
+                entry = {"ts": ts, "uid": uid, "board": board, "state": state}
+                lines.append(json.dumps(entry) + "\n")
+        tmp_path = self.file_path.with_name(f".{self._FILENAME}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w") as file:
+                file.write("".join(lines))
+            os.replace(tmp_path, self.file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._reset()
+        self._refresh()
+
+    def _add(self, ts: float, uid: str, board: str, state: str):
+        # Keep the entries sorted even if clocks of writers differ.
+        if self._times and ts < self._times[-1]:
+            ts = self._times[-1]
+        idx = len(self._entries)
+        self._times.append(ts)
+        self._entries.append((ts, uid, board, state))
+        self._by_uid.setdefault(uid, []).append(idx)
+        self._by_board.setdefault(board, []).append(idx)
+
+    def record(
+        self, states: Dict[str, str], boards: Dict[str, str], ts: float = None
+    ) -> List[Dict[str, Union[str, float]]]:
+        """
+        Append the state transitions of the nodes.
+
+        Args:
+            states: The current state of each node UID.
+            boards: The board of each node UID.
+            ts: The time of the states, defaults to now.
+
+        Returns:
+            The transitions that were recorded.
+        """
+        if ts is None:
+            ts = time.time()
+        with ConfigDirLock.get(self.config_dir):
+            self._refresh()
+            last = self.states_at()
+            entries = [
+                {"ts": ts, "uid": uid, "board": boards[uid], "state": state}
+                for uid, state in sorted(states.items())
+                if last.get(uid) != state
+            ]
+            if not entries:
+                return []
+            lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+            if self._offset - self._snapshot_at + len(lines) >= self.SNAPSHOT_BYTES:
+                # Lets readers of recent changes skip everything before it
+                latest = self._latest()
+                for entry in entries:
+                    latest[entry["uid"]] = (entry["board"], entry["state"])
+                lines += self._snapshot_line(ts, latest)
+            with open(self.file_path, "a") as file:
+                file.write(lines)
+            self._refresh()
+            if self._offset >= self.MAX_BYTES:
+                self._compact()
+        return entries
+
+    def state_at(self, uid: str, ts: float = None) -> Optional[str]:
+        """
+        Get the state of a node at a point in time.
+
+        Args:
+            uid: The UID of the node.
+            ts: The point in time, defaults to the latest state.
+
+        Returns:
+            The state of the node or None if it was not recorded yet.
+        """
+        last = self._last(uid, ts)
+        return None if last is None else last[1]
+
+    def states_at(self, ts: float = None) -> Dict[str, str]:
+        """
+        Get the state of all nodes at a point in time.
+
+        Args:
+            ts: The point in time, defaults to the latest states.
+
+        Returns:
+            The state of each recorded node UID.
+        """
+        return {uid: state for uid, (_, state) in self._latest(ts).items()}
+
+    def diff(
+        self, since: float, until: float = None
+    ) -> Dict[str, Tuple[Optional[str], str]]:
+        """
+        Get the nodes whose state differs between two points in time.
+
+        Only the entries between the points are looked at.
+
+        Args:
+            since: The earlier point in time.
+            until: The later point in time, defaults to now.
+
+        Returns:
+            The old and new state of each changed node UID.
+        """
+        start = bisect.bisect_right(self._times, since)
+        stop = len(self._times)
+        if until is not None:
+            stop = bisect.bisect_right(self._times, until)
+        changes = {}
+        for uid in {self._entries[idx][1] for idx in range(start, stop)}:
+            old = self.state_at(uid, since)
+            new = self.state_at(uid, until)
+            if old != new:
+                changes[uid] = (old, new)
+        return changes
+
+    def board_changes(
+        self, since: float, until: float = None, uids: Iterable[str] = None
+    ) -> Dict[str, int]:
+        """
+        Count the state changes per board between two points in time.
+
+        Args:
+            since: The earlier point in time.
+            until: The later point in time, defaults to now.
+            uids: Only count the changes of these node UIDs.
+
+        Returns:
+            The count change of each `<board>_<state>` key.
+        """
+        board_changes = {}
+        changes = self.diff(since, until)
+        if uids is not None:
+            changes = {uid: changes[uid] for uid in uids if uid in changes}
+        for uid, (old, new) in changes.items():
+            board = self._entries[self._by_uid[uid][-1]][2]
+            key = f"{board}_{new}"
+            board_changes[key] = board_changes.get(key, 0) + 1
+            if old is not None:
+                key = f"{board}_{old}"
+                board_changes[key] = board_changes.get(key, 0) - 1
+        return board_changes
+
+    def transitions(
+        self,
+        uid: str = None,
+        board: str = None,
+        since: float = None,
+        until: float = None,
+    ) -> List[Dict[str, Union[str, float]]]:
+        """
+        Get the recorded transitions of a node, a board or all nodes.
+
+        Args:
+            uid: Only get the transitions of this node UID.
+            board: Only get the transitions of this board.
+            since: Only get transitions after this point in time.
+            until: Only get transitions up to this point in time.
+
+        Returns:
+            The transitions in order of time.
+        """
+        if uid is not None:
+            indices = self._by_uid.get(uid, [])
+        elif board is not None:
+            indices = self._by_board.get(board, [])
+        else:
+            indices = range(len(self._entries))
+        entries = [self._entries[idx] for idx in indices]
+        return [
+            {"ts": ts, "uid": e_uid, "board": e_board, "state": state}
+            for ts, e_uid, e_board, state in entries
+            if (board is None or e_board == board)
+            and (since is None or ts > since)
+            and (until is None or ts <= until)
+        ]
+
+
+def parse_since(value: str, now: float = None) -> float:
+    """
+    Parse a point in time given as a duration ago or as a timestamp.
+
+    Durations are a number with a unit of s, m, h, d or w, for example `12h`.
+    Timestamps are ISO 8601 dates or seconds since the epoch.
+
+    Args:
+        value: The duration or timestamp.
+        now: The time durations are relative to, defaults to now.
+
+    Returns:
+        The point in time in seconds since the epoch.
+
+    Raises:
+        ValueError: If the value cannot be parsed.
+    """
+    if now is None:
+        now = time.time()
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", value.strip())
+    if match:
+        return now - float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(
+            f"Could not parse {value!r}, use a duration like 12h or 7d, "
+            "an ISO date or seconds since the epoch"
+        ) from None
@@ -0,0 +1,198 @@
+"""
+Queue of jobs dispatched to the next free matching node.
+
+Each job is matched against the selected nodes once, giving a bitmask of
+the nodes that can run it. Jobs with the same mask share a FIFO, so a node
+that becomes free only looks at the heads of the FIFOs its bit is part of
+and takes the oldest job. Jobs that no node can run are set aside.
+
+With a history of job durations the queue is ordered longest expected job
+first instead of by position. Each free node takes the longest job it can
+run, the short jobs fill the gaps at the end, so the nodes finish at about
+the same time instead of one node still running a long job started last.
+"""
+import json
+import statistics
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from inet_nm.data_types import NmJob
+from inet_nm.feature_expr import compile_feature_expr
+from inet_nm.node_index import NodeIndex
+
+_JOB_KEYS = {"cmd", "name", "boards", "features", "feat_eval"}
+
+# {"<board>": {"<cmd>": [mean, count]}} as kept by JobDurationsConfig
+Durations = Dict[str, Dict[str, Sequence[float]]]
+
+
+def load_jobs(lines: Iterable[str]) -> List[NmJob]:
+    """
+    Parse jobs from lines of a job file.
+
+    Each line is either a plain shell command or a JSON object with a `cmd`
+    and optionally a `name`, `boards`, `features` and `feat_eval`. Empty
+    lines and lines starting with `#` are skipped. Jobs without a name are
+    named after their line number.
+
+    Args:
+        lines: The lines of the job file.
+
+    Returns:
+        The jobs in order of the file.
+
+    Raises:
+        ValueError: If a JSON line is not a valid job.
+    """
+    jobs = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if not line.startswith("{"):
+            jobs.append(NmJob(cmd=line, name=f"line{lineno}"))
+            continue
+        try:
+            spec = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Line {lineno}: invalid JSON: {exc}") from None
+        unknown = set(spec) - _JOB_KEYS
+        if unknown:
+            raise ValueError(f"Line {lineno}: unknown keys {sorted(unknown)}")
+        if not isinstance(spec.get("cmd"), str):
+            raise ValueError(f"Line {lineno}: a job needs a cmd string")
+        if spec.get("feat_eval"):
+            try:
+                compile_feature_expr(spec["feat_eval"])
+            except ValueError as exc:
+                raise ValueError(f"Line {lineno}: {exc}") from None
+        spec.setdefault("name", f"line{lineno}")
+        jobs.append(NmJob.from_dict(spec))
+    return jobs
+
+
+def estimate_duration(
+    job: NmJob, boards: Iterable[str], durations: Durations, default: float = 0.0
+) -> float:
+    """
+    Estimate how long a job takes from the history of job durations.
+
+    The slowest of the boards that can run the job is used, so a job is not
+    expected to be short only because it ran on a fast board before. Boards
+    without history fall back to the mean over all boards of the command.
+
+    Args:
+        job: The job to estimate.
+        boards: The boards of the nodes that can run the job.
+        durations: The history of job durations.
+        default: Duration of a job that never ran.
+
+    Returns:
+        The expected duration in seconds.
+    """
+    known = [
+        durations[board][job.cmd][0]
+        for board in set(boards)
+        if job.cmd in durations.get(board, {})
+    ]
+    if known:
+        return max(known)
+    known = [cmds[job.cmd][0] for cmds in durations.values() if job.cmd in cmds]
+    if known:
+        return statistics.mean(known)
+    return default
+
+
+class JobQueue:
+    """
+    Jobs waiting for a free node that meets their requirements.
+
+    Args:
+        jobs: The jobs in order of dispatch.
+        index: Index of the nodes to run the jobs on.
+        durations: History of job durations, orders the jobs longest
+            expected first. Jobs that never ran are expected to take the
+            median of all known durations.
+
+    Attributes:
+        unrunnable (List[Tuple[int, NmJob]]): Jobs no node can run, with
+            their position in the job list.
+    """
+
+    def __init__(
+        self, jobs: List[NmJob], index: NodeIndex, durations: Durations = None
+    ):
+        self._fifos: Dict[int, Deque[Tuple[int, int, NmJob]]] = {}
+        self.unrunnable: List[Tuple[int, NmJob]] = []
+        runnable = []
+        for pos, job in enumerate(jobs):
+            mask = self._mask(job, index)
+            if not mask:
+                self.unrunnable.append((pos, job))
+                continue
+            runnable.append((mask, pos, job))
+        if durations:
+            known = [mean for cmds in durations.values() for mean, _ in cmds.values()]
+            default = statistics.median(known) if known else 0.0
+
+            def _expected(item):
+                mask, pos, job = item
+                boards = [node.board for node in index.select(mask)]
+                return -estimate_duration(job, boards, durations, default), pos
+
+            # Sorting is stable, equal estimates keep the order of the list
+            runnable.sort(key=_expected)
+        for rank, (mask, pos, job) in enumerate(runnable):
+            self._fifos.setdefault(mask, deque()).append((rank, pos, job))
+
+    @staticmethod
+    def _mask(job: NmJob, index: NodeIndex) -> int:
+        mask = index.all
+        if job.boards:
+            mask &= index.with_boards(job.boards)
+        if job.features:
+            mask &= index.with_features(job.features)
+        if job.feat_eval and mask:
+            try:
+                mask &= compile_feature_expr(job.feat_eval).mask(index)
+            except ValueError:
+                return 0
+        return mask
+
+    def __len__(self) -> int:
+        return sum(len(fifo) for fifo in self._fifos.values())
+
+    def drain(self) -> List[Tuple[int, NmJob]]:
+        """
+        Take all jobs that are left.
+
+        Returns:
+            The position in the job list and the job of each left job, in
+            order of the job list.
+        """
+        left = [(pos, job) for fifo in self._fifos.values() for _, pos, job in fifo]
+        self._fifos = {}
+        return sorted(left, key=lambda item: item[0])
+
+    def take(self, node_idx: int) -> Optional[Tuple[int, NmJob]]:
+        """
+        Take the first job in queue order a node can run.
+
+        Args:
+            node_idx: The index of the node in the index.
+
+        Returns:
+            The position in the job list and the job, or None if no job
+            is left for the node.
+        """
+        bit = 1 << node_idx
+        best = None
+        for mask, fifo in self._fifos.items():
+            if mask & bit and (best is None or fifo[0][0] < best[0][0]):
+                best = fifo
+        if best is None:
+            return None
+        _, pos, job = best.popleft()
+        if not best:
+            self._fifos = {mask: fifo for mask, fifo in self._fifos.items() if fifo}
+        return pos, job
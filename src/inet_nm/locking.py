@@ -2,8 +2,9 @@
 import os
 import tempfile
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
+from inet_nm.broker import BrokerClient
 from inet_nm.data_types import NmNode
 
 
@@ -22,13 +23,46 @@ def locks_dir() -> Path:
     return path
 
 
+def broker_socket_path() -> Path:
+    """
+    Get the path of the reservation broker socket.
+
+    Can be overridden with the NM_BROKER_SOCKET env var.
+
+    Returns:
+        The path to the broker Unix socket.
+    """
+    default = Path(tempfile.gettempdir(), "inet_nm", "broker.sock")
+    return Path(os.environ.get("NM_BROKER_SOCKET", default))
+
+
+def connect_broker(holder: str = None) -> Optional[BrokerClient]:
+    """
+    Connect to the reservation broker if one is running.
+
+    Args:
+        holder: Human readable name of the holder.
+
+    Returns:
+        A connected broker client or None if no broker is running.
+    """
+    return BrokerClient.connect(broker_socket_path(), holder)
+
+
 def get_locked_uids() -> List[str]:
     """
     Get the list of UIDs of currently locked nodes.
 
+    If a broker is running it is asked, otherwise the lock files are used.
+
     Returns:
         A sorted list of UIDs of locked nodes.
     """
+    client = connect_broker()
+    if client is not None:
+        with client:
+            res = client.query()
+        return sorted(list(res["held"]) + res["foreign"])
     uids = [lock_file.stem for lock_file in locks_dir().glob("*.lock")]
     return sorted(uids)
 
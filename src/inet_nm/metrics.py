@@ -0,0 +1,302 @@
+"""
+Lab utilization metrics in the Prometheus text format.
+
+The state is kept in memory and updated incrementally. The locks dir is only
+listed again when it changed and only new or removed lock files are read,
+USB devices are only enumerated again after a TTY event. Lock hold and wait
+times come from the metadata the lock holders write into the lock files.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Union
+
+import inet_nm.config as cfg
+import inet_nm.locking as lk
+from inet_nm.filelock import read_lock_info, wait_marker_alive
+from inet_nm.usb_ctrl import get_connected_uids
+
+_LOCK_SUFFIX = ".lock"
+_WAIT_SUFFIX = ".wait"
+_UNKNOWN_BOARD = "unknown"
+
+
+class _Summary:
+    def __init__(self):
+        self.sums: Dict[Tuple, float] = {}
+        self.counts: Dict[Tuple, int] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        self.sums[labels] = self.sums.get(labels, 0.0) + value
+        self.counts[labels] = self.counts.get(labels, 0) + 1
+
+
+class LabMetrics:
+    """
+    Incrementally maintained utilization metrics of a lab.
+
+    Args:
+        config_dir: Directory for the configuration files.
+        locks_dir: Directory of the lock files, defaults to the shared one.
+    """
+
+    def __init__(
+        self, config_dir: Union[Path, str], locks_dir: Union[Path, str] = None
+    ):
+        self.nodes_cfg = cfg.NodesConfig(config_dir)
+        self.locks_dir = Path(locks_dir) if locks_dir else lk.locks_dir()
+        self.connected: Set[str] = set()
+        self.locks: Dict[str, Dict] = {}
+        self.waiters: Dict[str, int] = {}
+        self._wait_markers: Dict[str, str] = {}
+        self.hold = _Summary()
+        self.wait = _Summary()
+        self.usb_enumeration = _Summary()
+        self.usb_events = 0
+        self._uid_boards: Dict[str, str] = {}
+        self._nodes_sig = None
+        self._locks_sig = None
+        self._lock = threading.Lock()
+
+    def _board(self, uid: str) -> str:
+        return self._uid_boards.get(uid, _UNKNOWN_BOARD)
+
+    def update_nodes(self):
+        """Reload the nodes if the config changed."""
+        sig = cfg.ConfigStore.signature(self.nodes_cfg.source_paths())
+        if sig == self._nodes_sig:
+            return
+        nodes = [node for node in self.nodes_cfg.load() if not node.ignore]
+        with self._lock:
+            self._nodes_sig = sig
+            self._uid_boards = {node.uid: node.board for node in nodes}
+
+    def scan_usb(self, event: bool = False):
+        """
+        Enumerate the connected USB devices and time the enumeration.
+
+        Args:
+            event: The scan was triggered by a device event.
+        """
+        start = time.monotonic()
+        connected = set(get_connected_uids())
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self.connected = connected
+            self.usb_enumeration.observe((), elapsed)
+            if event:
+                self.usb_events += 1
+
+    def scan_locks(self):
+        """Update the lock state from lock files that appeared or vanished."""
+        sig = cfg.ConfigStore.signature([self.locks_dir])
+        pending = [uid for uid, info in self.locks.items() if not info["complete"]]
+        if sig == self._locks_sig and not pending:
+            self.prune_waiters()
+            return
+        self._locks_sig = sig
+        try:
+            names = os.listdir(self.locks_dir)
+        except OSError:
+            names = []
+        now = time.time()
+        lock_uids = set()
+        wait_markers = {}
+        for name in names:
+            if name.endswith(_LOCK_SUFFIX):
+                lock_uids.add(name[: -len(_LOCK_SUFFIX)])
+            elif name.endswith(_WAIT_SUFFIX) and _LOCK_SUFFIX + "." in name:
+                wait_markers[name] = name.split(_LOCK_SUFFIX + ".")[0]
+
+        with self._lock:
+            for uid in set(self.locks) - lock_uids:
+                info = self.locks.pop(uid)
+                self.hold.observe((self._board(uid),), now - info["since"])
+            for uid in lock_uids:
+                old = self.locks.get(uid)
+                if old is not None and old["complete"]:
+                    if old["stat"] == self._stat(uid):
+                        continue
+                new = self._read_lock(uid, now)
+                if old is not None and old["complete"]:
+                    # Released and locked again between two scans
+                    release = min(now, new["since"])
+                    self.hold.observe((self._board(uid),), release - old["since"])
+                self.locks[uid] = new
+                if new["complete"] and "wait" in new:
+                    self.wait.observe((self._board(uid),), new["wait"])
+            self._wait_markers = wait_markers
+        self.prune_waiters()
+
+    def prune_waiters(self):
+        """Count the waiters, removing markers of waiters that are gone."""
+        with self._lock:
+            markers = dict(self._wait_markers)
+        dead = set()
+        for name in markers:
+            path = self.locks_dir / name
+            if path.exists() and not wait_marker_alive(str(path)):
+                dead.add(name)
+                try:
+                    # Killed waiters never remove their marker
+                    path.unlink()
+                except OSError:
+                    pass
+        waiters = {}
+        for name, uid in markers.items():
+            if name not in dead:
+                waiters[uid] = waiters.get(uid, 0) + 1
+        with self._lock:
+            for name in dead:
+                self._wait_markers.pop(name, None)
+            self.waiters = waiters
+
+    def _stat(self, uid: str) -> Tuple:
+        return cfg.ConfigStore.signature([self.locks_dir / f"{uid}{_LOCK_SUFFIX}"])
+
+    def _read_lock(self, uid: str, now: float) -> Dict:
+        path = self.locks_dir / f"{uid}{_LOCK_SUFFIX}"
+        stat = self._stat(uid)
+        info = read_lock_info(path)
+        if "since" in info:
+            return {
+                "since": info["since"],
+                "wait": info.get("wait", 0.0),
+                "stat": stat,
+                "complete": True,
+            }
+        mtime = stat[0][0] / 1e9 if stat[0] else now
+        # Lock files without metadata are still being written or are from
+        # tools that do not write it, give up waiting after a second.
+        return {"since": mtime, "stat": stat, "complete": now - mtime > 1}
+
+    def broker_waiters(self) -> Dict[str, int]:
+        """
+        Get the nodes waited for through the broker.
+
+        Returns:
+            The number of waiting requests per node UID.
+        """
+        if not lk.broker_socket_path().exists():
+            return {}
+        client = lk.connect_broker()
+        if client is None:
+            return {}
+        with client:
+            res = client.query()
+        waiters = {}
+        for ticket in res.get("waiting", []):
+            for uid in ticket["uids"]:
+                waiters[uid] = waiters.get(uid, 0) + 1
+        return waiters
+
+    def update(self):
+        """Update the config and lock state."""
+        self.update_nodes()
+        self.scan_locks()
+
+    def render(self, broker_waiters: Dict[str, int] = None) -> str:
+        """
+        Render the metrics in the Prometheus text format.
+
+        Args:
+            broker_waiters: Waiting requests per node UID from the broker.
+
+        Returns:
+            The metrics text.
+        """
+        self.prune_waiters()
+        with self._lock:
+            return self._render(broker_waiters or {})
+
+    def _render(self, broker_waiters: Dict[str, int]) -> str:
+        states: Dict[Tuple, int] = {}
+        boards = set(self._uid_boards.values())
+        for board in boards:
+            for state in ("available", "used", "missing"):
+                states[(board, state)] = 0
+        for uid, board in self._uid_boards.items():
+            locked = uid in self.locks
+            if uid in self.connected:
+                state = "used" if locked else "available"
+            elif not locked:
+                state = "missing"
+            else:
+                continue
+            states[(board, state)] += 1
+
+        waiters: Dict[Tuple, int] = {(board,): 0 for board in boards}
+        for source in (self.waiters, broker_waiters):
+            for uid, count in source.items():
+                key = (self._board(uid),)
+                waiters[key] = waiters.get(key, 0) + count
+
+        lines: List[str] = []
+        _gauge(
+            lines,
+            "inet_nm_nodes",
+            "Number of nodes per board and state.",
+            ("board", "state"),
+            states,
+        )
+        _gauge(
+            lines,
+            "inet_nm_lock_waiters",
+            "Number of processes waiting for nodes of a board.",
+            ("board",),
+            waiters,
+        )
+        _summary(
+            lines,
+            "inet_nm_lock_hold_seconds",
+            "Time nodes were locked, observed on release.",
+            ("board",),
+            self.hold,
+        )
+        _summary(
+            lines,
+            "inet_nm_lock_wait_seconds",
+            "Time spent waiting for a node lock, observed on acquire.",
+            ("board",),
+            self.wait,
+        )
+        _summary(
+            lines,
+            "inet_nm_usb_enumeration_seconds",
+            "Time to enumerate the connected USB devices.",
+            (),
+            self.usb_enumeration,
+        )
+        lines.append("# HELP inet_nm_usb_events_total Number of TTY device events.")
+        lines.append("# TYPE inet_nm_usb_events_total counter")
+        lines.append(f"inet_nm_usb_events_total {self.usb_events}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: Tuple, values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = (
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _gauge(lines: List[str], name: str, doc: str, names: Tuple, values: Dict):
+    lines.append(f"# HELP {name} {doc}")
+    lines.append(f"# TYPE {name} gauge")
+    for labels in sorted(values):
+        lines.append(f"{name}{_labels(names, labels)} {values[labels]}")
+
+
+def _summary(lines: List[str], name: str, doc: str, names: Tuple, summary: _Summary):
+    lines.append(f"# HELP {name} {doc}")
+    lines.append(f"# TYPE {name} summary")
+    for labels in sorted(summary.counts):
+        label_str = _labels(names, labels)
+        lines.append(f"{name}_sum{label_str} {summary.sums[labels]:.6f}")
+        lines.append(f"{name}_count{label_str} {summary.counts[labels]}")
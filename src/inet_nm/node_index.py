@@ -0,0 +1,164 @@
+"""
+Inverted index over a list of nodes.
+
+Every node gets a bit by its position in the list, features, boards and UIDs
+map to the set of nodes as an integer bitset. Filters then become bitwise
+operations on a few machine words instead of scanning feature lists.
+"""
+import copy
+from typing import Dict, Iterable, List
+
+from inet_nm.data_types import NmNode
+
+
+class NodeIndex:
+    """
+    Bitset index of nodes by feature, board and UID.
+
+    Bit `i` of each mask stands for `nodes[i]`.
+
+    Args:
+        nodes: The nodes to index, the order is kept for selections.
+
+    Attributes:
+        nodes: The indexed nodes.
+        all: Mask with all nodes set.
+        features: Mask of nodes providing each feature.
+        boards: Mask of nodes of each board.
+        uids: Mask of nodes with each UID.
+        ignored: Mask of nodes that should be ignored.
+    """
+
+    def __init__(self, nodes: List[NmNode]):
+        self.nodes = list(nodes)
+        self.all = (1 << len(self.nodes)) - 1
+        self.features: Dict[str, int] = {}
+        self.boards: Dict[str, int] = {}
+        self.uids: Dict[str, int] = {}
+        self.ignored = 0
+        for idx, node in enumerate(self.nodes):
+            bit = 1 << idx
+            for feature in node.features_provided:
+                self.features[feature] = self.features.get(feature, 0) | bit
+            self.boards[node.board] = self.boards.get(node.board, 0) | bit
+            self.uids[node.uid] = self.uids.get(node.uid, 0) | bit
+            if node.ignore:
+                self.ignored |= bit
+
+    def rebind(self, nodes: List[NmNode]) -> "NodeIndex":
+        """
+        Get an index sharing the masks for a copy of the indexed nodes.
+
+        Args:
+            nodes: Nodes equal to the indexed nodes and in the same order.
+
+        Returns:
+            The index over the given nodes.
+        """
+        index = copy.copy(self)
+        index.nodes = list(nodes)
+        return index
+
+    def with_features(self, features: Iterable[str]) -> int:
+        """
+        Get the nodes providing all features.
+
+        Args:
+            features: Features that must all be provided.
+
+        Returns:
+            The mask of matching nodes.
+        """
+        mask = self.all
+        for feature in features:
+            mask &= self.features.get(feature, 0)
+        return mask
+
+    def with_boards(self, boards: Iterable[str]) -> int:
+        """
+        Get the nodes of any of the boards.
+
+        Args:
+            boards: Board names to match.
+
+        Returns:
+            The mask of matching nodes.
+        """
+        mask = 0
+        for board in boards:
+            mask |= self.boards.get(board, 0)
+        return mask
+
+    def with_uids(self, uids: Iterable[str]) -> int:
+        """
+        Get the nodes with any of the UIDs.
+
+        Args:
+            uids: UIDs to match.
+
+        Returns:
+            The mask of matching nodes.
+        """
+        mask = 0
+        for uid in uids:
+            mask |= self.uids.get(uid, 0)
+        return mask
+
+    def first_per_board(self, mask: int) -> int:
+        """
+        Reduce a selection to the first node of each board.
+
+        Args:
+            mask: The selected nodes.
+
+        Returns:
+            The mask with only the lowest node of each board.
+        """
+        selected = 0
+        for board_mask in self.boards.values():
+            board_mask &= mask
+            # Isolate the lowest set bit
+            selected |= board_mask & -board_mask
+        return selected
+
+    def indices(self, mask: int) -> List[int]:
+        """
+        Get the node positions of a mask.
+
+        Args:
+            mask: The selected nodes.
+
+        Returns:
+            The positions of the selected nodes in ascending order.
+        """
+        indices = []
+        mask &= self.all
+        while mask:
+            low = mask & -mask
+            indices.append(low.bit_length() - 1)
+            mask ^= low
+        return indices
+
+    def select(self, mask: int) -> List[NmNode]:
+        """
+        Get the nodes of a mask.
+
+        Args:
+            mask: The selected nodes.
+
+        Returns:
+            The selected nodes in their original order.
+        """
+        return [self.nodes[idx] for idx in self.indices(mask)]
+
+    def count(self, mask: int) -> int:
+        """
+        Count the nodes of a mask.
+
+        Args:
+            mask: The selected nodes.
+
+        Returns:
+            The number of selected nodes.
+        """
+        return bin(mask & self.all).count("1")
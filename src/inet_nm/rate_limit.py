@@ -0,0 +1,127 @@
+"""
+Token bucket rate limiting of node launches.
+
+A bucket holds up to `burst` tokens and is refilled at `rate` tokens per
+second, each launch takes a token. Launches are only delayed when the bucket
+is empty, so small node sets start at once and large ones are throttled to
+the rate. Tokens are reserved ahead of time: taking a token returns how long
+to wait for it, which works the same for threads and for asyncio tasks.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from inet_nm.data_types import NmNode
+from inet_nm.usb_ctrl import get_usb_hubs
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Args:
+        rate: Tokens refilled per second, None or 0 for no limit.
+        burst: Maximum number of tokens.
+        clock: Monotonic clock in seconds.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token.
+
+        Returns:
+            Seconds to wait until the token is available.
+        """
+        if self.rate is None or self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                float(self.burst), self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # Tokens may go negative, later reservations queue up behind
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class LaunchLimiter:
+    """
+    Rate limiter for starting operations on nodes.
+
+    Args:
+        rate: Launches per second, None or 0 for no limit.
+        burst: Number of launches allowed at once.
+        per_hub: Use one bucket per USB hub instead of one for all nodes.
+        hub_of: Function to get the hub key of a node, defaults to the
+            hub of its connected USB device, nodes not found share a bucket.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        burst: int = 1,
+        per_hub: bool = False,
+        hub_of: Callable[[NmNode], str] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.per_hub = per_hub
+        self._hub_of = hub_of
+        self._hubs: Optional[Dict[str, str]] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _hub(self, node: NmNode) -> str:
+        if self._hub_of is not None:
+            return self._hub_of(node)
+        with self._lock:
+            if self._hubs is None:
+                # Enumerate the devices once for all nodes
+                self._hubs = get_usb_hubs()
+            return self._hubs.get(node.uid, "")
+
+    def _bucket(self, node: NmNode) -> TokenBucket:
+        key = self._hub(node) if self.per_hub else ""
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rate, self.burst)
+            return self._buckets[key]
+
+    def reserve(self, node: NmNode) -> float:
+        """
+        Reserve a launch of a node.
+
+        Args:
+            node: The node to launch.
+
+        Returns:
+            Seconds to wait before launching.
+        """
+        return self._bucket(node).reserve()
+
+    def wait(self, node: NmNode):
+        """
+        Block until a node may be launched.
+
+        Args:
+            node: The node to launch.
+        """
+        delay = self.reserve(node)
+        if delay > 0:
+            time.sleep(delay)
@@ -3,136 +3,504 @@ This module includes classes that are used to run applications on nodes.
 
 Classes:
     NmShellRunner: Runs shell commands on nodes.
+    NmJobRunner: Runs a queue of jobs on the next free matching node.
     NmTmuxPanedRunner: Runs tmux with paned windows.
     NmTmuxWindowedRunner: Runs tmux with individual windows for each node.
 """
 
+import asyncio
+import collections
 import json
 import os
 import re
+import signal
 import subprocess
+import threading
 import time
-from typing import Dict
-
-from inet_nm._helpers import nm_extract_valid_jsons, nm_print
-from inet_nm.data_types import NmNode
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import inet_nm.check as chk
+from inet_nm._helpers import JsonStreamExtractor, nm_print
+from inet_nm.data_types import NmJob, NmNode
+from inet_nm.job_queue import JobQueue
+from inet_nm.node_index import NodeIndex
 from inet_nm.runner_base import NmNodesRunner
 
 
+class _NodeOutput:
+    """Output handling of one node.
+
+    The output is fed in chunks and optionally written to a log file, kept
+    as a tail of the last lines, kept completely, searched for JSON objects
+    and printed line by line.
+    """
+
+    MAX_LINE = 1 << 20
+
+    def __init__(
+        self,
+        prefix: str = "",
+        regex_str=None,
+        echo: bool = False,
+        log_path: Path = None,
+        tail_lines: int = 0,
+        keep: bool = False,
+        extract: bool = False,
+        on_object: Callable = None,
+    ):
+        self.prefix = prefix
+        self.regex_str = regex_str
+        self.echo = echo
+        self.log_path = log_path
+        self.log = open(log_path, "wb") if log_path is not None else None
+        self.tail = collections.deque(maxlen=tail_lines) if tail_lines else None
+        self.chunks = [] if keep else None
+        self.extractor = JsonStreamExtractor() if extract else None
+        self.on_object = on_object
+        self.data = []
+        self._pending = b""
+
+    def feed(self, chunk: bytes):
+        if self.log is not None:
+            self.log.write(chunk)
+            self.log.flush()
+        if self.chunks is not None:
+            self.chunks.append(chunk)
+        if self.extractor is not None:
+            for obj in self.extractor.feed(chunk):
+                self.data.append(obj)
+                if self.on_object is not None:
+                    self.on_object(obj)
+        if self.echo or self.tail is not None:
+            lines = (self._pending + chunk).split(b"\n")
+            self._pending = lines.pop()
+            if len(self._pending) > self.MAX_LINE:
+                lines.append(self._pending)
+                self._pending = b""
+            for line in lines:
+                self._line(line)
+
+    def feed_log(self, chunk: bytes):
+        """Write output that only goes to the log, such as stderr."""
+        if self.log is not None:
+            self.log.write(chunk)
+            self.log.flush()
+
+    def _line(self, line: bytes):
+        output = line.decode(errors="replace").strip()
+        if self.tail is not None:
+            self.tail.append(output)
+        if not self.echo:
+            return
+        if self.regex_str is not None:
+            for data in re.findall(self.regex_str, output):
+                nm_print(f"{self.prefix}{data}")
+        else:
+            nm_print(f"{self.prefix}{output}")
+
+    @property
+    def stdout(self) -> str:
+        return b"".join(self.chunks).decode(errors="replace")
+
+    def close(self):
+        if self._pending:
+            self._line(self._pending)
+            self._pending = b""
+        if self.log is not None:
+            self.log.close()
+
+
 class NmShellRunner(NmNodesRunner):
     """Runs shell commands on nodes.
 
     This class inherits from NmNodesRunner and overrides the func method
-    to execute shell commands on nodes.
+    to execute shell commands on nodes. The commands of all nodes are run
+    as subprocesses of a single asyncio event loop, which prints their
+    output lines as they arrive.
 
     Attributes:
         cmd: Command to execute on nodes.
+        json_filter: Capture only the JSON objects of the output.
+        json_stream: With json_filter, print the result of each node as a
+            JSON line as soon as the node finishes instead of all results
+            at the end.
+        json_objects: With json_stream, also print each JSON object as a
+            JSON line as soon as it appears in the output.
+        log_dir: Write the output of each node to its own log file in this
+            directory instead of printing it or keeping it in memory.
+        tail_lines: Number of last output lines kept of each node with a
+            log dir, printed for failed nodes and part of JSON results.
+        timeout: Seconds a command may run before its process group is
+            killed and the node reported as timed out.
+        idle_timeout: Seconds a command may run without output before its
+            process group is killed and the node reported as timed out.
+        build_cmd: Command run once per board before the command of the
+            nodes, with the environment of the first node of the board.
+            Nodes of a board whose build failed are skipped.
+        build_jobs: Maximum number of builds at the same time, defaults to
+            all boards at once.
+        pipeline: Start the command of a node as soon as the build of its
+            board finished instead of after all builds. Builds are limited
+            by `build_jobs` and the nodes by `jobs`, so CPU bound builds
+            overlap with USB bound flashing of other boards.
     """
 
     cmd = "echo $NM_IDX"
     SETUP_WAIT = 0.1
+    READ_SIZE = 65536
     output_filter = None
     json_filter = False
+    json_stream = False
+    json_objects = False
+    log_dir = None
+    tail_lines = 20
+    timeout = None
+    idle_timeout = None
+    build_cmd = None
+    build_jobs = None
+    pipeline = False
+    KILL_GRACE = 2.0
     results = []
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._failed_builds: Set[str] = set()
+        self._builds: Dict[str, asyncio.Task] = {}
+
     @staticmethod
-    def _run_command(cmd, prefix, env, regex_str=None):
-        def get_output(process):
-            output = process.stdout.readline()
-
-            if output:
-                if regex_str is not None:
-                    matched = re.findall(regex_str, output.decode().strip())
-                    for data in matched:
-                        nm_print(f"{prefix}{data}")
-                else:
-                    nm_print(f"{prefix}{output.decode().strip()}")
-            else:
-                # Have a small sleep so we are not burning CPU waiting for output.
-                time.sleep(0.1)
-            return output
+    async def _kill_group(process):
+        # The command runs in its own session, so this reaches all children
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(process.wait(), NmShellRunner.KILL_GRACE)
+                return
+            except asyncio.TimeoutError:
+                continue
 
-        process = subprocess.Popen(
-            cmd, env=env, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-        )
+    @staticmethod
+    async def _pump(stream, sink: Callable[[bytes], None]):
         while True:
-            output = get_output(process)
-            poll = process.poll()
-            if poll is not None:
-                output = True
-                while output:
-                    output = get_output(process)
-                break
-        rc = process.returncode
-
-        return rc
+            chunk = await stream.read(NmShellRunner.READ_SIZE)
+            if not chunk:
+                return
+            sink(chunk)
 
     @staticmethod
-    def _run_command_json(cmd, uid, board, idx, env):
-        # Run subprocess command to completion and capture output
-        result = subprocess.run(
+    async def _run_process(
+        cmd,
+        env,
+        output: _NodeOutput,
+        stderr=subprocess.STDOUT,
+        timeout: float = None,
+        idle_timeout: float = None,
+    ) -> Tuple[int, Optional[str]]:
+        # A callable stderr gets the stderr chunks from a second pipe, in the
+        # same loop as stdout so both arrive in the order they are read.
+        errors = stderr if callable(stderr) else None
+        process = await asyncio.create_subprocess_shell(
             cmd,
             env=env,
-            shell=True,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.PIPE if errors is not None else stderr,
+            start_new_session=True,
         )
-        data = nm_extract_valid_jsons(result.stdout.decode())
-        result_output = {
-            "uid": uid,
-            "board": board,
-            "idx": idx,
-            "data": data,
-            "stdout": result.stdout.decode(),
-            "result": result.returncode,
-        }
-        return result_output
+        pump = None
+        if errors is not None:
+            pump = asyncio.ensure_future(NmShellRunner._pump(process.stderr, errors))
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        timed_out = None
+        try:
+            # Read chunks instead of lines so long lines do not hit the
+            # line limit of the stream reader.
+            while True:
+                wait = idle_timeout
+                if deadline is not None:
+                    left = deadline - loop.time()
+                    wait = left if wait is None else min(wait, left)
+                try:
+                    chunk = await asyncio.wait_for(
+                        process.stdout.read(NmShellRunner.READ_SIZE), wait
+                    )
+                except asyncio.TimeoutError:
+                    if deadline is not None and loop.time() >= deadline:
+                        timed_out = "timeout"
+                    else:
+                        timed_out = "idle_timeout"
+                    break
+                if not chunk:
+                    break
+                output.feed(chunk)
+            if timed_out is None and deadline is not None:
+                # The output may be closed while the command still runs
+                try:
+                    await asyncio.wait_for(
+                        process.wait(), max(deadline - loop.time(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    timed_out = "timeout"
+            if timed_out is not None:
+                await NmShellRunner._kill_group(process)
+            if pump is not None:
+                await pump
+        except BaseException:
+            # Aborted, do not leave the command running
+            if pump is not None:
+                pump.cancel()
+            await asyncio.shield(NmShellRunner._kill_group(process))
+            raise
+        finally:
+            output.close()
+        return await process.wait(), timed_out
 
-    def func(self, node: NmNode, idx: int, env: Dict[str, str]):
-        """Execute shell commands on nodes.
+    @staticmethod
+    def _print_json_line(record):
+        nm_print(json.dumps(record, sort_keys=True), flush=True)
+
+    def _log_path(self, name: str) -> Path:
+        log_dir = Path(self.log_dir)
+        log_dir.mkdir(parents=True, exist_ok=True)
+        return log_dir / f"{name}.log"
+
+    async def afunc(self, node: NmNode, idx: int, env: Dict[str, str]):
+        """Execute shell commands on nodes in the event loop.
 
         Args:
             node: Node to run the command on.
             idx: Index of the node.
             env: Environment variables for the command.
-        """
-        time.sleep(idx * self.SETUP_WAIT)
-        full_env = {**os.environ, **env}  # Merge original and new environment variables
-        full_env = {
-            k: str(v) for k, v in full_env.items()
-        }  # Cast everything in env to a string
 
+        Returns:
+            The return code of the command, or `timeout` or `idle_timeout`
+            if it was killed for taking too long.
+        """
         prefix = f"NODE:{idx}"
         if node.board:
             prefix += f":BOARD:{node.board}"
         prefix += ": "
+        return await self._arun(self.cmd, node, idx, env, prefix, f"{idx}-{node.uid}")
+
+    async def _arun(
+        self,
+        shell_cmd: str,
+        node: NmNode,
+        idx: int,
+        env: Dict[str, str],
+        prefix: str,
+        log_name: str,
+        extra: Dict = None,
+        ident: Dict = None,
+    ):
+        # Results are keyed by the node unless they belong to something else
+        if ident is None:
+            ident = {"uid": node.uid, "board": node.board, "idx": idx}
+        full_env = {**os.environ, **env}  # Merge original and new environment variables
+        full_env = {
+            k: str(v) for k, v in full_env.items()
+        }  # Cast everything in env to a string
 
         # Since most use cases are with bash we will use that as the default shell.
         # This may change as soon as we have a use case that requires a different shell.
         # Note that the run command exits after one command is executed.
         # So if we want to loop with a default shell it will exit after the first loop.
-        cmd = f"/bin/bash -c '{self.cmd}'"
+        cmd = f"/bin/bash -c '{shell_cmd}'"
         if self.output_filter is None:
             regex_str = None
         else:
             regex_str = re.compile(self.output_filter)
+        log_path = self._log_path(log_name) if self.log_dir else None
+
+        def _print_object(obj):
+            NmShellRunner._print_json_line({**ident, "object": obj, **(extra or {})})
+
+        output = _NodeOutput(
+            prefix=prefix,
+            regex_str=regex_str,
+            # With a log file only the filtered lines are printed
+            echo=not self.json_filter and (log_path is None or regex_str is not None),
+            log_path=log_path,
+            tail_lines=self.tail_lines if log_path is not None else 0,
+            keep=self.json_filter and not self.json_stream and log_path is None,
+            extract=self.json_filter,
+            on_object=_print_object if self.json_stream and self.json_objects else None,
+        )
+        stderr = subprocess.STDOUT
         if self.json_filter:
-            res = NmShellRunner._run_command_json(
-                cmd, node.uid, node.board, idx, env=full_env
+            # Errors go to the log but never into the JSON objects
+            stderr = output.feed_log if log_path is not None else subprocess.DEVNULL
+        res, timed_out = await NmShellRunner._run_process(
+            cmd,
+            full_env,
+            output,
+            stderr=stderr,
+            timeout=self.timeout,
+            idle_timeout=self.idle_timeout,
+        )
+
+        if self.json_filter:
+            record = {
+                **ident,
+                "data": output.data,
+                "result": res,
+                **(extra or {}),
+            }
+            if output.chunks is not None:
+                record["stdout"] = output.stdout
+            if log_path is not None:
+                record["log"] = str(log_path)
+                record["tail"] = list(output.tail)
+            if timed_out is not None:
+                record["timeout"] = timed_out
+            if self.json_stream:
+                NmShellRunner._print_json_line(record)
+            else:
+                self.results.append(record)
+            return timed_out or res
+
+        if self.output_filter is None:
+            self.results.append(f"RESULT:{prefix}{res}")
+        if timed_out is not None:
+            self.results.append(f"TIMEOUT:{prefix}{timed_out}")
+        if log_path is not None:
+            self.results.append(f"LOG:{prefix}{log_path}")
+            if res != 0:
+                self.results.extend(f"TAIL:{prefix}{line}" for line in output.tail)
+        return timed_out or res
+
+    def func(self, node: NmNode, idx: int, env: Dict[str, str]):
+        """Execute shell commands on nodes.
+
+        Args:
+            node: Node to run the command on.
+            idx: Index of the node.
+            env: Environment variables for the command.
+
+        Returns:
+            The return code of the command.
+        """
+        self.launcher.wait(node)
+        return asyncio.run(self.afunc(node, idx, env))
+
+    async def _build(self, slots, board: str, idx: int):
+        node = self.nodes[idx]
+        env = self.node_env(node, idx)
+        async with slots:
+            try:
+                res = await self._arun(
+                    self.build_cmd,
+                    node,
+                    idx,
+                    env,
+                    f"BUILD:BOARD:{board}: ",
+                    f"build-{board}",
+                    ident={"build": board},
+                )
+            except Exception:
+                res = "error"
+                traceback.print_exc()
+        if res != 0:
+            self._failed_builds.add(board)
+
+    def _start_builds(self, boards: List[str]) -> Dict[str, asyncio.Task]:
+        slots = asyncio.Semaphore(self.build_jobs or max(len(boards), 1))
+        builds = {}
+        for board in boards:
+            # The first node of the board provides the environment
+            idx = next(
+                idx for idx, node in enumerate(self.nodes) if node.board == board
             )
-            self.results.append(res)
+            builds[board] = asyncio.ensure_future(self._build(slots, board, idx))
+        return builds
+
+    async def _build_boards(self, boards: List[str]):
+        await asyncio.gather(*self._start_builds(boards).values())
+
+    def pre(self):
+        """Run before the operations on nodes.
+
+        With a build command it is run once for each distinct board of the
+        nodes, all nodes of the board reuse what it built. Unless pipelined,
+        all builds finish before the first node starts.
+        """
+        self._failed_builds = set()
+        if self.build_cmd is None:
+            return
+        boards = chk.nodes_to_boards(self.nodes)
+        if not self.json_filter:
+            for board, count in boards.items():
+                nm_print(f"BUILD:BOARD:{board}: building once for {count} nodes")
+        if self.pipeline:
+            # The builds start together with the nodes
+            return
+        asyncio.run(self._build_boards(list(boards)))
+
+    def _init_builds(self):
+        # Starts the builds of a pipelined run in the running event loop
+        self._builds = {}
+        if self.build_cmd is not None and self.pipeline:
+            self._builds = self._start_builds(list(chk.nodes_to_boards(self.nodes)))
+
+    async def _build_ok(self, node: NmNode, idx: int) -> bool:
+        if node.board in self._builds:
+            await self._builds[node.board]
+        if node.board not in self._failed_builds:
+            return True
+        self.exit_status[idx] = "build_failed"
+        if not self.json_filter:
+            self.results.append(f"SKIPPED:NODE:{idx}:BOARD:{node.board}: build failed")
+            return False
+        record = {
+            "uid": node.uid,
+            "board": node.board,
+            "idx": idx,
+            "result": None,
+            "error": "build failed",
+        }
+        if self.json_stream:
+            NmShellRunner._print_json_line(record)
         else:
-            res = NmShellRunner._run_command(
-                cmd, prefix=prefix, env=full_env, regex_str=regex_str
-            )
-        if self.output_filter is None and not self.json_filter:
-            self.results.append(f"RESULT:{prefix}{res}")
+            self.results.append(record)
+        return False
+
+    async def _run_node(self, slots, node: NmNode, idx: int, env: Dict[str, str]):
+        if not await self._build_ok(node, idx):
+            return
+        async with slots:
+            await asyncio.sleep(self.launcher.reserve(node))
+            try:
+                self.exit_status[idx] = await self.afunc(node, idx, env)
+            except Exception:
+                self.exit_status[idx] = "error"
+                traceback.print_exc()
+
+    async def _run_nodes_async(self, items):
+        self._init_builds()
+        slots = asyncio.Semaphore(self.jobs or max(len(items), 1))
+        await asyncio.gather(
+            *(self._run_node(slots, *item) for item in items), *self._builds.values()
+        )
+
+    def _run_nodes(self, items):
+        """Run the commands of all nodes in one event loop.
+
+        Args:
+            items: The node, its index and its environment for each node.
+        """
+        asyncio.run(self._run_nodes_async(items))
 
     def post(self):
         """Run after the operations on nodes have completed.
 
         It prints the results of the commands executed on nodes.
         """
+        if self.json_filter and self.json_stream:
+            return
         if self.json_filter:
             nm_print(json.dumps(self.results, indent=2, sort_keys=True))
         else:
@@ -140,6 +508,124 @@ class NmShellRunner(NmNodesRunner):
                 nm_print(result)
 
 
+class NmJobRunner(NmShellRunner):
+    """Runs a queue of jobs on a pool of nodes.
+
+    Each job runs once, on the next free node that meets its board and
+    feature requirements, until the queue is drained. The nodes stay locked
+    for the whole run. Jobs get the environment of their node plus `NM_JOB`
+    with the name of the job. With a store of durations the jobs expected
+    to take longest are dispatched first.
+
+    Attributes:
+        job_list: The jobs to run.
+        unrunnable: The jobs no selected node can run or whose nodes all
+            failed to build, set by `run`.
+        durations: Store of the durations of successful jobs per board,
+            used to dispatch the jobs expected to take longest first.
+    """
+
+    job_list: List[NmJob] = []
+    unrunnable: List[NmJob] = []
+    durations = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._durations: List[Tuple[str, str, float]] = []
+
+    async def _run_job(self, node: NmNode, idx: int, env: Dict[str, str], job):
+        pos, job = job
+        prefix = f"JOB:{job.name}:NODE:{idx}"
+        if node.board:
+            prefix += f":BOARD:{node.board}"
+        prefix += ": "
+        start = time.monotonic()
+        res = await self._arun(
+            job.cmd,
+            node,
+            idx,
+            {**env, "NM_JOB": job.name},
+            prefix,
+            f"{pos}-{job.name}-{idx}-{node.uid}",
+            extra={"job": job.name},
+        )
+        if res == 0:
+            # Failed jobs often stop early and would skew the history
+            self._durations.append((node.board, job.cmd, time.monotonic() - start))
+        return res
+
+    async def _node_worker(self, slots, queue: JobQueue, node, idx, env):
+        if not await self._build_ok(node, idx):
+            return
+        failed = 0
+        while True:
+            async with slots:
+                # Only take a job once it can start right away
+                job = queue.take(idx)
+                if job is None:
+                    break
+                await asyncio.sleep(self.launcher.reserve(node))
+                try:
+                    res = await self._run_job(node, idx, env, job)
+                except Exception:
+                    res = "error"
+                    traceback.print_exc()
+            failed += res != 0
+        self.exit_status[idx] = failed
+
+    async def _run_jobs_async(self, items):
+        history = self.durations.load() if self.durations is not None else None
+        queue = JobQueue(
+            self.job_list, NodeIndex([node for node, _, _ in items]), history
+        )
+        self._init_builds()
+        slots = asyncio.Semaphore(self.jobs or max(len(items), 1))
+        await asyncio.gather(
+            *(self._node_worker(slots, queue, *item) for item in items),
+            *self._builds.values(),
+        )
+        # Jobs left over only matched nodes whose build failed
+        left = queue.unrunnable + queue.drain()
+        self.unrunnable = [job for _, job in sorted(left, key=lambda item: item[0])]
+
+    def _run_nodes(self, items):
+        """Dispatch the jobs to the nodes in one event loop.
+
+        Args:
+            items: The node, its index and its environment for each node.
+        """
+        self._durations = []
+        asyncio.run(self._run_jobs_async(items))
+        if self.durations is not None:
+            try:
+                self.durations.record(self._durations)
+            except OSError:
+                # A read-only config dir only loses the history
+                pass
+
+    def post(self):
+        """Run after the queue is drained.
+
+        It prints the results of the jobs and the jobs no node could run.
+        """
+        if self.json_filter:
+            unrunnable = [
+                {"job": job.name, "result": None, "error": "no matching node"}
+                for job in self.unrunnable
+            ]
+            if self.json_stream:
+                for record in unrunnable:
+                    NmShellRunner._print_json_line(record)
+                return
+            self.results.extend(unrunnable)
+            nm_print(json.dumps(self.results, indent=2, sort_keys=True))
+            return
+        for result in self.results:
+            nm_print(result)
+        for job in self.unrunnable:
+            nm_print(f"UNRUNNABLE:JOB:{job.name}: no matching node")
+
+
 class NmTmuxBaseRunner(NmNodesRunner):
     """Base class for tmux runners.
 
@@ -150,6 +636,12 @@ class NmTmuxBaseRunner(NmNodesRunner):
     cmd: str = None
     SETUP_WAIT = 0.2
 
+    def pre(self):
+        """Prepare the creation of the tmux session by the node threads."""
+        self._session_ready = threading.Event()
+        self._pane_turn = threading.Condition()
+        self._next_pane = 0
+
     def post(self):
         """Run after the operations on nodes have completed.
 
@@ -184,7 +676,6 @@ class NmTmuxPanedRunner(NmTmuxBaseRunner):
             idx: Index of the node.
             env: Environment variables for the command.
         """
-        time.sleep(idx * self.SETUP_WAIT)
         e_args = ""
         for key, value in env.items():
             esc = "\\$"
@@ -193,19 +684,31 @@ class NmTmuxPanedRunner(NmTmuxBaseRunner):
             else:
                 e_args += f" -e {key}={value}"
 
-        if idx != 0:
-            subprocess.run(
-                f"tmux split-window {e_args} -t {self.session_name}", shell=True
-            )
-        else:
-            subprocess.run(f"tmux new-session -d -s {self.session_name}", shell=True)
-            subprocess.run(
-                f"tmux respawn-window -k {e_args} -t {self.session_name} -t 0.{idx}",
-                shell=True,
-            )
-
-        # Select pane
-        subprocess.run(f"tmux select-pane -t {idx}", shell=True)
+        # Panes are numbered in order of creation, so create them in turn
+        with self._pane_turn:
+            self._pane_turn.wait_for(lambda: self._next_pane == idx)
+        try:
+            self.launcher.wait(node)
+            if idx != 0:
+                subprocess.run(
+                    f"tmux split-window {e_args} -t {self.session_name}", shell=True
+                )
+            else:
+                subprocess.run(
+                    f"tmux new-session -d -s {self.session_name}", shell=True
+                )
+                subprocess.run(
+                    f"tmux respawn-window -k {e_args} -t {self.session_name} "
+                    f"-t 0.{idx}",
+                    shell=True,
+                )
+
+            # Select pane
+            subprocess.run(f"tmux select-pane -t {idx}", shell=True)
+        finally:
+            with self._pane_turn:
+                self._next_pane = idx + 1
+                self._pane_turn.notify_all()
 
         # Execute command
         if self.cmd:
@@ -237,19 +740,24 @@ class NmTmuxWindowedRunner(NmTmuxBaseRunner):
         uid = env["NM_UID"]
         session_name = self.session_name
 
-        time.sleep(idx * self.SETUP_WAIT)
-
         e_args = " -e " + " -e ".join([f"{key}={value}" for key, value in env.items()])
         if idx != 0:
+            # Windows can only be added once the session exists
+            self._session_ready.wait()
+            self.launcher.wait(node)
             subprocess.run(
                 f"tmux new-window -t {session_name}:{idx} {e_args}", shell=True
             )
         else:
-            subprocess.run(f"tmux new-session -d -s {session_name}", shell=True)
-            subprocess.run(
-                f"tmux respawn-window -k {e_args} -t {session_name} -t 0.{idx}",
-                shell=True,
-            )
+            self.launcher.wait(node)
+            try:
+                subprocess.run(f"tmux new-session -d -s {session_name}", shell=True)
+                subprocess.run(
+                    f"tmux respawn-window -k {e_args} -t {session_name} -t 0.{idx}",
+                    shell=True,
+                )
+            finally:
+                self._session_ready.set()
 
         subprocess.run(f"tmux rename-window -t {session_name}:{idx} {uid}", shell=True)
 
@@ -6,13 +6,18 @@ operations on multiple nodes.
 An operation is defined by a method `func` which is to be implemented
 in the subclass.
 """
+import queue
+import time
+import traceback
 from threading import Thread
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 
 import inet_nm.locking as lk
 from inet_nm._helpers import nm_print
 from inet_nm.data_types import EnvConfigFormat, NmNode, NodeEnv
-from inet_nm.filelock import FileLock
+from inet_nm.filelock import FileLock, FileLockTimeout
+from inet_nm.rate_limit import LaunchLimiter
+from inet_nm.usage import UsageLog, usage_entry
 from inet_nm.usb_ctrl import get_ttys_from_nm_node
 
 
@@ -25,9 +30,16 @@ class NmNodesRunner:
     have completed.
 
     The operations to be run are defined by a method `func` which is to
-    be implemented in the subclass.
+    be implemented in the subclass. Operations call `launcher.wait` before
+    starting, which throttles the launches to the configured rate.
+
+    Attributes:
+        SETUP_WAIT: Seconds between launches if no launch rate is given,
+            0 for no limit.
     """
 
+    SETUP_WAIT = 0
+
     def __init__(
         self,
         nodes: List[NmNode],
@@ -35,6 +47,11 @@ class NmNodesRunner:
         seq=False,
         force=False,
         extra_env: EnvConfigFormat = None,
+        usage_log: UsageLog = None,
+        jobs: int = None,
+        launch_rate: float = None,
+        launch_burst: int = 1,
+        launch_per_hub: bool = False,
     ):
         """
         Initialize a new instance of NmNodesRunner.
@@ -42,10 +59,19 @@ class NmNodesRunner:
         Args:
             nodes: A list of NmNode instances to be managed.
             default_timeout: Default timeout value for file lock acquisition.
-            seq: If True, operations are run sequentially instead of concurrently.
+            seq: If True, operations are run sequentially, same as one job.
             force: If True, operations are run even if the node is locked.
             extra_env: A dictionary of extra environment variables to be passed
                 to the operation function.
+            usage_log: Log to account the lock wait and hold times and the
+                exit status of each node in.
+            jobs: Maximum number of nodes to run the operation on at the
+                same time, defaults to all nodes at once.
+            launch_rate: Maximum node launches per second, 0 for no limit,
+                defaults to one launch per `SETUP_WAIT`.
+            launch_burst: Number of nodes that may be launched at once.
+            launch_per_hub: Limit the launches per USB hub instead of for
+                all nodes.
 
         """
         self.nodes = nodes
@@ -58,6 +84,14 @@ class NmNodesRunner:
             for node in nodes
         ]
         self.locks = [lock for _, lock in self.lockable_nodes]
+        self.usage_log = usage_log
+        self.jobs = 1 if seq else jobs
+        if launch_rate is None and self.SETUP_WAIT:
+            launch_rate = 1 / self.SETUP_WAIT
+        self.launcher = LaunchLimiter(launch_rate, launch_burst, launch_per_hub)
+        self.exit_status: Dict[int, Any] = {}
+        self._lock_times: Dict[int, tuple] = {}
+        self._broker = None
         self._acquired = False
 
     def pre(self):
@@ -78,14 +112,26 @@ class NmNodesRunner:
             node: The node to run the function on.
             idx: The index of the node in the list of nodes.
             env: A dictionary of environment variables.
+
+        Returns:
+            The exit status of the operation, recorded in the usage log.
         """
         raise NotImplementedError("You must implement a func() method")
 
+    def _run_func(self, node: NmNode, idx: int, env: Dict[str, str]):
+        try:
+            self.exit_status[idx] = self.func(node, idx, env)
+        except BaseException:
+            self.exit_status[idx] = "error"
+            raise
+
     def acquire(self, timeout: float = None):
         """
         Acquire file locks for all nodes.
 
         This method must be called before running operations on nodes.
+        If a reservation broker is running, all nodes are acquired at once
+        through the broker instead.
 
         Args:
             timeout (float): Timeout value for file lock acquisition.
@@ -93,66 +139,165 @@ class NmNodesRunner:
         """
         if self.force:
             return
-        for lock in self.locks:
-            lock.acquire(timeout=timeout or self.default_timeout)
+        timeout = timeout or self.default_timeout
+        start = time.time()
+        self._broker = lk.connect_broker()
+        if self._broker is not None:
+            uids = [node.uid for node in self.nodes]
+            try:
+                self._broker.acquire(uids, timeout=timeout)
+            except Exception:
+                self._broker.close()
+                self._broker = None
+                self._record_lock_timeout(range(len(self.nodes)), start)
+                raise
+            now = time.time()
+            for idx in range(len(self.nodes)):
+                self._lock_times[idx] = (now, now - start)
+        else:
+            for idx, lock in enumerate(self.locks):
+                try:
+                    lock.acquire(timeout=timeout)
+                except FileLockTimeout:
+                    self._record_lock_timeout([idx], time.time() - lock.wait_time)
+                    raise
+                self._lock_times[idx] = (time.time(), lock.wait_time)
         self._acquired = True
 
     def release(self):
         """Release all acquired file locks."""
         if self.force:
             return
-        for lock in self.locks:
-            try:
-                lock.release()
-            except FileNotFoundError:
-                nm_print(f"File {lock.file_name} already unlocked.")
+        if self._broker is not None:
+            holder = self._broker.holder
+            self._broker.release()
+            self._broker.close()
+            self._broker = None
+        else:
+            holder = self.locks[0].holder if self.locks else None
+            for lock in self.locks:
+                try:
+                    lock.release()
+                except FileNotFoundError:
+                    nm_print(f"File {lock.file_name} already unlocked.")
+        self._record_usage(holder)
         self._acquired = False
 
-    def run(self):
+    def _record_usage(self, holder: str):
+        now = time.time()
+        entries = [
+            usage_entry(
+                self.nodes[idx],
+                holder,
+                wait,
+                now - since,
+                self.exit_status.get(idx),
+                ts=now,
+            )
+            for idx, (since, wait) in sorted(self._lock_times.items())
+        ]
+        self._lock_times = {}
+        if self.usage_log is not None and entries:
+            self.usage_log.record(entries)
+
+    def _record_lock_timeout(self, indices, start: float):
+        if self.usage_log is None:
+            return
+        now = time.time()
+        holder = self.locks[0].holder if self.locks else None
+        entries = [
+            usage_entry(self.nodes[idx], holder, now - start, 0, "lock_timeout", ts=now)
+            for idx in indices
+        ]
+        self.usage_log.record(entries)
+
+    def node_env(self, node: NmNode, idx: int) -> Dict[str, str]:
         """
-        Run operations on all nodes.
+        Get the environment variables of a node.
+
+        Args:
+            node: The node to get the environment for.
+            idx: The index of the node in the list of nodes.
 
-        This method spawns a new thread for each node and runs the
-        operation concurrently on all nodes.
-        The operation to run is defined by the `func` method.
+        Returns:
+            The NM_* variables of the node merged with the extra env.
         """
+        ttys = get_ttys_from_nm_node(node)
+        if ttys:
+            nm_port = ttys[0]
+        else:
+            nm_port = "Unknown"
+        node_env = NodeEnv(
+            NM_IDX=idx,
+            NM_UID=node.uid,
+            NM_SERIAL=node.serial,
+            NM_BOARD=node.board,
+            NM_PORT=nm_port,
+        ).to_dict()
 
-        if not self._acquired and not self.force:
-            raise Exception("You must call acquire() before calling run()")
+        # Inject multiple ttys values if available
+        for i, tty in enumerate(ttys):
+            node_env[f"NM_PORT_{i}"] = tty
+        node_env.update(self.extra_env.shared)
+        node_env.update(self.extra_env.nodes.get(node.uid, {}))
+        return node_env
 
-        self.pre()
+    def _worker(self, work: queue.Queue):
+        while True:
+            try:
+                node, idx, node_env = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._run_func(node, idx, node_env)
+            except Exception:
+                # Keep the worker alive for the remaining nodes
+                traceback.print_exc()
 
-        self.threads = []
-        for idx, node in enumerate(self.nodes):
-            ttys = get_ttys_from_nm_node(node)
-            if ttys:
-                nm_port = ttys[0]
-            else:
-                nm_port = "Unknown"
-            node_env = NodeEnv(
-                NM_IDX=idx,
-                NM_UID=node.uid,
-                NM_SERIAL=node.serial,
-                NM_BOARD=node.board,
-                NM_PORT=nm_port,
-            ).to_dict()
-
-            # Inject multiple ttys values if available
-            for i, tty in enumerate(ttys):
-                node_env[f"NM_PORT_{i}"] = tty
-            node_env.update(self.extra_env.shared)
-            node_env.update(self.extra_env.nodes.get(node.uid, {}))
-
-            thread = Thread(target=self.func, args=(node, idx, node_env))
-            thread.start()
-            if self.seq:
-                thread.join()
-            else:
-                self.threads.append(thread)
+    def _run_nodes(self, items: List[Tuple[NmNode, int, Dict[str, str]]]):
+        """
+        Run the operation on the nodes.
+
+        The nodes are put in a work queue that is processed by a pool of
+        `jobs` worker threads, by default one per node. Subclasses can
+        override this to use another engine.
+
+        Args:
+            items: The node, its index and its environment for each node.
+        """
+        work = queue.Queue()
+        for item in items:
+            work.put(item)
 
+        workers = len(items)
+        if self.jobs is not None:
+            workers = max(1, min(self.jobs, workers))
+        self.threads = [
+            Thread(target=self._worker, args=(work,)) for _ in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
         for thread in self.threads:
             thread.join()
 
+    def run(self):
+        """
+        Run operations on all nodes.
+
+        The environment of each node is built and the operation defined
+        by the `func` method is run on the nodes by `_run_nodes`.
+        """
+
+        if not self._acquired and not self.force:
+            raise Exception("You must call acquire() before calling run()")
+
+        self.pre()
+        self._run_nodes(
+            [
+                (node, idx, self.node_env(node, idx))
+                for idx, node in enumerate(self.nodes)
+            ]
+        )
         self.post()
         self.release()
 
@@ -1,5 +1,7 @@
+import argparse
 import subprocess
 import sys
+from typing import Dict
 
 import inet_nm.check as chk
 import inet_nm.config as cfg
@@ -59,6 +61,47 @@ def sanity_check(cmd, **kwargs):
     return _check_filtered_nodes(**kwargs)
 
 
+def launch_args(parser: argparse.ArgumentParser):
+    """Add the arguments to rate limit node launches.
+
+    Args:
+        parser: The argparse parser.
+    """
+    parser.add_argument(
+        "--launch-rate",
+        type=float,
+        default=None,
+        help="Maximum node launches per second, 0 for no limit",
+    )
+    parser.add_argument(
+        "--launch-burst",
+        type=int,
+        default=1,
+        help="Number of nodes that may be launched at once",
+    )
+    parser.add_argument(
+        "--launch-per-hub",
+        action="store_true",
+        help="Apply the launch limit per USB hub",
+    )
+
+
+def pop_launch_args(kwargs: Dict) -> Dict:
+    """Pop the launch arguments for the runner from the parsed arguments.
+
+    Args:
+        kwargs: The parsed arguments as dict.
+
+    Returns:
+        The keyword arguments for the runner.
+    """
+    return {
+        "launch_rate": kwargs.pop("launch_rate"),
+        "launch_burst": kwargs.pop("launch_burst"),
+        "launch_per_hub": kwargs.pop("launch_per_hub"),
+    }
+
+
 def do_nothing(signum, frame):
     """Does nothing."""
     pass
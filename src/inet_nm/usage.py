@@ -0,0 +1,195 @@
+"""
+Accounting of node usage from lock lifecycles.
+
+Every release of a node appends one line with the UID, board, holder, how
+long the lock was waited for and held, and the exit status of what ran on it.
+The log is split into one NDJSON file per month in the `usage` dir of the
+config dir and only the latest months are kept. Aggregations per board or
+per node over a time window show bottlenecks by long waits and idle hardware
+by having no holds at all.
+"""
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+from inet_nm.data_types import NmNode
+
+
+class UsageLog:
+    """
+    Rolling log of node usage.
+
+    Args:
+        config_dir: Directory for the configuration files.
+
+    Attributes:
+        usage_dir (Path): Directory of the monthly log files.
+    """
+
+    _DIRNAME = "usage"
+    KEEP_MONTHS = 12
+
+    def __init__(self, config_dir: Union[Path, str]):
+        self.usage_dir = Path(config_dir).expanduser() / self._DIRNAME
+
+    @staticmethod
+    def _month(ts: float) -> str:
+        return time.strftime("%Y-%m", time.gmtime(ts))
+
+    def _path(self, month: str) -> Path:
+        return self.usage_dir / f"usage-{month}.ndjson"
+
+    def _months(self) -> List[str]:
+        if not self.usage_dir.exists():
+            return []
+        months = [
+            path.stem[len("usage-") :] for path in self.usage_dir.glob("*.ndjson")
+        ]
+        return sorted(months)
+
+    def record(self, entries: List[Dict[str, Any]]):
+        """
+        Append usage entries, each entry needs a `ts`.
+
+        A failure to write, for example in a read-only config dir, only
+        loses the accounting.
+
+        Args:
+            entries: The entries to append.
+        """
+        by_month: Dict[str, str] = {}
+        for entry in entries:
+            month = self._month(entry["ts"])
+            by_month[month] = by_month.get(month, "") + json.dumps(entry) + "\n"
+        try:
+            self.usage_dir.mkdir(parents=True, exist_ok=True)
+            for month, lines in by_month.items():
+                # A single append write per file keeps concurrent writers apart
+                with open(self._path(month), "a") as file:
+                    file.write(lines)
+            for month in self._months()[: -self.KEEP_MONTHS]:
+                self._path(month).unlink()
+        except OSError:
+            pass
+
+    def read(self, since: float = None, until: float = None) -> Iterator[Dict]:
+        """
+        Read the entries released within a time window.
+
+        Only the files of the months in the window are read.
+
+        Args:
+            since: Only entries released after this point in time.
+            until: Only entries released up to this point in time.
+
+        Yields:
+            The entries in order of the files.
+        """
+        first = self._month(since) if since is not None else None
+        last = self._month(until) if until is not None else None
+        for month in self._months():
+            if (first and month < first) or (last and month > last):
+                continue
+            with open(self._path(month), "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        ts = entry["ts"]
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if since is not None and ts <= since:
+                        continue
+                    if until is not None and ts > until:
+                        continue
+                    yield entry
+
+
+def usage_entry(
+    node: NmNode, holder: str, wait: float, hold: float, status: Any, ts: float = None
+) -> Dict[str, Any]:
+    """
+    Create a usage entry for a node.
+
+    Args:
+        node: The node that was used.
+        holder: The holder of the lock.
+        wait: Seconds waited for the lock.
+        hold: Seconds the lock was held.
+        status: The exit status of what ran on the node, None if unknown.
+        ts: The release time, defaults to now.
+
+    Returns:
+        The usage entry.
+    """
+    return {
+        "ts": time.time() if ts is None else ts,
+        "uid": node.uid,
+        "board": node.board,
+        "holder": holder,
+        "wait": round(wait, 3),
+        "hold": round(hold, 3),
+        "status": status,
+    }
+
+
+def aggregate_usage(
+    entries: Iterable[Dict],
+    nodes: List[NmNode],
+    window: float,
+    by: str = "board",
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate usage entries per board or per node.
+
+    Groups of the given nodes without any entries are included, so idle
+    hardware shows up with zero holds.
+
+    Args:
+        entries: The usage entries of the time window.
+        nodes: All nodes of the lab.
+        window: Length of the time window in seconds.
+        by: Group by `board` or by `node` UID.
+
+    Returns:
+        The holds, hold and wait times, utilization and failures per group.
+    """
+    key = "board" if by == "board" else "uid"
+    node_counts: Dict[str, int] = {}
+    for node in nodes:
+        group = node.board if key == "board" else node.uid
+        node_counts[group] = node_counts.get(group, 0) + 1
+
+    groups: Dict[str, Dict[str, Any]] = {}
+
+    def _group(name):
+        if name not in groups:
+            groups[name] = {
+                "holds": 0,
+                "hold_seconds": 0.0,
+                "wait_seconds": 0.0,
+                "max_wait": 0.0,
+                "failures": 0,
+            }
+        return groups[name]
+
+    for name in node_counts:
+        _group(name)
+    for entry in entries:
+        group = _group(entry.get(key, "unknown"))
+        group["holds"] += 1
+        group["hold_seconds"] += entry.get("hold", 0.0)
+        group["wait_seconds"] += entry.get("wait", 0.0)
+        group["max_wait"] = max(group["max_wait"], entry.get("wait", 0.0))
+        if entry.get("status") not in (0, None):
+            group["failures"] += 1
+
+    for name, group in groups.items():
+        capacity = window * node_counts.get(name, 1)
+        holds = group["holds"]
+        group["mean_wait"] = group["wait_seconds"] / holds if holds else 0.0
+        group["utilization"] = group["hold_seconds"] / capacity if capacity else 0.0
+        for field in ("hold_seconds", "wait_seconds", "max_wait", "mean_wait"):
+            group[field] = round(group[field], 3)
+        group["utilization"] = round(group["utilization"], 4)
+    return groups
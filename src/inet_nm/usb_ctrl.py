@@ -1,5 +1,6 @@
 import os
-from typing import List, Optional, Set
+import time
+from typing import Dict, List, Optional, Set
 
 if os.getenv("INET_NM_FAKE_USB_PATH"):
     from inet_nm.fake_usb import Context
@@ -33,6 +34,66 @@ def get_connected_uids() -> List[str]:
     return uids
 
 
+class TtyMonitor:
+    """
+    Wait for TTY devices to be added or removed.
+
+    With udev a netlink monitor is used, so waiting costs nothing until an
+    event arrives. With fake USB devices the fake device file is watched. If
+    the monitor cannot be created the connected UIDs are compared instead.
+    """
+
+    def __init__(self):
+        self._monitor = None
+        self._fake_path = os.getenv("INET_NM_FAKE_USB_PATH")
+        self._last = None
+        if self._fake_path:
+            self._last = self._fake_signature()
+            return
+        try:
+            from pyudev import Monitor
+
+            self._monitor = Monitor.from_netlink(Context())
+            self._monitor.filter_by("tty")
+            self._monitor.start()
+        except (OSError, ImportError):
+            self._monitor = None
+            self._last = set(get_connected_uids())
+
+    def _fake_signature(self):
+        try:
+            stat = os.stat(self._fake_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for TTY devices to change.
+
+        Args:
+            timeout: Maximum time to wait in seconds.
+
+        Returns:
+            True if a device was added or removed, False on timeout.
+        """
+        if self._monitor is not None:
+            if self._monitor.poll(timeout) is None:
+                return False
+            # Drain the events of the same plug or unplug
+            while self._monitor.poll(0) is not None:
+                pass
+            return True
+        time.sleep(timeout)
+        if self._fake_path:
+            current = self._fake_signature()
+        else:
+            current = set(get_connected_uids())
+        changed = current != self._last
+        self._last = current
+        return changed
+
+
 def get_connected_id_paths() -> Set[str]:
     """
     Get the ID_PATHs of all connected USB devices.
@@ -83,6 +144,28 @@ def _split_devpath(devpath):
     return (hub, port)
 
 
+def get_usb_hubs() -> Dict[str, str]:
+    """
+    Get the USB hub of all connected USB devices in one enumeration.
+
+    Returns:
+        The hub of each connected UID.
+    """
+    hubs = {}
+    context = Context()
+    for device in context.list_devices(subsystem="tty"):
+        parent = device.find_parent("usb", "usb_device")
+        if parent is None or not parent.get("DEVPATH"):
+            continue
+        uid = NmNode.calculate_uid(
+            parent.get("ID_MODEL_ID"),
+            parent.get("ID_VENDOR_ID"),
+            parent.get("ID_SERIAL_SHORT"),
+        )
+        hubs[uid] = _split_devpath(parent.get("DEVPATH"))[0]
+    return hubs
+
+
 def get_uid_from_id_path(id_path: str) -> str:
     """Get the UID of a connected USB device.
 
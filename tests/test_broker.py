@@ -0,0 +1,108 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from inet_nm.broker import BrokerClient, BrokerServer
+from inet_nm.filelock import FileLockTimeout
+
+
+@pytest.fixture
+def broker(tmp_path):
+    """Run a broker on a temporary socket and locks dir."""
+    locks = tmp_path / "locks"
+    locks.mkdir()
+    server = BrokerServer(tmp_path / "broker.sock", locks)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(broker, holder="test"):
+    return BrokerClient.connect(broker.socket_path, holder)
+
+
+def test_connect_without_broker(tmp_path):
+    """No client should be returned if no broker is listening."""
+    assert BrokerClient.connect(tmp_path / "missing.sock") is None
+
+
+def test_second_broker_refused(broker, tmp_path):
+    """A broker must not take over the socket of a running broker."""
+    with pytest.raises(OSError, match="already listening"):
+        BrokerServer(broker.socket_path, tmp_path / "locks")
+    client = _client(broker)
+    assert client is not None
+    client.close()
+
+
+def test_stale_socket_replaced(tmp_path):
+    """A socket left behind by a dead broker is taken over."""
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(tmp_path / "broker.sock"))
+    stale.close()
+    server = BrokerServer(tmp_path / "broker.sock", tmp_path)
+    server.server_close()
+
+
+def test_acquire_release(broker):
+    """Acquired nodes are persisted as lock files and visible in the query."""
+    with _client(broker) as client:
+        client.acquire(["a", "b"], timeout=1)
+        assert (broker.state.locks_dir / "a.lock").exists()
+        assert sorted(client.query()["held"]) == ["a", "b"]
+        client.release(["a"])
+        assert not (broker.state.locks_dir / "a.lock").exists()
+        assert sorted(client.query()["held"]) == ["b"]
+
+
+def test_acquire_timeout(broker):
+    """A second holder times out while the node is held."""
+    with _client(broker, "first") as first, _client(broker, "second") as second:
+        first.acquire(["a"], timeout=1)
+        with pytest.raises(FileLockTimeout):
+            second.acquire(["a"], timeout=0.1)
+        assert not second.wait(["a"], timeout=0.1)
+        first.release()
+        assert second.wait(["a"], timeout=1)
+        second.acquire(["a"], timeout=1)
+
+
+def test_disconnect_releases(broker):
+    """Closing a connection releases everything it held."""
+    client = _client(broker)
+    client.acquire(["a"], timeout=1)
+    client.close()
+    with _client(broker) as other:
+        other.acquire(["a"], timeout=1)
+        assert other.query()["held"]["a"]["holder"] == "test"
+
+
+def test_foreign_lock_files(broker):
+    """Lock files not created by the broker are respected."""
+    (broker.state.locks_dir / "a.lock").touch()
+    with _client(broker) as client:
+        assert client.query()["foreign"] == ["a"]
+        with pytest.raises(FileLockTimeout):
+            client.acquire(["a", "b"], timeout=0.1)
+        assert client.query()["held"] == {}
+
+
+def test_disconnect_while_waiting(broker):
+    """A client that disconnects while waiting must not block newer requests."""
+    with _client(broker, "first") as first, _client(broker, "third") as third:
+        first.acquire(["a"], timeout=1)
+        gone = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        gone.connect(str(broker.socket_path))
+        gone.sendall(b'{"op": "acquire", "holder": "gone", "uids": ["a", "b"]}\n')
+        deadline = time.time() + 2
+        while not third.query()["waiting"] and time.time() < deadline:
+            time.sleep(0.01)
+        assert third.query()["waiting"][0]["holder"] == "gone"
+        gone.close()
+        third.acquire(["b"], timeout=2)
+        assert third.query()["waiting"] == []
+        assert third.query()["held"]["b"]["holder"] == "third"
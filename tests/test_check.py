@@ -1,13 +1,15 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
+import inet_nm.config as cfg
 from inet_nm.check import (
     check_nodes,
     eval_features,
     filter_nodes,
     filter_used_nodes,
     get_all_features,
+    get_inventory_nodes,
     skip_duplicate_boards,
 )
 from inet_nm.data_types import NmNode
@@ -122,3 +124,62 @@ def test_eval_features(dummy_nodes):
     assert len(nodes) == 2
     assert nodes[0].serial == "2"
     assert nodes[1].serial == "3"
+
+
+@patch("inet_nm.check.get_locked_uids")
+@patch("inet_nm.check.get_connected_uids")
+def test_get_inventory_nodes(mock_connected, mock_locked, dummy_nodes, tmp_path):
+    """Ensure the inventory is classified with a single USB and lock scan."""
+    cfg.NodesConfig(tmp_path).save(dummy_nodes)
+    cfg.BoardInfoConfig(tmp_path).save({"board1": ["feature1"]})
+    mock_connected.return_value = [dummy_nodes[0].uid, dummy_nodes[1].uid]
+    mock_locked.return_value = [dummy_nodes[1].uid, dummy_nodes[2].uid]
+
+    available, used, missing, total = get_inventory_nodes(tmp_path)
+    assert [node.serial for node in available] == ["1"]
+    assert [node.serial for node in used] == ["2"]
+    assert [node.serial for node in missing] == ["4"]
+    assert len(total) == 4
+    assert mock_connected.call_count == 1
+    assert mock_locked.call_count == 1
+
+    available, used, missing, total = get_inventory_nodes(
+        tmp_path, feat_filter=["feature1"]
+    )
+    assert [node.serial for node in total] == ["1"]
+
+
+@patch("inet_nm.check.get_connected_uids")
+def test_check_nodes_skips_scans(mock_get_connected_uids, dummy_nodes):
+    """Ensure lock and USB lookups are skipped when they are not needed."""
+    locked = MagicMock(return_value=[])
+    nodes = check_nodes(dummy_nodes, uids=["unknown"], locked_nodes=locked)
+    assert nodes == []
+    nodes = check_nodes(dummy_nodes, all_nodes=True, boards=["board3"])
+    assert [node.serial for node in nodes] == ["3", "4"]
+    mock_get_connected_uids.assert_not_called()
+    locked.assert_not_called()
+
+
+def test_check_nodes_skip_dups_after_filters(dummy_nodes):
+    """Ensure skip dups picks from the nodes left by the other filters."""
+    dummy_nodes[2].ignore = True
+    nodes = check_nodes(dummy_nodes, all_nodes=True, skip_dups=True)
+    assert [node.serial for node in nodes] == ["1", "2", "4"]
+    dummy_nodes[2].ignore = False
+    nodes = check_nodes(
+        dummy_nodes, all_nodes=True, skip_dups=True, uids=[dummy_nodes[3].uid]
+    )
+    assert [node.serial for node in nodes] == ["4"]
+
+
+def test_check_nodes_invalid_eval_without_candidates(dummy_nodes):
+    """Ensure an invalid feature expression raises even if no node is left."""
+    with pytest.raises(ValueError):
+        check_nodes(dummy_nodes, all_nodes=True, boards=["none"], feat_eval="a and")
+    with pytest.raises(ValueError, match="feature9"):
+        check_nodes(dummy_nodes, all_nodes=True, boards=["none"], feat_eval="feature9")
+    nodes = check_nodes(
+        dummy_nodes, all_nodes=True, boards=["none"], feat_eval="feature1"
+    )
+    assert nodes == []
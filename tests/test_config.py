@@ -1,3 +1,6 @@
+import threading
+from unittest.mock import patch
+
 import pytest
 
 import inet_nm.config as cfg
@@ -55,3 +58,163 @@ def test_save_load_config(tmp_path, params):
         assert len(res) == 0
 
     assert isinstance(res, cfg_type._LOAD_TYPE)
+
+
+def test_nodes_config_cache(tmp_path):
+    """Test cached nodes are isolated and refreshed when a source changes."""
+    node = NmNode(
+        serial="1",
+        vendor_id="vendor_id1",
+        product_id="product1",
+        vendor="vendor1",
+        driver="driver1",
+        board="board1",
+    )
+    cfg.NodesConfig(tmp_path).save([node])
+    cfg.BoardInfoConfig(tmp_path).save({"board1": ["feature1"]})
+
+    nodes = cfg.NodesConfig(tmp_path).load()
+    assert nodes[0].features_provided == ["feature1"]
+    nodes[0].features_provided.append("mutated")
+    nodes[0].board = "mutated"
+    nodes = cfg.NodesConfig(tmp_path).load()
+    assert nodes[0].features_provided == ["feature1"]
+    assert nodes[0].board == "board1"
+
+    with open(tmp_path / "user_node_info.json", "w") as f:
+        f.write(f'{{"{node.uid}": ["user_feature"]}}')
+    nodes = cfg.NodesConfig(tmp_path).load()
+    assert nodes[0].features_provided == ["feature1", "user_feature"]
+
+
+def test_config_store_signature(tmp_path):
+    """Test the loader only runs again after the file changes."""
+    store = cfg.ConfigStore()
+    path = tmp_path / "file.json"
+    path.write_text("1")
+    calls = []
+
+    def _loader():
+        calls.append(1)
+        return path.read_text()
+
+    assert store.get("key", [path], _loader) == "1"
+    assert store.get("key", [path], _loader) == "1"
+    assert len(calls) == 1
+    path.write_text("22")
+    assert store.get("key", [path], _loader) == "22"
+    assert len(calls) == 2
+
+
+def test_nodes_config_snapshot(tmp_path):
+    """Test the merged nodes are loaded from the snapshot until a source changes."""
+    node = NmNode(
+        serial="1",
+        vendor_id="vendor_id1",
+        product_id="product1",
+        vendor="vendor1",
+        driver="driver1",
+        board="board1",
+    )
+    nodes_cfg = cfg.NodesConfig(tmp_path)
+    nodes_cfg.save([node])
+    cfg.BoardInfoConfig(tmp_path).save({"board1": ["feature1"]})
+    assert nodes_cfg.load()[0].features_provided == ["feature1"]
+    assert nodes_cfg.snapshot_path.exists()
+
+    cfg.CONFIG_STORE.invalidate()
+    with patch.object(cfg.NodesConfig, "_load_merged") as mock_merge:
+        assert nodes_cfg.load()[0].features_provided == ["feature1"]
+        mock_merge.assert_not_called()
+
+    cfg.CONFIG_STORE.invalidate()
+    cfg.BoardInfoConfig(tmp_path).save({"board1": ["feature1", "feature2"]})
+    assert nodes_cfg.load()[0].features_provided == ["feature1", "feature2"]
+
+
+def _journal_node(serial):
+    return NmNode(
+        serial=serial,
+        vendor_id="vendor_id",
+        product_id="product_id",
+        vendor="vendor",
+        driver="driver",
+        board="board",
+    )
+
+
+def test_nodes_config_journal(tmp_path):
+    """Test single node updates are journaled, replayed and compacted."""
+    nodes_cfg = cfg.NodesConfig(tmp_path)
+    nodes_cfg.save([_journal_node("1"), _journal_node("2")])
+    nodes_cfg.update_node(_journal_node("3"))
+    nodes_cfg.remove_node(_journal_node("1"))
+    assert nodes_cfg.journal_path.exists()
+    assert [node.serial for node in nodes_cfg.load()] == ["2", "3"]
+
+    # A torn append must not break readers
+    with nodes_cfg.journal_path.open("a") as f:
+        f.write('{"op": "upsert", "no')
+    cfg.CONFIG_STORE.invalidate()
+    assert [node.serial for node in nodes_cfg.load()] == ["2", "3"]
+
+    nodes_cfg.compact()
+    assert not nodes_cfg.journal_path.exists()
+    assert [node.serial for node in nodes_cfg.load()] == ["2", "3"]
+    assert [f.name for f in tmp_path.iterdir() if f.name.endswith(".tmp")] == []
+
+
+def test_nodes_config_journal_after_torn_line(tmp_path):
+    """Test an update after a torn append is not lost."""
+    nodes_cfg = cfg.NodesConfig(tmp_path)
+    nodes_cfg.save([_journal_node("1")])
+    nodes_cfg.update_node(_journal_node("2"))
+    with nodes_cfg.journal_path.open("a") as f:
+        f.write('{"op": "upsert", "no')
+    nodes_cfg.update_node(_journal_node("3"))
+    cfg.CONFIG_STORE.invalidate()
+    assert [node.serial for node in nodes_cfg.load()] == ["1", "2", "3"]
+    assert nodes_cfg.journal_path.read_text().count("\n") == 2
+
+
+def test_nodes_config_concurrent_updates(tmp_path):
+    """Test concurrent writers do not lose updates."""
+    nodes_cfg = cfg.NodesConfig(tmp_path)
+
+    def _add(start):
+        for i in range(start, start + 10):
+            cfg.NodesConfig(tmp_path).update_node(_journal_node(str(i)))
+
+    threads = [threading.Thread(target=_add, args=(i * 10,)) for i in range(4)]
+    # Force compactions while other threads append
+    with patch.object(cfg.NodesConfig, "JOURNAL_COMPACT_SIZE", 512):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    nodes_cfg.compact()
+    assert sorted(int(node.serial) for node in nodes_cfg.load()) == list(range(40))
+
+
+def test_nodes_config_compaction_while_reading(tmp_path):
+    """Test a compaction between reading the journal and nodes.json."""
+    nodes_cfg = cfg.NodesConfig(tmp_path)
+    nodes_cfg.save([_journal_node("1")])
+    nodes_cfg.update_node(_journal_node("2"))
+    read_journal = cfg.NodesConfig._read_journal
+    calls = []
+
+    def _read_then_compact(self):
+        entries = read_journal(self)
+        calls.append(entries)
+        if len(calls) == 1:
+            # Another process removes the node and compacts the journal
+            writer = cfg.NodesConfig(tmp_path)
+            writer.remove_node(_journal_node("2"))
+            writer.compact()
+        return entries
+
+    cfg.CONFIG_STORE.invalidate()
+    with patch.object(cfg.NodesConfig, "_read_journal", _read_then_compact):
+        assert [node.serial for node in nodes_cfg.load()] == ["1"]
+    assert calls[-1] == []
@@ -0,0 +1,120 @@
+import json
+import sqlite3
+
+import pytest
+
+import inet_nm.config as cfg
+from inet_nm.config_sqlite import DB_FILENAME, SqliteBackend
+from inet_nm.data_types import EnvConfigFormat, NmNode
+
+
+def _node(serial, board):
+    return NmNode(
+        serial=serial,
+        vendor_id="vendor_id",
+        product_id="product_id",
+        vendor="vendor",
+        driver="driver",
+        board=board,
+    )
+
+
+@pytest.fixture
+def json_config(tmp_path):
+    """Create a JSON config dir with nodes, board info and user overlays."""
+    nodes = [_node("1", "board1"), _node("2", "board2"), _node("3", "board1")]
+    cfg.NodesConfig(tmp_path).save(nodes)
+    cfg.BoardInfoConfig(tmp_path).save(
+        {"board1": ["feature1", "feature2"], "board2": ["feature2"]}
+    )
+    with open(tmp_path / "user_board_info.json", "w") as f:
+        json.dump({"board2": ["user_feature"]}, f)
+    with open(tmp_path / "user_node_info.json", "w") as f:
+        json.dump({nodes[2].uid: ["node_feature"]}, f)
+    cfg.LocationConfig(tmp_path).save({"1-1": {"name": "1.1.1"}})
+    cfg.LocationCache(tmp_path).save(
+        [{"id_path": "1-1", "node_uid": nodes[0].uid, "state": "attached"}]
+    )
+    return tmp_path
+
+
+def test_migrate_from_json(json_config):
+    """Test all config classes load the same data after migration."""
+    classes = [
+        cfg.NodesConfig,
+        cfg.BoardInfoConfig,
+        cfg.EnvConfig,
+        cfg.LocationConfig,
+        cfg.LocationCache,
+    ]
+    expected = [cls(json_config).load() for cls in classes]
+
+    SqliteBackend(json_config / DB_FILENAME).migrate_from_json(json_config)
+    (json_config / "nodes.json").unlink()
+
+    for cls, data in zip(classes, expected):
+        inst = cls(json_config)
+        assert inst.backend is not None
+        assert inst.load() == data
+
+
+def test_query_pushdown(json_config):
+    """Test the filters are applied by the database."""
+    SqliteBackend(json_config / DB_FILENAME).migrate_from_json(json_config)
+    nodes_cfg = cfg.NodesConfig(json_config)
+
+    nodes = nodes_cfg.query(boards=["board1"])
+    assert [node.serial for node in nodes] == ["1", "3"]
+    nodes = nodes_cfg.query(feat_filter=["feature2", "node_feature"])
+    assert [node.serial for node in nodes] == ["3"]
+    assert nodes[0].features_provided == ["feature1", "feature2", "node_feature"]
+    nodes = nodes_cfg.query(feat_filter=["user_feature"])
+    assert [node.serial for node in nodes] == ["2"]
+    nodes = nodes_cfg.query(uids=[_node("2", "board2").uid], feat_filter=["feature1"])
+    assert nodes == []
+
+
+def test_query_many_values(json_config, monkeypatch):
+    """Test large selections do not hit the variable limit of old SQLite."""
+    SqliteBackend(json_config / DB_FILENAME).migrate_from_json(json_config)
+    connect = SqliteBackend._connect
+
+    def _connect_999(self):
+        conn = connect(self)
+        if hasattr(conn, "setlimit"):
+            conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        return conn
+
+    monkeypatch.setattr(SqliteBackend, "_connect", _connect_999)
+    uids = [f"uid{i}" for i in range(2000)] + [_node("2", "board2").uid]
+    boards = [f"board{i}" for i in range(2000)]
+    nodes = cfg.NodesConfig(json_config).query(boards=boards, uids=uids)
+    assert [node.serial for node in nodes] == ["2"]
+
+
+def test_update_single_node(json_config):
+    """Test single nodes are updated in place and appended."""
+    SqliteBackend(json_config / DB_FILENAME).migrate_from_json(json_config)
+    nodes_cfg = cfg.NodesConfig(json_config)
+
+    node = _node("2", "board1")
+    nodes_cfg.update_node(node)
+    nodes_cfg.update_node(_node("4", "board2"))
+    nodes = nodes_cfg.load()
+    assert [node.serial for node in nodes] == ["1", "2", "3", "4"]
+    assert nodes[1].board == "board1"
+
+    nodes_cfg.remove_node(node)
+    assert [node.serial for node in nodes_cfg.load()] == ["1", "3", "4"]
+
+
+def test_save_load_documents(tmp_path):
+    """Test whole document configs round trip through the database."""
+    SqliteBackend(tmp_path / DB_FILENAME).create()
+    env = EnvConfigFormat(shared={"a": "1"}, nodes={"uid": {"b": "2"}}, patterns=[])
+    env_cfg = cfg.EnvConfig(tmp_path)
+    assert not env_cfg.check_file()
+    env_cfg.save(env)
+    assert env_cfg.check_file()
+    assert env_cfg.load() == env
+    assert not (tmp_path / "env.json").exists()
@@ -0,0 +1,72 @@
+import pytest
+
+from inet_nm.check import eval_features
+from inet_nm.data_types import NmNode
+from inet_nm.feature_expr import compile_feature_expr
+from inet_nm.node_index import NodeIndex
+
+
+def _node(serial, features):
+    return NmNode(
+        serial=serial,
+        vendor_id="vendor_id",
+        product_id="product_id",
+        vendor="vendor",
+        driver="driver",
+        board="board",
+        features_provided=features,
+    )
+
+
+@pytest.fixture
+def index():
+    """Return an index over nodes with a few feature combinations."""
+    return NodeIndex(
+        [
+            _node("1", ["feature1", "feature2"]),
+            _node("2", ["feature1"]),
+            _node("3", ["feature2", "feature3"]),
+            _node("4", []),
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    "expr, expected",
+    [
+        ("feature1", 0b0011),
+        ("not feature1", 0b1100),
+        ("feature1 and feature2", 0b0001),
+        ("feature1 or feature3", 0b0111),
+        ("(feature3 and feature2) or (feature1 and not feature2)", 0b0110),
+        ("not (feature1 or feature2 or feature3)", 0b1000),
+        ("True", 0b1111),
+        ("feature1 and False", 0),
+    ],
+)
+def test_mask(index, expr, expected):
+    """Test expressions evaluate to the expected node masks."""
+    assert compile_feature_expr(expr).mask(index) == expected
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "__import__('os').system('true')",
+        "feature1 + feature2",
+        "feature1 == feature2",
+        "feature1.real",
+        "feature1 and",
+        "1",
+    ],
+)
+def test_rejected(expr):
+    """Test anything other than boolean feature expressions is rejected."""
+    with pytest.raises(ValueError):
+        compile_feature_expr(expr)
+
+
+def test_unknown_features(index):
+    """Test unknown feature names give a clear error."""
+    with pytest.raises(ValueError, match="feature9"):
+        eval_features(index.nodes, set(index.features), "feature1 or feature9")
@@ -0,0 +1,64 @@
+import pytest
+
+import inet_nm.feature_matrix as fm
+from inet_nm.data_types import NmNode
+from inet_nm.feature_expr import compile_feature_expr
+
+
+def _node(serial, board, features):
+    return NmNode(
+        serial=serial,
+        vendor_id="vendor_id",
+        product_id="product_id",
+        vendor="vendor",
+        driver="driver",
+        board=board,
+        features_provided=features,
+    )
+
+
+@pytest.fixture
+def nodes():
+    """Return nodes with shared boards and features."""
+    return [
+        _node("1", "board1", ["feature1", "feature2"]),
+        _node("2", "board2", ["feature1"]),
+        _node("3", "board1", ["feature2", "feature3"]),
+        _node("4", "board1", ["feature1"]),
+    ]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "bitset"])
+def use_numpy(request):
+    """Run with both matrix implementations."""
+    if request.param and fm.np is None:
+        pytest.skip("numpy not installed")
+    return request.param
+
+
+def _serials(matrix, mask):
+    return [node.serial for node in matrix.select(mask)]
+
+
+def test_filters(nodes, use_numpy):
+    """Test conjunctions and compiled expressions select the same nodes."""
+    matrix = fm.FeatureMatrix(nodes, use_numpy=use_numpy)
+    assert _serials(matrix, matrix.with_features(["feature1"])) == ["1", "2", "4"]
+    assert _serials(matrix, matrix.with_features(["feature1", "feature2"])) == ["1"]
+    assert _serials(matrix, matrix.with_features(["unknown"])) == []
+    expr = compile_feature_expr("(feature3 and feature2) or not feature2")
+    assert _serials(matrix, matrix.evaluate(expr)) == ["2", "3", "4"]
+    assert _serials(matrix, matrix.all) == ["1", "2", "3", "4"]
+
+
+def test_reductions(nodes, use_numpy):
+    """Test the per feature counts."""
+    matrix = fm.FeatureMatrix(nodes, use_numpy=use_numpy)
+    assert matrix.all_features() == ["feature1", "feature2", "feature3"]
+    assert matrix.feature_counts() == {"feature1": 3, "feature2": 2, "feature3": 1}
+    assert matrix.boards_per_feature() == {
+        "feature1": 2,
+        "feature2": 1,
+        "feature3": 1,
+    }
+    assert matrix.coverage()["feature1"] == 0.75
@@ -1,8 +1,11 @@
+import glob
+import os
 import random
+import threading
 
 import pytest
 
-from inet_nm.filelock import FileLock, FileLockTimeout
+from inet_nm.filelock import FileLock, FileLockTimeout, read_lock_info
 
 
 def test_filelock(tmpdir):
@@ -17,3 +20,29 @@ def test_filelock(tmpdir):
 
     lock = FileLock(str(lock_file), timeout=1)
     assert not lock.is_locked
+
+
+def test_filelock_metadata(tmpdir):
+    """The lock file holds the holder and wait time, waiters leave a marker."""
+    lock_file = str(tmpdir.join("meta.lock"))
+    with FileLock(lock_file, holder="first"):
+        info = read_lock_info(lock_file)
+        assert info["holder"] == "first"
+        assert info["wait"] >= 0
+
+        waiter = FileLock(lock_file, timeout=0.2, holder="second")
+        with pytest.raises(FileLockTimeout):
+            waiter.acquire()
+        assert not os.path.exists(waiter.wait_marker)
+
+        markers = []
+        thread = threading.Thread(target=waiter.acquire, kwargs={"timeout": 5})
+        thread.start()
+        while not markers:
+            markers = glob.glob(lock_file + ".*.wait")
+        assert read_lock_info(markers[0])["holder"] == "second"
+    thread.join()
+    assert read_lock_info(lock_file)["holder"] == "second"
+    assert waiter.wait_time > 0
+    assert not glob.glob(lock_file + ".*.wait")
+    waiter.release()
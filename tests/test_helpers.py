@@ -3,7 +3,9 @@ from unittest.mock import patch
 import pytest
 
 from inet_nm._helpers import (
+    JsonStreamExtractor,
     inquirer,
+    nm_extract_valid_jsons,
     nm_prompt_choice,
     nm_prompt_confirm,
     nm_prompt_input,
@@ -63,3 +65,41 @@ def test_nm_prompt_confirm():
         assert nm_prompt_confirm("Confirm") is True
     with patch("inquirer.prompt", return_value={"res": False}):
         assert nm_prompt_confirm("Confirm") is False
+
+
+STREAM = (
+    'boot {log} "{" \n{"a": {"b": [1, 2]}, "s": "}{"}\n'
+    'x{"t": true, "f": false, "n": null, "u": "\u00e4"}y'
+)
+STREAM_OBJECTS = [
+    {"a": {"b": [1, 2]}, "s": "}{"},
+    {"t": True, "f": False, "n": None, "u": "\u00e4"},
+]
+
+
+def test_nm_extract_valid_jsons_strings():
+    """Braces in strings and stray braces in the text are handled."""
+    assert nm_extract_valid_jsons(STREAM) == STREAM_OBJECTS
+
+
+@pytest.mark.parametrize("split", range(len(STREAM.encode())))
+def test_json_stream_extractor_chunks(split):
+    """Objects are found wherever the stream is split."""
+    data = STREAM.encode()
+    extractor = JsonStreamExtractor()
+    objects = extractor.feed(data[:split]) + extractor.feed(data[split:])
+    assert objects == STREAM_OBJECTS
+
+
+def test_json_stream_extractor_bounded():
+    """Incomplete objects beyond the limit are dropped."""
+    extractor = JsonStreamExtractor(max_pending=100)
+    assert extractor.feed('{"big": "' + "x" * 50) == []
+    assert extractor.feed("x" * 100) == []
+    assert extractor.feed('"} {"ok": 1}') == [{"ok": 1}]
+    assert len(extractor._pending) == 0
+
+    extractor = JsonStreamExtractor()
+    assert extractor.feed("log " * 100000 + '{"a": 1') == []
+    assert len(extractor._pending) == len('{"a": 1')
+    assert extractor.feed("}") == [{"a": 1}]
@@ -0,0 +1,129 @@
+import pytest
+
+from inet_nm.history import InventoryHistory, parse_since
+
+
+@pytest.fixture
+def history(tmp_path):
+    """Return a history with a few recorded inventories."""
+    boards = {"a": "board1", "b": "board1", "c": "board2"}
+    hist = InventoryHistory(tmp_path)
+    hist.record({"a": "available", "b": "available", "c": "missing"}, boards, ts=10)
+    hist.record({"a": "used", "b": "available", "c": "missing"}, boards, ts=20)
+    hist.record({"a": "available", "b": "missing", "c": "available"}, boards, ts=30)
+    return hist
+
+
+def test_record_transitions_only(history):
+    """Only state changes are appended."""
+    lines = history.file_path.read_text().splitlines()
+    assert len(lines) == 3 + 1 + 3
+    assert history.record({"a": "available"}, {"a": "board1"}, ts=40) == []
+    assert len(history.transitions(uid="a")) == 3
+    assert [t["uid"] for t in history.transitions(board="board2")] == ["c", "c"]
+
+
+def test_states_at(history):
+    """The state at any point in time is found."""
+    assert history.state_at("a", 5) is None
+    assert history.state_at("a", 10) == "available"
+    assert history.state_at("a", 25) == "used"
+    assert history.states_at(25) == {
+        "a": "used",
+        "b": "available",
+        "c": "missing",
+    }
+    assert history.states_at()["b"] == "missing"
+
+
+def test_diff(history):
+    """Diffs only contain nodes whose state differs between the points."""
+    assert history.diff(15, 25) == {"a": ("available", "used")}
+    assert history.diff(15) == {
+        "b": ("available", "missing"),
+        "c": ("missing", "available"),
+    }
+    assert history.board_changes(15) == {
+        "board1_missing": 1,
+        "board1_available": -1,
+        "board2_available": 1,
+        "board2_missing": -1,
+    }
+    assert history.board_changes(15, uids=["c"]) == {
+        "board2_available": 1,
+        "board2_missing": -1,
+    }
+
+
+def test_reload(history, tmp_path):
+    """A new instance reads the same history and skips torn lines."""
+    with open(history.file_path, "a") as file:
+        file.write('{"ts": 40, "uid": "a"')
+    other = InventoryHistory(tmp_path)
+    assert other.states_at() == history.states_at()
+    assert other.diff(0) == history.diff(0)
+
+
+def test_since_starts_at_snapshot(tmp_path, monkeypatch):
+    """Reading since a point in time starts at the last snapshot before it."""
+    monkeypatch.setattr(InventoryHistory, "SNAPSHOT_BYTES", 1)
+    boards = {"a": "board1", "b": "board2"}
+    full = InventoryHistory(tmp_path)
+    for ts, state in enumerate(["available", "used", "missing", "available"]):
+        full.record({"a": state, "b": "available"}, boards, ts=ts * 10)
+    recent = InventoryHistory(tmp_path, since=25)
+    assert len(recent.transitions()) == 1
+    assert recent.diff(25) == full.diff(25)
+    assert recent.board_changes(25) == full.board_changes(25)
+    assert recent.states_at() == full.states_at()
+    assert recent.state_at("b", 25) == "available"
+    recent.record({"a": "used", "b": "missing"}, boards, ts=40)
+    assert InventoryHistory(tmp_path).states_at() == {"a": "used", "b": "missing"}
+
+
+def test_default_starts_at_last_snapshot(tmp_path, monkeypatch):
+    """Without since only the lines from the last snapshot on are read."""
+    boards = {"a": "board1", "b": "board2"}
+    writer = InventoryHistory(tmp_path)
+    for ts in range(10):
+        writer.record({"a": ["available", "used"][ts % 2]}, boards, ts=ts)
+    monkeypatch.setattr(InventoryHistory, "SNAPSHOT_BYTES", 1)
+    writer.record({"a": "missing", "b": "available"}, boards, ts=10)
+    monkeypatch.setattr(InventoryHistory, "SNAPSHOT_BYTES", 1 << 20)
+    writer.record({"a": "used", "b": "available"}, boards, ts=11)
+    latest = InventoryHistory(tmp_path)
+    assert [t["ts"] for t in latest.transitions()] == [11]
+    assert latest.states_at() == {"a": "used", "b": "available"}
+    assert latest.states_at() == writer.states_at()
+    everything = InventoryHistory(tmp_path, since=float("-inf"))
+    assert len(everything.transitions()) == 13
+
+
+def test_compaction(tmp_path, monkeypatch):
+    """The older half of a large history is folded into a snapshot."""
+    boards = {"a": "board1"}
+    hist = InventoryHistory(tmp_path)
+    other = InventoryHistory(tmp_path)
+    for ts in range(20):
+        hist.record({"a": ["available", "used"][ts % 2]}, boards, ts=ts)
+    size = hist.file_path.stat().st_size
+    monkeypatch.setattr(InventoryHistory, "MAX_BYTES", size)
+    hist.record({"a": "missing"}, boards, ts=20)
+    assert hist.file_path.stat().st_size < size
+    assert len(hist.transitions()) == 10
+    assert hist.state_at("a", 5) is None
+    assert hist.state_at("a", 10) == "available"
+    assert hist.states_at() == {"a": "missing"}
+    other._refresh()
+    assert other.transitions() == hist.transitions()
+    assert other.state_at("a", 15) == "used"
+
+
+def test_parse_since():
+    """Durations, epoch seconds and ISO dates are parsed."""
+    assert parse_since("90s", now=100) == 10
+    assert parse_since("2h", now=10000) == 10000 - 7200
+    assert parse_since("1234.5") == 1234.5
+    assert parse_since("2024-01-01T00:00:00+00:00") == 1704067200
+    with pytest.raises(ValueError):
+        parse_since("yesterday")
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import select
+import subprocess
+import sys
+
+import pytest
+
+import inet_nm.config as cfg
+from inet_nm.cli_fake_usb import _save_fake_devices, add_board
+from inet_nm.data_types import NmNode
+from inet_nm.locking import locks_dir
+
+
+def _readline(proc, timeout=10):
+    ready, _, _ = select.select([proc.stdout], [], [], timeout)
+    assert ready, "no update from watch"
+    return json.loads(proc.stdout.readline())
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="does not run on windows")
+def test_watch_json_deltas(tmp_path, monkeypatch):
+    """Watch mode emits a line per changed board on USB and lock changes."""
+    fake_path = tmp_path / "fake_usb.json"
+    fake_path.write_text("{}")
+    monkeypatch.setenv("INET_NM_FAKE_USB_PATH", str(fake_path))
+    dev_id = f"watch-{os.getpid()}"
+    hex_hash = hashlib.md5(dev_id.encode()).hexdigest()
+    node = NmNode(
+        serial=hex_hash[8:16],
+        vendor_id=hex_hash[0:4],
+        product_id=hex_hash[5:8],
+        vendor="vendor",
+        driver="driver",
+        board="board1",
+    )
+    cfg.NodesConfig(tmp_path).save([node])
+    lock_path = locks_dir() / f"{node.uid}.lock"
+
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "inet_nm.cli_inventory",
+            "-c",
+            str(tmp_path),
+            "--watch",
+            "--json",
+            "--interval",
+            "0.1",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert _readline(proc)["missing"] == 1
+        _save_fake_devices(add_board(id=dev_id))
+        row = _readline(proc)
+        assert (row["board"], row["available"], row["missing"]) == ("board1", 1, 0)
+        lock_path.touch()
+        row = _readline(proc)
+        assert (row["available"], row["used"]) == (0, 1)
+    finally:
+        proc.terminate()
+        proc.wait()
+        if lock_path.exists():
+            lock_path.unlink()
+    assert (tmp_path / "inventory_history.ndjson").exists()
@@ -0,0 +1,218 @@
+import pytest
+
+from inet_nm.config import JobDurationsConfig
+from inet_nm.data_types import NmJob, NmNode
+from inet_nm.job_queue import JobQueue, estimate_duration, load_jobs
+from inet_nm.node_index import NodeIndex
+from inet_nm.runner_apps import NmJobRunner, NmShellRunner
+
+
+def _node(serial, board, features=None):
+    return NmNode(
+        serial=serial,
+        vendor="vendor",
+        product_id="product",
+        vendor_id="vendor_id",
+        model="model",
+        driver="driver",
+        board=board,
+        features_provided=features or [],
+    )
+
+
+@pytest.fixture
+def nodes():
+    return [
+        _node("jq1", "board1", ["uart"]),
+        _node("jq2", "board1", ["uart", "radio"]),
+        _node("jq3", "board2", ["radio"]),
+    ]
+
+
+def test_load_jobs():
+    """Plain commands and JSON jobs are parsed, comments skipped."""
+    jobs = load_jobs(
+        [
+            "# comment",
+            "make test",
+            "",
+            '{"cmd": "make flash", "name": "flash", "boards": ["board1"]}',
+            '{"cmd": "true", "feat_eval": "uart and not radio"}',
+        ]
+    )
+    assert [job.name for job in jobs] == ["line2", "flash", "line5"]
+    assert jobs[0] == NmJob(cmd="make test", name="line2")
+    assert jobs[1].boards == ["board1"]
+    assert jobs[2].feat_eval == "uart and not radio"
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "{not json",
+        '{"name": "no cmd"}',
+        '{"cmd": "true", "board": "typo"}',
+        '{"cmd": "true", "feat_eval": "uart +"}',
+    ],
+)
+def test_load_jobs_invalid(line):
+    with pytest.raises(ValueError, match="Line 1"):
+        load_jobs([line])
+
+
+def test_job_queue_dispatch(nodes):
+    """Nodes take the oldest job they can run."""
+    jobs = [
+        NmJob(cmd="a", name="any"),
+        NmJob(cmd="b", name="board2", boards=["board2"]),
+        NmJob(cmd="c", name="radio", features=["radio"]),
+        NmJob(cmd="d", name="uart_only", feat_eval="uart and not radio"),
+        NmJob(cmd="e", name="none", boards=["board3"]),
+    ]
+    queue = JobQueue(jobs, NodeIndex(nodes))
+    assert [job.name for _, job in queue.unrunnable] == ["none"]
+    assert len(queue) == 4
+    assert queue.take(2)[1].name == "any"
+    assert queue.take(1)[1].name == "radio"
+    assert queue.take(1) is None
+    assert queue.take(0)[1].name == "uart_only"
+    assert queue.take(2)[1].name == "board2"
+    assert len(queue) == 0
+
+
+def test_job_queue_drain(nodes):
+    """Left jobs are drained in order of the job list."""
+    jobs = [NmJob(cmd=cmd, name=cmd, boards=["board1"]) for cmd in "abc"]
+    jobs.insert(1, NmJob(cmd="d", name="d", boards=["board2"]))
+    queue = JobQueue(jobs, NodeIndex(nodes))
+    assert queue.take(0)[1].name == "a"
+    assert [pos for pos, _ in queue.drain()] == [1, 2, 3]
+    assert len(queue) == 0
+    assert queue.take(0) is None
+
+
+def test_estimate_duration():
+    """The slowest eligible board wins, unknown boards use the mean."""
+    durations = {"board1": {"a": [10.0, 3]}, "board2": {"a": [30.0, 1]}}
+    job = NmJob(cmd="a", name="a")
+    assert estimate_duration(job, ["board1", "board2"], durations) == 30.0
+    assert estimate_duration(job, ["board1"], durations) == 10.0
+    assert estimate_duration(job, ["board3"], durations) == 20.0
+    assert estimate_duration(NmJob(cmd="b", name="b"), ["board1"], durations, 5) == 5
+
+
+def test_job_queue_longest_first(nodes):
+    """With durations the longest expected job is taken first."""
+    durations = {"board1": {"short": [1.0, 1], "long": [60.0, 1], "mid": [5.0, 1]}}
+    jobs = [
+        NmJob(cmd="short", name="short"),
+        NmJob(cmd="mid", name="mid"),
+        NmJob(cmd="new", name="new"),
+        NmJob(cmd="long", name="long"),
+    ]
+    queue = JobQueue(jobs, NodeIndex(nodes), durations)
+    taken = [queue.take(0) for _ in range(4)]
+    assert [job.name for _, job in taken] == ["long", "mid", "new", "short"]
+    assert [pos for pos, _ in taken] == [3, 1, 2, 0]
+
+
+def test_job_durations_record(tmp_path):
+    """Durations are averaged per board and command."""
+    store = JobDurationsConfig(tmp_path)
+    store.record([("board1", "make", 10.0), ("board1", "make", 20.0)])
+    store.record([("board2", "make", 4.0)])
+    data = store.load()
+    assert data["board1"]["make"] == [15.0, 2]
+    assert data["board2"]["make"] == [4.0, 1]
+    for _ in range(20):
+        store.record([("board2", "make", 8.0)])
+    assert store.load()["board2"]["make"][0] == pytest.approx(8.0, abs=0.01)
+
+
+def test_job_runner_records_durations(nodes, tmp_path):
+    """Successful jobs are recorded, failed ones are not."""
+    store = JobDurationsConfig(tmp_path)
+    with NmJobRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.durations = store
+        runner.job_list = [
+            NmJob(cmd="true", name="ok", boards=["board2"]),
+            NmJob(cmd="exit 1", name="fail", boards=["board1"]),
+        ]
+        runner.run()
+    data = store.load()
+    assert list(data) == ["board2"]
+    assert data["board2"]["true"][1] == 1
+
+
+def test_shell_runner_records_no_durations(nodes, tmp_path):
+    """Plain commands and builds stay out of the durations."""
+    store = JobDurationsConfig(tmp_path)
+    with NmShellRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.durations = store
+        runner.build_cmd = "true"
+        runner.cmd = "true"
+        runner.run()
+    assert not store.file_path.exists()
+    with NmJobRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.durations = store
+        runner.build_cmd = "true"
+        runner.job_list = [NmJob(cmd="echo job", name="job")]
+        runner.run()
+    assert [list(cmds) for cmds in store.load().values()] == [["echo job"]]
+
+
+def test_job_runner(nodes, capsys):
+    """Every runnable job runs exactly once on a matching node."""
+    job_list = [NmJob(cmd="echo $NM_JOB $NM_BOARD", name=f"job{i}") for i in range(6)]
+    job_list.append(NmJob(cmd="echo $NM_JOB $NM_BOARD", name="b2", boards=["board2"]))
+    job_list.append(NmJob(cmd="exit 1", name="fail", boards=["board1"]))
+    job_list.append(NmJob(cmd="true", name="never", features=["usb"]))
+    with NmJobRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.job_list = job_list
+        runner.run()
+    out = capsys.readouterr().out
+    for i in range(6):
+        assert out.count(f": job{i} board") == 1
+    assert "JOB:b2:NODE:2:BOARD:board2: b2 board2" in out
+    assert "JOB:fail:NODE:" in out
+    assert "UNRUNNABLE:JOB:never: no matching node" in out
+    assert sum(runner.exit_status.values()) == 1
+
+
+def test_job_runner_pipeline(nodes):
+    """Jobs of boards whose build failed end up unrunnable."""
+    with NmJobRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.build_cmd = "test $NM_BOARD = board1"
+        runner.pipeline = True
+        runner.job_list = [
+            NmJob(cmd="true", name="any"),
+            NmJob(cmd="true", name="b2", boards=["board2"]),
+        ]
+        runner.run()
+    assert [job.name for job in runner.unrunnable] == ["b2"]
+    assert any("RESULT:JOB:any:NODE:" in result for result in runner.results)
+    assert runner.exit_status[2] == "build_failed"
+
+
+def test_job_runner_json(nodes):
+    """JSON results carry the job name."""
+    with NmJobRunner(nodes, jobs=1) as runner:
+        runner.results = []
+        runner.json_filter = True
+        runner.job_list = [
+            NmJob(cmd='echo {\\"a\\": 1}', name="one"),
+            NmJob(cmd="true", name="never", boards=["board3"]),
+        ]
+        runner.run()
+    assert runner.results[0]["job"] == "one"
+    assert runner.results[0]["data"] == [{"a": 1}]
+    assert runner.results[1] == {
+        "job": "never",
+        "result": None,
+        "error": "no matching node",
+    }
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import time
+from unittest.mock import patch
+
+import pytest
+
+import inet_nm.config as cfg
+from inet_nm.data_types import NmNode
+from inet_nm.filelock import FileLock
+from inet_nm.metrics import LabMetrics
+
+
+def _node(serial, board):
+    return NmNode(
+        serial=serial,
+        vendor_id="vendor_id",
+        product_id="product_id",
+        vendor="vendor",
+        driver="driver",
+        board=board,
+    )
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    """Return metrics over three nodes with a private locks dir."""
+    nodes = [_node("1", "board1"), _node("2", "board1"), _node("3", "board2")]
+    cfg.NodesConfig(tmp_path).save(nodes)
+    locks = tmp_path / "locks"
+    locks.mkdir()
+    lab = LabMetrics(tmp_path, locks)
+    with patch("inet_nm.metrics.get_connected_uids") as connected:
+        connected.return_value = [nodes[0].uid, nodes[1].uid]
+        lab.scan_usb()
+    lab.update()
+    lab.test_nodes = nodes
+    return lab
+
+
+def _values(text):
+    values = {}
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+def test_node_states(metrics):
+    """Connected and locked nodes are counted per board and state."""
+    lock = FileLock(str(metrics.locks_dir / f"{metrics.test_nodes[0].uid}.lock"))
+    lock.acquire()
+    metrics.update()
+    values = _values(metrics.render())
+    assert values['inet_nm_nodes{board="board1",state="used"}'] == 1
+    assert values['inet_nm_nodes{board="board1",state="available"}'] == 1
+    assert values['inet_nm_nodes{board="board2",state="missing"}'] == 1
+    assert values["inet_nm_usb_enumeration_seconds_count"] == 1
+    assert values['inet_nm_lock_wait_seconds_count{board="board1"}'] == 1
+    lock.release()
+
+
+def test_lock_lifecycle(metrics):
+    """Hold times are observed when lock files vanish, waiters are counted."""
+    lock_path = metrics.locks_dir / f"{metrics.test_nodes[2].uid}.lock"
+    lock = FileLock(str(lock_path))
+    lock.acquire()
+    metrics.update()
+    (metrics.locks_dir / f"{lock_path.name}.{os.getpid()}.abc.wait").touch()
+    metrics.update()
+    values = _values(metrics.render())
+    assert values['inet_nm_lock_waiters{board="board2"}'] == 1
+    time.sleep(0.01)
+    lock.release()
+    metrics.update()
+    values = _values(metrics.render())
+    assert values['inet_nm_lock_hold_seconds_count{board="board2"}'] == 1
+    assert values['inet_nm_lock_hold_seconds_sum{board="board2"}'] > 0
+    assert values['inet_nm_nodes{board="board2",state="missing"}'] == 1
+
+
+def test_stale_wait_marker(metrics):
+    """Markers of waiters that are gone are ignored and removed."""
+    proc = subprocess.Popen(["true"])
+    proc.wait()
+    uid = metrics.test_nodes[0].uid
+    marker = metrics.locks_dir / f"{uid}.lock.{proc.pid}.abc.wait"
+    marker.write_text(json.dumps({"since": 0, "pid": proc.pid}))
+    live = metrics.locks_dir / f"{uid}.lock.{os.getpid()}.abc.wait"
+    live.write_text(json.dumps({"since": 0, "pid": os.getpid()}))
+    metrics.update()
+    values = _values(metrics.render())
+    assert values['inet_nm_lock_waiters{board="board1"}'] == 1
+    assert not marker.exists()
+    live.unlink()
+
+
+def test_waiter_killed_after_scan(metrics):
+    """A waiter that dies after the scan no longer counts on scrape."""
+    proc = subprocess.Popen(["sleep", "30"])
+    uid = metrics.test_nodes[0].uid
+    marker = metrics.locks_dir / f"{uid}.lock.{proc.pid}.abc.wait"
+    marker.write_text(json.dumps({"since": 0, "pid": proc.pid}))
+    metrics.update()
+    assert _values(metrics.render())['inet_nm_lock_waiters{board="board1"}'] == 1
+    proc.kill()
+    proc.wait()
+    assert _values(metrics.render())['inet_nm_lock_waiters{board="board1"}'] == 0
+
+
+def test_broker_waiters(metrics):
+    """Waiters queued in the broker are added to the queue depth."""
+    uid = metrics.test_nodes[0].uid
+    values = _values(metrics.render({uid: 2}))
+    assert values['inet_nm_lock_waiters{board="board1"}'] == 2
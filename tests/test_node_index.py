@@ -0,0 +1,73 @@
+import pytest
+
+import inet_nm.config as cfg
+from inet_nm.data_types import NmNode
+from inet_nm.node_index import NodeIndex
+
+
+def _node(serial, board, features, ignore=False):
+    return NmNode(
+        serial=serial,
+        vendor_id="vendor_id",
+        product_id="product_id",
+        vendor="vendor",
+        driver="driver",
+        board=board,
+        features_provided=features,
+        ignore=ignore,
+    )
+
+
+@pytest.fixture
+def nodes():
+    """Return nodes with overlapping features and boards."""
+    return [
+        _node("1", "board1", ["feature1", "feature2"]),
+        _node("2", "board2", ["feature1"]),
+        _node("3", "board1", ["feature2", "feature3"]),
+        _node("4", "board3", ["feature2"], ignore=True),
+    ]
+
+
+def test_masks(nodes):
+    """Test the bitsets of the index match the nodes."""
+    index = NodeIndex(nodes)
+    assert index.all == 0b1111
+    assert index.features["feature2"] == 0b1101
+    assert index.boards["board1"] == 0b0101
+    assert index.ignored == 0b1000
+    assert index.with_features(["feature1", "feature2"]) == 0b0001
+    assert index.with_features(["unknown"]) == 0
+    assert index.with_features([]) == index.all
+    assert index.with_boards(["board1", "board3"]) == 0b1101
+    assert index.with_uids([nodes[1].uid, "unknown"]) == 0b0010
+
+
+def test_select(nodes):
+    """Test selections keep the order of the nodes."""
+    index = NodeIndex(nodes)
+    assert index.select(0b1010) == [nodes[1], nodes[3]]
+    assert index.count(0b1011) == 3
+    assert index.select(index.first_per_board(0b1110)) == nodes[1:]
+    assert index.select(index.first_per_board(index.all)) == [
+        nodes[0],
+        nodes[1],
+        nodes[3],
+    ]
+
+
+def test_load_index(tmp_path, nodes):
+    """Test the index is cached with the config and bound to fresh nodes."""
+    nodes_cfg = cfg.NodesConfig(tmp_path)
+    nodes_cfg.save(nodes)
+    cfg.BoardInfoConfig(tmp_path).save({"board1": ["feature2"], "board3": ["feature2"]})
+    first = nodes_cfg.load_index()
+    second = nodes_cfg.load_index()
+    assert first.features is second.features
+    assert first.nodes == second.nodes
+    assert first.nodes[0] is not second.nodes[0]
+    assert [n.serial for n in nodes_cfg.query(feat_filter=["feature2"])] == [
+        "1",
+        "3",
+        "4",
+    ]
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from inet_nm.data_types import NmNode
+from inet_nm.rate_limit import LaunchLimiter, TokenBucket
+from inet_nm.runner_apps import NmShellRunner
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _node(serial):
+    return NmNode(
+        serial=serial,
+        vendor="vendor",
+        product_id="product",
+        vendor_id="vendor_id",
+        model="model",
+        driver="driver",
+        board="board",
+    )
+
+
+def test_token_bucket_burst_and_rate():
+    """A burst starts at once, further launches are spaced by the rate."""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now = 10.0
+    assert bucket.reserve() == 0
+
+
+@pytest.mark.parametrize("rate", [None, 0])
+def test_token_bucket_unlimited(rate):
+    bucket = TokenBucket(rate=rate)
+    assert all(bucket.reserve() == 0 for _ in range(100))
+
+
+def test_launch_limiter_per_hub():
+    """Nodes on different hubs do not throttle each other."""
+    hubs = {"a": "1-1", "b": "1-1", "c": "1-2"}
+    limiter = LaunchLimiter(1, per_hub=True, hub_of=lambda node: hubs[node.serial])
+    assert limiter.reserve(_node("a")) == 0
+    assert limiter.reserve(_node("c")) == 0
+    assert limiter.reserve(_node("b")) > 0
+
+    limiter = LaunchLimiter(1, hub_of=lambda node: hubs[node.serial])
+    assert limiter.reserve(_node("a")) == 0
+    assert limiter.reserve(_node("c")) > 0
+
+
+def test_runner_launch_rate():
+    """The shell runner only throttles launches beyond the burst."""
+    nodes = [_node(f"launch{i}") for i in range(8)]
+    with NmShellRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.cmd = "true"
+        runner.run()
+    assert list(runner.exit_status.values()) == [0] * 8
+
+    with NmShellRunner(nodes, launch_rate=20, launch_burst=4) as runner:
+        runner.results = []
+        runner.cmd = "true"
+        start = time.monotonic()
+        runner.run()
+        # 4 at once, then 4 more at 20 per second
+        assert time.monotonic() - start >= 0.19
@@ -1,4 +1,7 @@
 """Pytest module for testing all runner apps."""
+import json
+import os
+import time
 from typing import List
 from unittest.mock import patch
 
@@ -37,6 +40,264 @@ def test_NmShellRunner():
     assert nodes[1].uid not in uids
 
 
+def test_NmShellRunner_output(capsys):
+    """Output lines of all nodes are printed, long lines included."""
+    nodes = _nodes(3)
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.cmd = (
+            'echo start$NM_IDX; head -c 200000 /dev/zero | tr "\\0" x; exit $NM_IDX'
+        )
+        runner.run()
+    out = capsys.readouterr().out
+    for idx in range(3):
+        assert f"NODE:{idx}:BOARD:board: start{idx}" in out
+        assert f"NODE:{idx}:BOARD:board: {'x' * 200000}" in out
+        assert f"RESULT:NODE:{idx}:BOARD:board: {idx}" in out
+    assert runner.exit_status == {0: 0, 1: 1, 2: 2}
+
+
+def test_NmShellRunner_filters(capsys):
+    """The regex filter and the JSON filter select the output."""
+    nodes = _nodes(2)
+    with NmShellRunner(nodes, jobs=1) as runner:
+        runner.results = []
+        runner.cmd = 'echo skip; echo "keep $NM_IDX"'
+        runner.output_filter = r"keep \d"
+        runner.run()
+    out = capsys.readouterr().out
+    assert "skip" not in out
+    assert "NODE:1:BOARD:board: keep 1" in out
+
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.cmd = 'echo "{\\"idx\\": $NM_IDX}"'
+        runner.json_filter = True
+        runner.run()
+    results = sorted(runner.results, key=lambda res: res["idx"])
+    assert [res["data"] for res in results] == [[{"idx": 0}], [{"idx": 1}]]
+    assert [res["result"] for res in results] == [0, 0]
+
+
+def test_NmShellRunner_json_stream(capsys):
+    """Each node result and optionally each object is printed as a line."""
+    nodes = _nodes(2)
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.cmd = 'echo "log {\\"a\\":"; sleep 0.1; echo "$NM_IDX} more"'
+        runner.json_filter = True
+        runner.json_stream = True
+        runner.json_objects = True
+        runner.run()
+    assert runner.results == []
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    objects = [rec for rec in records if "object" in rec]
+    results = [rec for rec in records if "result" in rec]
+    assert sorted(rec["object"]["a"] for rec in objects) == [0, 1]
+    for rec in results:
+        assert rec["data"] == [{"a": rec["idx"]}]
+        assert rec["result"] == 0
+        assert "stdout" not in rec
+    # The object of a node is printed before its result
+    for rec in objects:
+        assert records.index(rec) < min(
+            records.index(res) for res in results if res["idx"] == rec["idx"]
+        )
+
+
+def test_NmShellRunner_log_dir(tmp_path, capsys):
+    """Output goes to one log per node, failures show the tail."""
+    nodes = _nodes(2)
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.log_dir = tmp_path / "logs"
+        runner.tail_lines = 2
+        runner.cmd = "for i in 1 2 3; do echo line$i; done; exit $NM_IDX"
+        runner.run()
+    out = capsys.readouterr().out
+    assert "line1" not in out
+    for idx, node in enumerate(nodes):
+        log = tmp_path / "logs" / f"{idx}-{node.uid}.log"
+        assert log.read_text() == "line1\nline2\nline3\n"
+        assert f"LOG:NODE:{idx}:BOARD:board: {log}" in out
+    assert "TAIL:NODE:0" not in out
+    assert "TAIL:NODE:1:BOARD:board: line2" in out
+    assert "TAIL:NODE:1:BOARD:board: line3" in out
+
+
+def test_NmShellRunner_log_dir_json(tmp_path):
+    """JSON results reference the log instead of embedding stdout."""
+    nodes = _nodes(1)
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.log_dir = tmp_path
+        runner.json_filter = True
+        runner.cmd = 'echo "{\\"a\\": 1}"; sleep 0.2; echo oops >&2; sleep 0.2; echo b'
+        runner.run()
+    res = runner.results[0]
+    assert "stdout" not in res
+    assert res["data"] == [{"a": 1}]
+    assert res["tail"] == ['{"a": 1}', "b"]
+    assert set(res) == {"uid", "board", "idx", "data", "result", "log", "tail"}
+    log = (tmp_path / f"0-{nodes[0].uid}.log").read_text()
+    assert log.splitlines() == ['{"a": 1}', "oops", "b"]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # Reaped by init or still a zombie counts as dead
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split()[2] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _wait_dead(pid, timeout=10.0):
+    # Children get the signal with the group but may take a moment to exit
+    deadline = time.monotonic() + timeout
+    while _alive(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@pytest.mark.parametrize(
+    "attr, cmd",
+    [
+        (
+            "timeout",
+            "sleep 30 & echo $! > {pid}; while true; do echo x; sleep 0.1; done",
+        ),
+        ("idle_timeout", "echo start; sleep 30 & echo $! > {pid}; wait"),
+    ],
+)
+def test_NmShellRunner_timeout(tmp_path, capsys, attr, cmd):
+    """Timed out commands are killed with their children and reported."""
+    nodes = _nodes(2)
+    pid_file = tmp_path / "pid"
+    with NmShellRunner(nodes, launch_rate=0) as runner:
+        runner.results = []
+        runner.cmd = f"if [ $NM_IDX = 0 ]; then {cmd.format(pid=pid_file)}; fi"
+        setattr(runner, attr, 0.5)
+        runner.run()
+    assert runner.exit_status == {0: attr, 1: 0}
+    out = capsys.readouterr().out
+    assert f"TIMEOUT:NODE:0:BOARD:board: {attr}" in out
+    assert "TIMEOUT:NODE:1" not in out
+    assert _wait_dead(int(pid_file.read_text()))
+
+
+def test_NmShellRunner_timeout_json():
+    """Timed out nodes are marked in JSON results."""
+    nodes = _nodes(1)
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.json_filter = True
+        runner.timeout = 0.3
+        runner.cmd = 'echo "{\\"a\\": 1}"; sleep 30'
+        runner.run()
+    assert runner.results[0]["timeout"] == "timeout"
+    assert runner.results[0]["data"] == [{"a": 1}]
+
+
+def test_NmShellRunner_build_cmd(tmp_path, capsys):
+    """The build runs once per board, nodes of failed builds are skipped."""
+    nodes = _nodes(3)
+    nodes[2].board = "other"
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.build_cmd = f"echo built >> {tmp_path}/$NM_BOARD; test $NM_BOARD = board"
+        runner.cmd = f"cat {tmp_path}/$NM_BOARD"
+        runner.run()
+    out = capsys.readouterr().out
+    assert (tmp_path / "board").read_text() == "built\n"
+    assert (tmp_path / "other").read_text() == "built\n"
+    assert "RESULT:BUILD:BOARD:board: 0" in out
+    assert "RESULT:BUILD:BOARD:other: 1" in out
+    assert "NODE:0:BOARD:board: built" in out
+    assert "NODE:1:BOARD:board: built" in out
+    assert "SKIPPED:NODE:2:BOARD:other: build failed" in out
+    assert runner.exit_status == {0: 0, 1: 0, 2: "build_failed"}
+
+
+def test_NmShellRunner_build_cmd_json(tmp_path):
+    """Builds and skipped nodes are part of the JSON results."""
+    nodes = _nodes(2)
+    nodes[1].board = "other"
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.json_filter = True
+        runner.build_cmd = "test $NM_BOARD = board"
+        runner.cmd = 'echo "{\\"a\\": 1}"'
+        runner.run()
+    builds = {r["build"]: r for r in runner.results if "build" in r}
+    assert {board: r["result"] for board, r in builds.items()} == {
+        "board": 0,
+        "other": 1,
+    }
+    # Builds are not results of the node whose environment they used
+    assert all("uid" not in r and "idx" not in r for r in builds.values())
+    nodes_results = [r for r in runner.results if "build" not in r]
+    assert [r["idx"] for r in nodes_results] == [1, 0]
+    assert nodes_results[0]["error"] == "build failed"
+    assert nodes_results[1]["data"] == [{"a": 1}]
+
+
+def test_NmShellRunner_build_cmd_json_stream(tmp_path, capsys):
+    """Streamed build records have their own keys."""
+    nodes = _nodes(2)
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.json_stream = True
+        runner.json_filter = True
+        runner.log_dir = tmp_path
+        runner.build_cmd = "echo built"
+        runner.cmd = "true"
+        runner.run()
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[0]["build"] == "board"
+    assert records[0]["log"] == str(tmp_path / "build-board.log")
+    assert "uid" not in records[0]
+    assert sorted(r["idx"] for r in records[1:]) == [0, 1]
+
+
+def test_NmShellRunner_build_state_per_instance():
+    """Build state of one runner does not leak into another."""
+    first = NmShellRunner(_nodes(1), force=True)
+    first._failed_builds.add("board")
+    second = NmShellRunner(_nodes(1), force=True)
+    assert second._failed_builds == set()
+    assert second._builds == {}
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_NmShellRunner_pipeline(tmp_path, pipeline):
+    """Pipelined nodes start as soon as the build of their board finished."""
+    nodes = _nodes(2)
+    nodes[1].board = "slow"
+    with NmShellRunner(nodes) as runner:
+        runner.results = []
+        runner.pipeline = pipeline
+        runner.build_cmd = (
+            "if [ $NM_BOARD = slow ]; then sleep 1; fi;"
+            f" date +%s.%N > {tmp_path}/build-$NM_BOARD"
+        )
+        runner.cmd = f"date +%s.%N > {tmp_path}/node-$NM_IDX"
+        runner.run()
+
+    def _time(name):
+        return float((tmp_path / name).read_text())
+
+    assert (_time("node-0") < _time("build-slow")) == pipeline
+    assert _time("node-1") > _time("build-slow")
+    assert runner.exit_status == {0: 0, 1: 0}
+
+
 @pytest.mark.parametrize("tmux_runner", [NmTmuxPanedRunner, NmTmuxWindowedRunner])
 def test_NmTmuxRunner(tmux_runner):
     """Mock tmux calls."""
@@ -1,3 +1,5 @@
+import threading
+import time
 from threading import Thread
 from typing import Dict
 from unittest.mock import patch
@@ -65,3 +67,60 @@ def test_run_with_acquire(dummy_nodes):
         runner.run()
         assert mock_start.call_count == len(dummy_nodes)
         assert mock_join.call_count == len(dummy_nodes)
+
+
+@pytest.mark.parametrize(
+    "jobs, seq, workers",
+    [(None, False, 2), (1, False, 1), (5, False, 2), (None, True, 1)],
+)
+def test_run_worker_pool(dummy_nodes, jobs, seq, workers):
+    runner = MockNmNodesRunner(nodes=dummy_nodes, jobs=jobs, seq=seq)
+    runner.acquire()
+
+    with patch.object(Thread, "start") as mock_start, patch.object(
+        Thread, "join"
+    ) as mock_join:
+        runner.run()
+        assert mock_start.call_count == workers
+        assert mock_join.call_count == workers
+
+
+class ConcurrencyRunner(NmNodesRunner):
+    def pre(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.done = []
+
+    def func(self, node: NmNode, idx: int, env: Dict[str, str]):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+            self.done.append(idx)
+        if idx == 0:
+            raise RuntimeError("failing node")
+        return 0
+
+
+def test_run_jobs_limit():
+    nodes = [
+        NmNode(
+            serial=f"jobs{i}",
+            vendor="vendor",
+            product_id="product",
+            vendor_id="vendor_id",
+            model="model",
+            driver="driver",
+            board="board",
+        )
+        for i in range(6)
+    ]
+    with ConcurrencyRunner(nodes=nodes, jobs=2) as runner:
+        runner.run()
+    assert runner.max_running == 2
+    assert sorted(runner.done) == list(range(6))
+    assert runner.exit_status[0] == "error"
+    assert runner.exit_status[5] == 0
@@ -0,0 +1,88 @@
+from typing import Dict
+
+import pytest
+
+from inet_nm.data_types import NmNode
+from inet_nm.runner_base import NmNodesRunner
+from inet_nm.usage import UsageLog, aggregate_usage, usage_entry
+
+DAY = 86400.0
+
+
+def _node(serial, board):
+    return NmNode(
+        serial=serial,
+        vendor="vendor",
+        product_id="product",
+        vendor_id="vendor_id",
+        model="model",
+        driver="driver",
+        board=board,
+    )
+
+
+@pytest.fixture
+def nodes():
+    return [_node("usage1", "board1"), _node("usage2", "board1"), _node("usage3", "b2")]
+
+
+class StatusRunner(NmNodesRunner):
+    def func(self, node: NmNode, idx: int, env: Dict[str, str]):
+        return 2 if idx == 1 else 0
+
+
+def test_record_and_read(tmp_path, nodes):
+    """Entries are split in monthly files and read by time window."""
+    log = UsageLog(tmp_path)
+    log.record(
+        [
+            usage_entry(nodes[0], "me", 1.0, 10.0, 0, ts=0.0),
+            usage_entry(nodes[1], "me", 2.0, 20.0, 1, ts=40 * DAY),
+        ]
+    )
+    assert len(list(log.usage_dir.iterdir())) == 2
+    assert [e["uid"] for e in log.read()] == [nodes[0].uid, nodes[1].uid]
+    assert [e["uid"] for e in log.read(since=DAY)] == [nodes[1].uid]
+    assert [e["uid"] for e in log.read(until=DAY)] == [nodes[0].uid]
+
+
+def test_record_prunes_old_months(tmp_path, nodes):
+    """Only the latest months are kept."""
+    log = UsageLog(tmp_path)
+    log.KEEP_MONTHS = 2
+    for month in range(4):
+        log.record([usage_entry(nodes[0], "me", 0, 1, 0, ts=month * 31 * DAY)])
+    assert len(list(log.usage_dir.iterdir())) == 2
+    assert len(list(log.read())) == 2
+
+
+def test_aggregate_usage(nodes):
+    """Holds are aggregated and idle groups show up."""
+    entries = [
+        usage_entry(nodes[0], "me", 4.0, 50.0, 0, ts=1.0),
+        usage_entry(nodes[1], "me", 2.0, 150.0, 2, ts=2.0),
+    ]
+    groups = aggregate_usage(entries, nodes, 100.0)
+    assert groups["board1"]["holds"] == 2
+    assert groups["board1"]["utilization"] == 1.0
+    assert groups["board1"]["mean_wait"] == 3.0
+    assert groups["board1"]["max_wait"] == 4.0
+    assert groups["board1"]["failures"] == 1
+    assert groups["b2"]["holds"] == 0
+    assert groups["b2"]["utilization"] == 0.0
+
+    groups = aggregate_usage(entries, nodes, 100.0, by="node")
+    assert groups[nodes[0].uid]["utilization"] == 0.5
+    assert groups[nodes[2].uid]["holds"] == 0
+
+
+def test_runner_records_usage(tmp_path, nodes):
+    """The runner accounts every node it held with the exit status."""
+    log = UsageLog(tmp_path)
+    with StatusRunner(nodes=nodes, seq=True, usage_log=log) as runner:
+        runner.run()
+    entries = list(log.read())
+    assert [e["uid"] for e in entries] == [node.uid for node in nodes]
+    assert [e["status"] for e in entries] == [0, 2, 0]
+    assert all(e["hold"] >= 0 and e["wait"] >= 0 for e in entries)
+    assert all(e["holder"] for e in entries)